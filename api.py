@@ -1,36 +1,220 @@
-from typing import Optional, Literal
-from fastapi import FastAPI, HTTPException, Query
+from typing import Optional, Literal, List, Dict, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import functools
+import json
+import time
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from pydantic import BaseModel, conlist
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import mlflow
-from train import TrainTask, train_model, TrainArgs, get_exp_id, get_args_from_model
+from mlflow.exceptions import MlflowException
+from train import (
+    TrainTask,
+    train_model,
+    TrainArgs,
+    get_exp_id,
+    get_args_from_model,
+    warm_up_worker,
+)
 import config
 import utils
+from utils.metrics import (
+    REGISTRY as METRICS_REGISTRY,
+    MLFLOW_CALL_SECONDS,
+    MLFLOW_CALL_ERRORS,
+)
 from loguru import logger
-from pueue import pueue_submit, pueue_logs, pueue_status
+from pueue import (
+    async_pueue_submit,
+    async_pueue_submit_many,
+    async_get_pueue_task_status,
+    async_pueue_tail,
+    async_follow_pueue_log,
+)
 from cli import ResumeArgs
+from sweep import Sweep, SweepTask
 
 PARALLEL_NUM = utils.get_parallel_num()
 logger.info(f"Parallel Number: {PARALLEL_NUM}")
 
-app = FastAPI()
+checkpoint_cache = utils.CheckpointCache()
+# Shared by all status requests, see `GET /status`
+run_status_cache = utils.RunStatusCache()
+# Live metrics published by training processes on this host, see `GET /runs/{run_id}/stream`
+metric_stream_hub = utils.MetricStreamHub()
+# In-process view of the jobs submitted to `executor`
+job_registry = utils.JobRegistry()
+
+# Dedicated, bounded pool for blocking tracking server round trips, so they don't block the event loop
+mlflow_executor = ThreadPoolExecutor(
+    max_workers=config.MLFLOW_CLIENT_WORKERS, thread_name_prefix="mlflow"
+)
+
+
+async def run_tracking(func: Callable, *args, **kwargs):
+    # NOTE: timed including the wait for a free tracking worker, which is what requests feel
+    method = getattr(func, "__name__", "unknown")
+    with MLFLOW_CALL_SECONDS.time(method=method):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                mlflow_executor, functools.partial(func, *args, **kwargs)
+            )
+        except Exception:
+            MLFLOW_CALL_ERRORS.inc(method=method)
+            raise
+
+
+# endpoint group -> semaphore
+endpoint_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def limit_concurrency(name: str):
+    """
+    Limit concurrent requests of an endpoint group (see `config.ENDPOINT_CONCURRENCY`),
+    so e.g. a flood of status polls can't take all tracking workers from submissions.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if (semaphore := endpoint_semaphores.get(name)) is None:
+                semaphore = endpoint_semaphores[name] = asyncio.Semaphore(
+                    config.ENDPOINT_CONCURRENCY[name]
+                )
+            async with semaphore:
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 # NOTE: somehow start same parameter tasks: using Process will get same result (loss) while using Thread + nested will get different result (loss)
 if config.USE_THREAD:
-    from concurrent.futures import ThreadPoolExecutor
-
     executor = ThreadPoolExecutor(
         max_workers=PARALLEL_NUM
     )  # Limit the number of concurrent tasks
 else:
-    from concurrent.futures import ProcessPoolExecutor
-
-    executor = ProcessPoolExecutor(
-        max_workers=PARALLEL_NUM
+    # Workers are pre-spawned and warmed up at startup, and recycled after config.WORKER_MAX_TASKS tasks / WORKER_MAX_RSS
+    executor = utils.WarmProcessPool(
+        max_workers=PARALLEL_NUM, initializer=warm_up_worker
     )  # Limit the number of concurrent tasks
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # NOTE: not at import time, spawned workers import this module too
+    if isinstance(executor, utils.WarmProcessPool):
+        executor.start()
+    if config.METRIC_STREAM:
+        await metric_stream_hub.start()
+    yield
+    metric_stream_hub.close()
+    executor.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Jobs wait (by priority and fair share across experiments) in the scheduler, the executor only gets as many as it can run
+scheduler = utils.PriorityScheduler(executor, max_workers=PARALLEL_NUM)
+
+request_seconds = METRICS_REGISTRY.histogram(
+    "api_request_duration_seconds",
+    "Latency of API requests",
+    ["method", "endpoint", "status"],
+)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template (e.g. `/status/{run_id}`), so each run ID doesn't get its own series
+        route = request.scope.get("route")
+        request_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            endpoint=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+def _get_scheduler_jobs() -> Dict[tuple, float]:
+    stats = scheduler.stats()
+    return {(state,): stats[state] for state in ("queued", "reserved", "in_flight")}
+
+
+def _get_executor_workers() -> Dict[tuple, float]:
+    if isinstance(executor, utils.WarmProcessPool):
+        workers = executor.stats()["workers"]
+        busy = sum(worker["state"] == "busy" for worker in workers)
+    else:
+        # Threads: the scheduler never hands out more jobs than workers
+        busy = scheduler.stats()["in_flight"]
+    return {("max",): PARALLEL_NUM, ("busy",): busy}
+
+
+# NOTE: computed when scraped, nothing to maintain on the submission path
+METRICS_REGISTRY.gauge(
+    "scheduler_jobs", "Jobs in the scheduler by state", ["state"]
+).set_function(_get_scheduler_jobs)
+METRICS_REGISTRY.gauge(
+    "executor_workers", "Executor workers (max and busy)", ["state"]
+).set_function(_get_executor_workers)
+
+
+def create_run_in_experiment(
+    client: mlflow.MlflowClient, exp_name: Optional[str], run_name: Optional[str]
+):
+    """
+    `create_run` in the experiment named `exp_name` (resolved through the shared experiment cache).
+    If the cached experiment was deleted meanwhile, resolve the name again and retry once.
+    """
+    exp_id = get_exp_id(exp_name)
+    try:
+        return client.create_run(experiment_id=exp_id, run_name=run_name)
+    except MlflowException:
+        if not exp_name:
+            raise
+        utils.get_experiment_cache().invalidate(exp_name)
+        if (new_exp_id := get_exp_id(exp_name)) == exp_id:
+            raise
+        logger.info(f"Experiment {exp_name} changed ({exp_id} -> {new_exp_id})")
+        return client.create_run(experiment_id=new_exp_id, run_name=run_name)
+
+
+def reserve_slots(
+    count: int = 1, priority: int = 0, group: Optional[str] = None
+) -> utils.Reservation:
+    """
+    Take scheduler queue slots before creating any run, or reject with 429
+    """
+    try:
+        return scheduler.reserve(count, priority=priority, group=group)
+    except utils.QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
 @app.post("/train")
-def submit_training(task: TrainTask, pueue: bool = Query(False)):
+@limit_concurrency("train")
+async def submit_training(
+    task: TrainTask,
+    pueue: bool = Query(False),
+    priority: int = Query(0, description="Higher runs first (local executor only)"),
+):
     if pueue:
-        task_id = pueue_submit(
+        task_id = await async_pueue_submit(
             get_args_from_model(task), pueue_return_task_id_only=True
         )
         return {
@@ -41,13 +225,21 @@ def submit_training(task: TrainTask, pueue: bool = Query(False)):
     # https://mlflow.org/docs/latest/tracking/tracking-api.html#launching-multiple-runs
     # https://github.com/mlflow/mlflow/issues/3592
     client = mlflow.MlflowClient()
-    # create_run unlike :py:func:`mlflow.start_run`, does not change the "active run" used by :py:func:`mlflow.log_param`.
-    run = client.create_run(
-        experiment_id=get_exp_id(task.exp_name),
-        run_name=task.run_name,
-    )
-    executor.submit(train_model, task, run.info.run_id)
-    return {"message": "Training task has been submitted", "run_id": run.info.run_id}
+    with reserve_slots(priority=priority, group=task.exp_name) as reservation:
+        # create_run unlike :py:func:`mlflow.start_run`, does not change the "active run" used by :py:func:`mlflow.log_param`.
+        run = await run_tracking(
+            create_run_in_experiment, client, task.exp_name, task.run_name
+        )
+        job_id = job_registry.register(
+            reservation.submit(train_model, task, run.info.run_id),
+            run_id=run.info.run_id,
+            name=task.run_name,
+        )
+    return {
+        "message": "Training task has been submitted",
+        "run_id": run.info.run_id,
+        "job_id": job_id,
+    }
     # NOTE: start_run cannot handle multiple active runs
     # with mlflow.start_run(run_name=task.run_name) as run:
     #     run_id = run.info.run_id
@@ -55,11 +247,87 @@ def submit_training(task: TrainTask, pueue: bool = Query(False)):
     # return {"message": "Training task has been submitted", "run_id": run_id}
 
 
+@app.post("/train/batch")
+@limit_concurrency("train")
+async def submit_training_batch(
+    tasks: conlist(TrainTask, min_length=1),
+    pueue: bool = Query(False),
+    pueue_group: Optional[str] = Query(None),
+    pueue_parallel: int = Query(1),
+    priority: int = Query(0, description="Higher runs first (local executor only)"),
+):
+    if pueue:
+        task_ids = await async_pueue_submit_many(
+            [get_args_from_model(task) for task in tasks],
+            pueue_group=pueue_group,
+            pueue_parallel=pueue_parallel,
+            pueue_return_task_id_only=True,
+        )
+        return {
+            "message": f"{len(task_ids)} training tasks have been submitted to pueue",
+            "task_ids": task_ids,
+        }
+
+    # All or nothing, so a rejected batch leaves no runs behind
+    reservation = reserve_slots(len(tasks), priority=priority)
+    client = mlflow.MlflowClient()
+    # NOTE: MLFlow has no bulk create_run, so we create them concurrently
+    # (each experiment is still resolved only once, by the experiment cache)
+    with reservation:
+        runs = await asyncio.gather(
+            *(
+                run_tracking(
+                    create_run_in_experiment, client, task.exp_name, task.run_name
+                )
+                for task in tasks
+            ),
+            return_exceptions=True,
+        )
+        if errors := [run for run in runs if isinstance(run, BaseException)]:
+            # No job will ever end the runs that were created, so end them here
+            await asyncio.gather(
+                *(
+                    run_tracking(client.set_terminated, run.info.run_id, "FAILED")
+                    for run in runs
+                    if not isinstance(run, BaseException)
+                )
+            )
+            raise errors[0]
+        run_ids = []
+        job_ids = []
+        for task, run in zip(tasks, runs):
+            job_ids.append(
+                job_registry.register(
+                    scheduler.schedule(
+                        train_model,
+                        task,
+                        run.info.run_id,
+                        priority=priority,
+                        group=task.exp_name,
+                        reservation=reservation,
+                    ),
+                    run_id=run.info.run_id,
+                    name=task.run_name,
+                )
+            )
+            run_ids.append(run.info.run_id)
+    return {
+        "message": f"{len(run_ids)} training tasks have been submitted",
+        "run_ids": run_ids,
+        "job_ids": job_ids,
+    }
+
+
 # TODO: resume training
 @app.post("/resume")
-def resume_training(run_id: str, pueue: bool = Query(False)):
+@limit_concurrency("resume")
+async def resume_training(
+    run_id: str,
+    pueue: bool = Query(False),
+    priority: int = Query(0, description="Higher runs first (local executor only)"),
+):
     if pueue:
-        task_id = pueue_submit(
+        task_id = await async_pueue_submit(
             ResumeArgs().parse_args(["--resume_run_id", run_id]),
             pueue_return_task_id_only=True,
         )
@@ -70,7 +338,7 @@ def resume_training(run_id: str, pueue: bool = Query(False)):
 
     client = mlflow.MlflowClient()
     try:
-        run = client.get_run(run_id)
+        run = await run_tracking(client.get_run, run_id)
     except:
         raise HTTPException(
             status_code=404,
@@ -84,29 +352,277 @@ def resume_training(run_id: str, pueue: bool = Query(False)):
         )
 
     try:
-        arg_dict = mlflow.artifacts.load_dict(f"{run.info.artifact_uri}/TrainArgs.json")
+        arg_dict = await run_tracking(
+            mlflow.artifacts.load_dict, f"{run.info.artifact_uri}/TrainArgs.json"
+        )
     except:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to load trained argument. Not able to resume.",
         )
     task = TrainArgs().from_dict(arg_dict)
-    if not (client.list_artifacts(run.info.run_id, f"checkpoint/latest")):
+    if not (
+        await run_tracking(client.list_artifacts, run.info.run_id, f"checkpoint/latest")
+    ):
         raise HTTPException(
             status_code=404,
             detail=f"Not found checkpoint to resume: {run.info.artifact_uri}/checkpoint/latest",
         )
-    resume_state_dict = mlflow.pytorch.load_state_dict(
-        run.info.artifact_uri + f"/checkpoint/latest"
+    with reserve_slots(priority=priority, group=task.exp_name) as reservation:
+        resume_state_dict = await run_tracking(
+            checkpoint_cache.load_state_dict,
+            run.info.run_id,
+            f"checkpoint/latest",
+            artifact_uri=run.info.artifact_uri,
+        )
+        # The run may have been stopped through `DELETE /jobs/{job_id}` before
+        utils.clear_stop(run.info.run_id)
+        job_id = job_registry.register(
+            reservation.submit(train_model, task, run.info.run_id, resume_state_dict),
+            run_id=run.info.run_id,
+            kind="resume",
+            name=task.run_name,
+        )
+    return {
+        "message": "Training task has been resumed",
+        "run_id": run.info.run_id,
+        "job_id": job_id,
+    }
+
+
+# sweep_id -> Sweep
+sweeps = {}
+
+
+@app.post("/sweep")
+@limit_concurrency("sweep")
+async def submit_sweep(
+    sweep_task: SweepTask,
+    priority: int = Query(0, description="Higher runs first (local executor only)"),
+):
+    try:
+        sweep = Sweep.from_task(sweep_task)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # NOTE: the executor backend submits through the reservation, so either all trials are admitted or none
+    reservation = (
+        reserve_slots(
+            len(sweep.trials), priority=priority, group=sweep_task.base.exp_name
+        )
+        if sweep_task.backend == "executor"
+        else None
+    )
+    try:
+        # NOTE: creates one run per trial (and submits to pueue synchronously), so in the tracking pool
+        ids = await run_tracking(
+            sweep.launch,
+            sweep_task.backend,
+            executor=reservation,
+            pueue_group=sweep_task.pueue_group,
+            pueue_parallel=sweep_task.parallel,
+            job_registry=job_registry,
+        )
+    finally:
+        if reservation is not None:
+            reservation.release()
+    sweeps[sweep.sweep_id] = sweep
+    sweep.run_in_background(sweep_task.poll_interval)
+    return {
+        "message": f"Sweep with {len(ids)} trials has been submitted",
+        "sweep_id": sweep.sweep_id,
+        "run_ids": [trial["run_id"] for trial in sweep.trials],
+        "task_ids": ids if sweep_task.backend == "pueue" else None,
+    }
+
+
+@app.get("/sweep/{sweep_id}")
+async def get_sweep_status(sweep_id: str):
+    if (sweep := sweeps.get(sweep_id)) is None:
+        raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found")
+    return sweep.summary()
+
+
+@app.get("/jobs")
+@limit_concurrency("jobs")
+async def list_jobs(
+    state: Optional[
+        Literal[
+            "queued",
+            "running",
+            "stopping",
+            "finished",
+            "stopped",
+            "failed",
+            "cancelled",
+        ]
+    ] = Query(None),
+    run_id: Optional[str] = Query(None),
+):
+    """
+    Jobs submitted to the local executor (not pueue), answered without touching the tracking server.
+    """
+    return {
+        "counts": job_registry.counts(),
+        "scheduler": scheduler.stats(),
+        "jobs": job_registry.list(state=state, run_id=run_id),
+    }
+
+
+@app.get("/jobs/{job_id}")
+@limit_concurrency("jobs")
+async def get_job(job_id: str):
+    if (job := job_registry.get(job_id)) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+@limit_concurrency("jobs")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued job, or ask a running one to stop after its current epoch (checkpoint is kept, so it can be resumed).
+    """
+    if (job := job_registry.cancel(job_id)) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["state"] == "cancelled" and job["run_id"] is not None:
+        # The run was created on submission but will never be started
+        await run_tracking(
+            mlflow.MlflowClient().set_terminated, job["run_id"], "KILLED"
+        )
+    return job
+
+
+@app.get("/workers")
+async def get_worker_stats():
+    """
+    Startup time, task latency, RSS and recycling of each worker process
+    """
+    if not isinstance(executor, utils.WarmProcessPool):
+        raise HTTPException(
+            status_code=400, detail="Worker stats are only available in process mode"
+        )
+    return executor.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text format: request, tracking server and pueue latencies, device lock waits, scheduler and worker usage
+    """
+    return PlainTextResponse(
+        METRICS_REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/checkpoint_cache")
+async def get_checkpoint_cache_stats():
+    return await run_tracking(checkpoint_cache.stats)
+
+
+class StatusQuery(BaseModel):
+    run_ids: List[str] = []
+    exp_name: Optional[str] = None
+    fields: Optional[List[str]] = None
+    max_results: int = 1000
+
+
+async def get_statuses(query: StatusQuery) -> dict:
+    if not query.run_ids and not query.exp_name:
+        raise HTTPException(status_code=400, detail="Give run_ids or exp_name")
+    try:
+        if query.exp_name:
+            if (
+                experiment := await run_tracking(
+                    mlflow.get_experiment_by_name, query.exp_name
+                )
+            ) is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Experiment {query.exp_name} not found"
+                )
+            statuses = await run_tracking(
+                run_status_cache.get_experiment_runs,
+                experiment.experiment_id,
+                query.max_results,
+            )
+        else:
+            statuses = await run_tracking(run_status_cache.get_runs, query.run_ids)
+        runs = {
+            run_id: utils.project_status(status, query.fields)
+            for run_id, status in statuses.items()
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Could not retrieve run status: {e}"
+        )
+    return {
+        "runs": runs,
+        "missing": [run_id for run_id in query.run_ids if run_id not in runs],
+    }
+
+
+@app.get("/status")
+@limit_concurrency("status")
+async def get_task_statuses(
+    run_ids: List[str] = Query([]),
+    exp_name: Optional[str] = None,
+    fields: Optional[List[str]] = Query(
+        None, description="e.g. status, metrics or metrics.loss"
+    ),
+    max_results: int = Query(1000, description="Max runs of an experiment"),
+):
+    """
+    Status of many runs (or of the runs of an experiment) with one tracking server query,
+    served from a cache shared by all requests for `config.RUN_STATUS_CACHE_TTL` seconds
+    """
+    return await get_statuses(
+        StatusQuery(
+            run_ids=run_ids, exp_name=exp_name, fields=fields, max_results=max_results
+        )
+    )
+
+
+@app.post("/status")
+@limit_concurrency("status")
+async def post_task_statuses(query: StatusQuery):
+    """
+    Same as `GET /status`, for more run IDs than fit in a URL
+    """
+    return await get_statuses(query)
+
+
+@app.get("/runs/{run_id}/stream")
+async def stream_run_metrics(run_id: str):
+    """
+    Server-Sent Events of a run's metrics as they are logged (`metrics` events, recent history first),
+    then an `end` event when the run is done
+    """
+    if not metric_stream_hub.running:
+        raise HTTPException(status_code=503, detail="Metric streaming is disabled")
+
+    async def events():
+        async for event in metric_stream_hub.subscribe(run_id, keepalive=15):
+            if event is None:
+                # Comment line, so proxies don't close an idle connection
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    executor.submit(train_model, task, run.info.run_id, resume_state_dict)
-    return {"message": "Training task has been resumed", "run_id": run.info.run_id}
 
 
 @app.get("/status/{run_id}")
-def get_task_status(run_id: str):
+@limit_concurrency("status")
+async def get_task_status(run_id: str):
     try:
-        run = mlflow.get_run(run_id)
+        run = await run_tracking(mlflow.get_run, run_id)
         return {
             "run_id": run_id,
             "status": run.info.status,
@@ -122,50 +638,67 @@ def get_task_status(run_id: str):
         )
 
 
+@app.get("/pueue/tail/{task_id}")
+@limit_concurrency("pueue")
+async def tail_pueue_task(
+    task_id: str,
+    offset: int = Query(0, ge=0, description="`offset` of the previous response"),
+    max_bytes: int = Query(config.PUEUE_TAIL_MAX_BYTES, gt=0),
+    follow: bool = Query(
+        False, description="Stream new output as Server-Sent Events until done"
+    ),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Only the output written after byte `offset` and the `offset` to ask from next time,
+    read from pueue's task log file when the daemon runs on this host
+    """
+    try:
+        if not follow:
+            return await async_pueue_tail(task_id, offset, max_bytes)
+        # Fail before streaming if the task doesn't exist
+        await async_get_pueue_task_status("status", task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not read the log: {e}")
+
+    if last_event_id and last_event_id.isdigit():
+        # A reconnecting EventSource continues where it left off
+        offset = int(last_event_id)
+
+    async def events():
+        try:
+            async for chunk in async_follow_pueue_log(
+                task_id, offset, max_bytes=max_bytes
+            ):
+                yield f"id: {chunk['offset']}\nevent: output\ndata: {json.dumps(chunk)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/pueue/{mode}/{task_id}")
-def get_pueue_task_status(
+@limit_concurrency("pueue")
+async def get_pueue_task_status(
     mode: Literal["status", "logs", "running_status", "output"],
     task_id: Optional[str] = None,
 ):
     """
+    Served from the shared pueue status snapshot (see `pueue.PueueStatusPoller`)
     NOTE: Won't have output when the task has not run (e.g. Queued)
     """
     try:
-        if mode == "status":
-            return pueue_status(task_id=task_id)
-        elif mode == "logs":
-            return pueue_logs(task_id=task_id)
-        elif mode == "running_status":
-            try:
-                assert task_id
-                status = pueue_logs(task_id=task_id)["task"]["status"]
-                if isinstance(status, dict):
-                    # {'detail': 'Not Found'}
-                    return "Success" if "Done" in status else status
-                elif isinstance(status, str):
-                    return status
-                else:
-                    raise ValueError(f"Unknown status {status}")
-            except:
-                raise HTTPException(
-                    status_code=400,
-                    detail="In running_status mode you should query for an existing task_id",
-                )
-        elif mode == "output":
-            try:
-                assert task_id
-                log = pueue_logs(task_id=task_id)
-                return dict(
-                    output=log["output"],
-                    is_finished="Done" in log["task"]["status"],
-                )
-            except:
-                raise HTTPException(
-                    status_code=400,
-                    detail="In output mode you should query for an existing task_id",
-                )
-        else:
-            raise NotImplementedError(f"Unknown mode {mode}")
+        return await async_get_pueue_task_status(mode, task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Could not retrieve run status: {e}"
@@ -0,0 +1,98 @@
+"""
+Import time budget of the entry points, measured with `python -X importtime`.
+Exits with 1 if an entry point is slower than its budget or imports a module it shouldn't.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --modules pueue --budget_scale 2
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+import json
+import os
+import subprocess
+import sys
+from tap import Tap
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> (budget in seconds, modules that must not be imported)
+# NOTE: every pueue task pays for `pueue`/`cli`, so they must not load torch, MLFlow or Streamlit just to parse arguments
+BUDGETS: Dict[str, Tuple[float, List[str]]] = {
+    "pueue": (1.0, ["torch", "mlflow", "streamlit"]),
+    "cli": (1.0, ["torch", "mlflow", "streamlit"]),
+    "train": (1.0, ["torch", "mlflow", "streamlit"]),
+    "api": (10.0, ["streamlit"]),
+}
+
+
+class ImportTimeArgs(Tap):
+    modules: List[str] = list(BUDGETS)  # Entry points to measure
+    repeat: int = 3  # Take the fastest of N runs (first run also warms the file system cache)
+    budget_scale: float = 1.0  # Multiply budgets, e.g. on slow CI machines
+    output: Optional[str] = None  # Also write the results as JSON to this file
+
+
+def measure(module: str) -> Tuple[float, Set[str]]:
+    """
+    Cumulative import time (seconds) of `module` and all the modules it imported
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{result.stderr}")
+
+    total = None
+    imported = set()
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        imported.add(name.strip().split(".")[0])
+        # Nested imports are indented
+        if name == f" {module}":
+            total = int(cumulative) / 1e6
+    if total is None:
+        raise RuntimeError(f"No import time found for {module}")
+    return total, imported
+
+
+def main(args: ImportTimeArgs) -> bool:
+    results = []
+    for module in args.modules:
+        budget, forbidden = BUDGETS.get(module, (float("inf"), []))
+        budget *= args.budget_scale
+        timings = []
+        for _ in range(args.repeat):
+            seconds, imported = measure(module)
+            timings.append(seconds)
+        seconds = min(timings)
+        loaded = sorted(set(forbidden) & imported)
+        results.append(
+            {
+                "module": module,
+                "seconds": seconds,
+                "budget": budget,
+                "forbidden_imported": loaded,
+                "ok": seconds <= budget and not loaded,
+            }
+        )
+        print(
+            f"{'OK  ' if results[-1]['ok'] else 'FAIL'} {module:<8} {seconds:6.3f}s / {budget:.3f}s"
+            + (f"  imports {', '.join(loaded)}" if loaded else "")
+        )
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=4)
+    return all(result["ok"] for result in results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(ImportTimeArgs().parse_args()) else 1)
@@ -0,0 +1,277 @@
+"""
+Microbenchmarks of the hot paths (submitting to pueue, parsing Tap arguments, allocating devices, training epochs,
+checkpoints), written as JSON so commits can be compared.
+
+    python benchmarks/microbench.py --output before.json
+    # ... change something
+    python benchmarks/microbench.py --output after.json --baseline before.json
+    python benchmarks/microbench.py --benchmarks tap_parser device_lock
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from tap import Tap
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from loguru import logger
+
+BENCHMARK_NAMES = ("pueue", "tap_parser", "device_lock", "train_epoch", "checkpoint")
+# MiB of float32 parameters
+CHECKPOINT_SIZES = (1, 16, 128)
+
+
+class MicrobenchArgs(Tap):
+    benchmarks: List[str] = list(BENCHMARK_NAMES)  # Benchmarks to run
+    repeat: int = 5  # Measure N times and keep the median (and min)
+    checkpoint_sizes: List[int] = list(CHECKPOINT_SIZES)  # Checkpoints to save and load
+    epochs: int = 10  # Epochs of the longer train_model run (per-epoch cost is the difference to a 1 epoch run)
+    output: Optional[str] = None  # Write the results as JSON to this file
+    baseline: Optional[str] = None  # Compare against the results of a previous run (JSON), exit 1 on regressions
+    tolerance: float = 0.25  # Relative slow down (of the median) counted as a regression
+
+
+def measure(
+    name: str, fn: Callable, repeat: int, number: Optional[int] = None, **info
+) -> Dict[str, Any]:
+    """
+    Seconds per call of `fn`, with `number` calls per measurement (chosen to take at least 0.2s if not given)
+    """
+    timer = timeit.Timer(fn)
+    if number is None:
+        number, _ = timer.autorange()
+    timings = [seconds / number for seconds in timer.repeat(repeat, number)]
+    result = {
+        "name": name,
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "number": number,
+        "repeat": repeat,
+        **info,
+    }
+    logger.info(
+        f"{name:<32} {result['median'] * 1e3:10.3f} ms (min {result['min'] * 1e3:.3f} ms, {number} x {repeat})"
+    )
+    return result
+
+
+def bench_pueue(args: MicrobenchArgs) -> List[Dict[str, Any]]:
+    from pueue import pueue_submit
+    from train import TrainArgs
+
+    train_args = TrainArgs().parse_args(
+        ["--run_name", "bench run", "--exp_name", "bench"]
+    )
+    return [
+        measure(
+            "pueue_submit_dry_run",
+            lambda: pueue_submit(train_args, pueue_group="bench", dry_run=True),
+            args.repeat,
+        )
+    ]
+
+
+def bench_tap_parser(args: MicrobenchArgs) -> List[Dict[str, Any]]:
+    from utils.tap_parser import _parse_tap, create_pydantic_model
+    from train import TrainArgs
+
+    return [
+        measure("parse_tap", lambda: _parse_tap(TrainArgs), args.repeat),
+        measure(
+            "create_pydantic_model",
+            lambda: create_pydantic_model(TrainArgs),
+            args.repeat,
+        ),
+    ]
+
+
+def bench_device_lock(args: MicrobenchArgs) -> List[Dict[str, Any]]:
+    from utils import FakeGPUBackend, TorchDeviceManager
+
+    with tempfile.TemporaryDirectory() as lock_dir:
+        manager = TorchDeviceManager(
+            lock_dir=lock_dir, backend=FakeGPUBackend(num_devices=4, memory=16384)
+        )
+
+        def acquire_release(**kwargs) -> None:
+            _, lock = manager.get_device_and_lock(**kwargs)
+            lock.release()
+
+        return [
+            measure(
+                "get_device_and_lock",
+                acquire_release,
+                args.repeat,
+                num_devices=4,
+            ),
+            measure(
+                "get_device_and_lock_shared",
+                lambda: acquire_release(memory=1024),
+                args.repeat,
+                num_devices=4,
+                memory=1024,
+            ),
+        ]
+
+
+def bench_train_epoch(args: MicrobenchArgs) -> List[Dict[str, Any]]:
+    import mlflow
+    from train import TrainTask, train_model
+
+    with tempfile.TemporaryDirectory() as tracking_dir:
+        # Local file store, so the numbers don't depend on a tracking server
+        # NOTE: newer MLFlow refuses the file store unless explicitly allowed
+        os.environ.setdefault("MLFLOW_ALLOW_FILE_STORE", "true")
+        previous_uri = mlflow.get_tracking_uri()
+        mlflow.set_tracking_uri(f"file://{tracking_dir}")
+        try:
+            run = lambda epochs: train_model(
+                TrainTask(epochs=epochs, exp_name="microbench", save_model=False)
+            )
+            # First run creates the experiment and loads everything
+            run(1)
+            # `train_model` only logs its errors, don't time a failing run
+            runs = mlflow.search_runs(experiment_names=["microbench"])
+            if not (runs["status"] == "FINISHED").any():
+                raise RuntimeError("train_model failed, see its logs")
+            short = measure("train_model_1_epoch", lambda: run(1), args.repeat, 1)
+            long = measure(
+                f"train_model_{args.epochs}_epochs",
+                lambda: run(args.epochs),
+                args.repeat,
+                1,
+            )
+        finally:
+            mlflow.set_tracking_uri(previous_uri)
+
+    per_epoch = {
+        "name": "train_model_epoch",
+        "median": (long["median"] - short["median"]) / (args.epochs - 1),
+        "min": (long["min"] - short["min"]) / (args.epochs - 1),
+        "number": 1,
+        "repeat": args.repeat,
+    }
+    logger.info(
+        f"{per_epoch['name']:<32} {per_epoch['median'] * 1e3:10.3f} ms (run overhead {(short['median'] - per_epoch['median']) * 1e3:.3f} ms)"
+    )
+    return [short, long, per_epoch]
+
+
+def bench_checkpoint(args: MicrobenchArgs) -> List[Dict[str, Any]]:
+    import torch
+    import mlflow.pytorch
+    from utils import STATE_DICT_FILE_NAME, file_sha256
+
+    results = []
+    for size in args.checkpoint_sizes:
+        model = torch.nn.Linear(size * 1024 * 1024 // 4 // 1024, 1024, bias=False)
+        state_dict = {"epoch": 0, "model_state_dict": model.state_dict()}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state_dict")
+
+            def save() -> None:
+                # Same as `AsyncCheckpointWriter`, minus the upload
+                mlflow.pytorch.save_state_dict(state_dict, path)
+                file_sha256(os.path.join(path, STATE_DICT_FILE_NAME))
+
+            results.append(
+                measure(f"checkpoint_save_{size}MiB", save, args.repeat, 1, size=size)
+            )
+            results.append(
+                measure(
+                    f"checkpoint_load_{size}MiB",
+                    lambda: mlflow.pytorch.load_state_dict(path),
+                    args.repeat,
+                    1,
+                    size=size,
+                )
+            )
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[MicrobenchArgs], List[Dict[str, Any]]]] = {
+    "pueue": bench_pueue,
+    "tap_parser": bench_tap_parser,
+    "device_lock": bench_device_lock,
+    "train_epoch": bench_train_epoch,
+    "checkpoint": bench_checkpoint,
+}
+
+
+def get_environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """
+    Names of the benchmarks whose median got slower than the baseline by more than `tolerance`
+    """
+    baseline = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        if (previous := baseline.get(result["name"])) is None or previous[
+            "median"
+        ] <= 0:
+            continue
+        ratio = result["median"] / previous["median"]
+        regressed = ratio > 1 + tolerance
+        print(
+            f"{'SLOWER' if regressed else 'OK    '} {result['name']:<32} {ratio:6.2f}x"
+        )
+        if regressed:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main(args: MicrobenchArgs) -> bool:
+    # Don't time (or print) the log lines of the code being measured
+    logger.disable("pueue")
+    logger.disable("train")
+    logger.disable("utils")
+
+    results = []
+    for name in args.benchmarks:
+        results.extend(BENCHMARKS[name](args))
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(
+                {"environment": get_environment(), "results": results}, fp, indent=4
+            )
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        return not compare(results, baseline["results"], args.tolerance)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(MicrobenchArgs().parse_args()) else 1)
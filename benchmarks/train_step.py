@@ -0,0 +1,114 @@
+"""
+Training steps per second on CPU for each variant of the training step (see `train.build_train_step`).
+A step is one mini-batch (forward and backward), so compare `samples_per_second` against the full batch baseline.
+
+    python benchmarks/train_step.py
+    python benchmarks/train_step.py --variants baseline minibatch bf16 --steps 500
+"""
+
+from typing import Any, Dict, List, Optional
+import json
+import os
+import sys
+import time
+from tap import Tap
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from train import build_train_step
+
+# variant -> TrainArgs it sets on top of mini-batches with one host sync per run
+VARIANTS: Dict[str, Dict[str, Any]] = {
+    # What the training loop used to do: full batch, loss read back every step
+    "baseline": {"batch_size": 0, "sync_every_step": True},
+    "minibatch": {},
+    "accumulation": {"grad_accumulation_steps": 4},
+    "bf16": {"precision": "bf16"},
+    "compile": {"compile_model": True},
+    "fast": {"grad_accumulation_steps": 4, "precision": "bf16", "compile_model": True},
+}
+
+
+class TrainStepArgs(Tap):
+    variants: List[str] = list(VARIANTS)  # Variants to measure
+    rows: int = 8192  # Rows of the random dataset
+    features: int = 256  # Input size of the model
+    hidden: int = 1024  # Hidden size of the model
+    batch_size: int = 256  # Mini-batch size
+    warmup: int = 20  # Steps before measuring (includes compiling)
+    steps: int = 200  # Steps to measure
+    output: Optional[str] = None  # Also write the results as JSON to this file
+
+
+def run_variant(args: TrainStepArgs, variant: str) -> Dict[str, Any]:
+    import torch
+
+    options = VARIANTS[variant]
+    torch.manual_seed(0)
+    device = torch.device("cpu")
+    model = torch.nn.Sequential(
+        torch.nn.Linear(args.features, args.hidden),
+        torch.nn.ReLU(),
+        torch.nn.Linear(args.hidden, 1),
+    )
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.01)
+    grad_accumulation_steps = options.get("grad_accumulation_steps", 1)
+    train_step = build_train_step(
+        model,
+        optimizer,
+        torch.nn.MSELoss(),
+        device,
+        precision=options.get("precision", "fp32"),
+        grad_accumulation_steps=grad_accumulation_steps,
+        compile_model=options.get("compile_model", False),
+    )
+
+    batch_size = options.get("batch_size", args.batch_size) or args.rows
+    data = torch.randn(args.rows, args.features)
+    target = torch.randn(args.rows, 1)
+    batches = list(zip(data.split(batch_size), target.split(batch_size)))
+
+    def run(num_steps: int) -> None:
+        total_loss = torch.zeros(())
+        for step in range(num_steps):
+            features, targets = batches[step % len(batches)]
+            loss = train_step(
+                features, targets, update=(step + 1) % grad_accumulation_steps == 0
+            )
+            if options.get("sync_every_step"):
+                loss.item()
+            else:
+                total_loss += loss
+        total_loss.item()
+
+    run(args.warmup)
+    start = time.perf_counter()
+    run(args.steps)
+    seconds = time.perf_counter() - start
+    return {
+        "variant": variant,
+        "batch_size": batch_size,
+        "steps": args.steps,
+        "seconds": seconds,
+        "steps_per_second": args.steps / seconds,
+        "samples_per_second": args.steps * batch_size / seconds,
+    }
+
+
+def main(args: TrainStepArgs) -> List[Dict[str, Any]]:
+    results = []
+    for variant in args.variants:
+        results.append(result := run_variant(args, variant))
+        print(
+            f"{variant:<13} {result['steps_per_second']:10.1f} steps/s {result['samples_per_second']:12.0f} samples/s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=4)
+    return results
+
+
+if __name__ == "__main__":
+    main(TrainStepArgs().parse_args())
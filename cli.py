@@ -1,7 +1,5 @@
 from typing import Optional
 from train import TrainArgs, train_model
-import mlflow
-import mlflow.pytorch
 from tap import Tap
 from loguru import logger
 
@@ -12,6 +10,10 @@ class ResumeArgs(Tap):
 
 
 if __name__ == "__main__":
+    # NOTE: imported here, so importing ResumeArgs (e.g. to submit to pueue) doesn't load MLFlow
+    import mlflow
+    import mlflow.pytorch
+    from utils import CheckpointCache, clear_stop
 
     logger.info(f"Tracking URI: {mlflow.get_tracking_uri()}")
     # The artifact URI is associated with an active run, so you need to start a run first
@@ -42,10 +44,14 @@ if __name__ == "__main__":
                     f"No checkpoint found for run {run.info.run_id}. Will train from scratch."
                 )
             else:
-                resume_state_dict = mlflow.pytorch.load_state_dict(
-                    run.info.artifact_uri + f"/checkpoint/latest"
+                resume_state_dict = CheckpointCache().load_state_dict(
+                    run.info.run_id,
+                    f"checkpoint/latest",
+                    artifact_uri=run.info.artifact_uri,
                 )
                 run_id = run.info.run_id
+                # The run may have been stopped through `DELETE /jobs/{job_id}` before
+                clear_stop(run_id)
         except:
             pass
 
@@ -6,5 +6,63 @@ USE_THREAD = False
 LOCK_DIR = os.path.expanduser("~/.gpu_locks")
 LOCK_EXTENSION = ".lock"
 WAIT_TIME = 10
+GPU_POLL_INTERVAL = 0.1  # Seconds between lock attempts while waiting for a GPU released by another process
+FAKE_GPU_NUM = int(os.getenv("FAKE_GPU_NUM", 0))  # Pretend to have N GPUs (training runs on CPU) to test GPU allocation
+FAKE_GPU_MEMORY = int(os.getenv("FAKE_GPU_MEMORY", 16384))  # Memory (MiB) of each fake GPU
+GPU_MEMORY_HEADROOM = 0.1  # Fraction of GPU memory kept free when packing jobs sharing a GPU
+GPU_MEMORY_OVERHEAD = 512  # MiB added to estimated model memory for CUDA context and activations
+MAX_JOBS_PER_GPU = int(os.getenv("MAX_JOBS_PER_GPU", 1))  # API executor workers per GPU, raise it so jobs with gpu_memory can share GPUs
+STOP_DIR = os.path.expanduser("~/.ml_api_stop")  # Stop request files of training runs
 
 MAX_PARALLEL_NUM = os.cpu_count()
+# CPU-only jobs: "narrow" runs one single-core job per core, "wide" runs CPU_WIDE_JOBS jobs splitting all cores
+CPU_JOB_MODE = os.getenv("CPU_JOB_MODE", "narrow")
+CPU_WIDE_JOBS = int(os.getenv("CPU_WIDE_JOBS", 2))
+
+# MLFlow batch logging
+METRIC_BATCH_SIZE = 100  # Flush when this many metrics are buffered
+METRIC_FLUSH_INTERVAL = 5  # Flush at least every this many seconds
+
+# Data
+DATA_BATCH_SIZE = 256  # Mini-batch size of sharded data (data_path) when batch_size is 0, streamed instead of loaded whole
+
+# Checkpoint
+# Max distinct checkpoint paths waiting for upload before training blocks
+CHECKPOINT_MAX_PENDING = 4
+CHECKPOINT_CACHE_DIR = os.path.expanduser("~/.cache/ml_api_checkpoints")
+CHECKPOINT_CACHE_MAX_SIZE = 10 * 1024**3  # Bytes, least recently used checkpoints are evicted beyond this
+
+# Pueue
+PUEUE_POLL_INTERVAL = 2  # Seconds between pueue status snapshots
+# pueue's data directory (task logs are read from its `task_logs`), found from pueue.yml / platform default if not set
+PUEUE_DIRECTORY = os.getenv("PUEUE_DIRECTORY")
+PUEUE_TAIL_MAX_BYTES = 1024**2  # Max output bytes returned per tail request
+PUEUE_TAIL_INTERVAL = 0.5  # Seconds between log checks when following a task
+
+# API
+MLFLOW_CLIENT_WORKERS = 16  # Threads for concurrent tracking server calls in the API
+RUN_STATUS_CACHE_TTL = 5  # Seconds run statuses of `GET /status` are served from cache
+# Experiment name -> ID, shared by the processes of this host, checked again (e.g. deleted) after EXPERIMENT_CACHE_TTL seconds
+EXPERIMENT_CACHE_PATH = os.path.expanduser("~/.cache/ml_api_experiments.json")
+EXPERIMENT_CACHE_TTL = 300
+# Training processes on this host publish live metrics to the API (`GET /runs/{run_id}/stream`) over UDP
+METRIC_STREAM = os.getenv("METRIC_STREAM", "true").lower() == "true"
+METRIC_STREAM_HOST = "127.0.0.1"
+METRIC_STREAM_PORT = int(os.getenv("METRIC_STREAM_PORT", 8765))
+METRIC_STREAM_BACKLOG = 1000  # Recent events per run replayed to new subscribers
+# Max concurrent requests per endpoint group, keep "status" below MLFLOW_CLIENT_WORKERS so polls can't starve submissions
+ENDPOINT_CONCURRENCY = {
+    "train": 8,
+    "resume": 4,
+    "sweep": 2,
+    "status": 8,
+    "pueue": 32,
+    "jobs": 64,
+}
+SCHEDULER_MAX_QUEUE = 256  # Max jobs waiting for a free worker, more submissions get HTTP 429
+SCHEDULER_RETRY_AFTER = 30  # Retry-After seconds when the queue is full and no job finished yet to estimate from
+# API worker processes are replaced after this many tasks or beyond this RSS (bytes), 0 to disable
+WORKER_MAX_TASKS = 50
+WORKER_MAX_RSS = 4 * 1024**3
+WORKER_START_METHOD = None  # multiprocessing start method of API workers, None for the platform default
+JOB_REGISTRY_MAX_FINISHED = 1000  # Finished jobs kept in the API job registry, oldest are forgotten first
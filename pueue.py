@@ -1,30 +1,58 @@
-from typing import Union, Optional, Literal, Dict
+from typing import (
+    Union,
+    Optional,
+    Literal,
+    Dict,
+    Tuple,
+    List,
+    Sequence,
+    AsyncIterator,
+    BinaryIO,
+)
+import asyncio
+import codecs
+import re
 import subprocess
 import os
 import sys
+import threading
+import time
 from cli import ResumeArgs
 from train import TrainArgs
+import config
 from loguru import logger
 import json
+from utils.metrics import PUEUE_COMMAND_SECONDS, PUEUE_COMMAND_ERRORS
 
 curr_dir = os.path.dirname(os.path.abspath(__file__))
 
 
+def _run(args: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    `subprocess.run`, timed per pueue subcommand (`pueue_command_duration_seconds` in `/metrics`)
+    """
+    with PUEUE_COMMAND_SECONDS.time(command=args[1]):
+        try:
+            return subprocess.run(args, **kwargs)
+        except (OSError, subprocess.CalledProcessError):
+            # NOTE: only checked calls count, unchecked ones expect failures (e.g. `group add` of an existing group)
+            PUEUE_COMMAND_ERRORS.inc(command=args[1])
+            raise
+
+
 def pueue_set_parallel(
     pueue_group: Optional[str] = None, pueue_parallel: Optional[int] = 1
 ) -> None:
     if pueue_group:
         # Don't check this since if a group exist it will return 1
-        temp_return = subprocess.run(
-            ["pueue", "group", "add", pueue_group], capture_output=True
-        )
+        temp_return = _run(["pueue", "group", "add", pueue_group], capture_output=True)
         logger.info(
             f"Create pueue group {pueue_group}: {temp_return.stdout.decode().strip()}"
         )
 
     if pueue_parallel > 1:
         if pueue_group:
-            temp_return = subprocess.run(
+            temp_return = _run(
                 ["pueue", "parallel", "-g", pueue_group, f"{pueue_parallel}"],
                 capture_output=True,
                 check=True,
@@ -33,7 +61,7 @@ def pueue_set_parallel(
                 f"Set parallel for {pueue_group}: {temp_return.stdout.decode().strip()}"
             )
         else:
-            temp_return = subprocess.run(
+            temp_return = _run(
                 ["pueue", "parallel", f"{pueue_parallel}"],
                 capture_output=True,
                 check=True,
@@ -41,15 +69,11 @@ def pueue_set_parallel(
             logger.info(f"Set parallel: {temp_return.stdout.decode().strip()}")
 
 
-def pueue_submit(
+def _build_pueue_add_args(
     parsed_args: Union[TrainArgs, ResumeArgs],
     pueue_group: Optional[str] = None,
-    pueue_parallel: Optional[int] = 1,
-    dir_path: str = curr_dir,
     pueue_return_task_id_only: bool = False,
-    dry_run: bool = False,
-    extra_submit_env: Optional[Dict[str, str]] = None,
-) -> str:  # Tuple[str, str]:
+) -> List[str]:
     args = ["pueue", "add"]
 
     if pueue_group:
@@ -59,8 +83,6 @@ def pueue_submit(
         # https://github.com/Nukesor/pueue/blob/main/CHANGELOG.md#added-14
         args.append("--print-task-id")
 
-    pueue_set_parallel(pueue_group, pueue_parallel)
-
     args.append("--")
 
     if isinstance(parsed_args, TrainArgs) or isinstance(parsed_args, ResumeArgs):
@@ -103,34 +125,110 @@ def pueue_submit(
             # Since we pass args instead of command string, we can get rid of ""
             args[-1] = f"'{args[-1]}'"
 
-    command = r" ".join(args)
-    logger.info(command)
+    return args
 
-    if dry_run:
-        return command  # , ""
 
+def _expand_submit_env(
+    extra_submit_env: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, str]]:
     # Expand OS environment to extra_submit_env, since subprocess will default use it when `env` is not set
     # NOTE: we must have OS environment otherwise it won't be able to find the pueue executable
     if extra_submit_env is not None:
         for key, value in os.environ.items():
             if key not in extra_submit_env:
                 extra_submit_env[key] = value
+    return extra_submit_env
+
 
+def _pueue_add(
+    args: List[str], dir_path: str, env: Optional[Dict[str, str]] = None
+) -> str:
     # https://docs.python.org/3/library/subprocess.html#subprocess.run
-    result = subprocess.run(
+    result = _run(
         args,
         cwd=dir_path,
         capture_output=True,
         text=True,
         check=True,
-        env=extra_submit_env,
+        env=env,
     )
     return result.stdout.strip()  # , result.stderr
 
 
+def pueue_submit(
+    parsed_args: Union[TrainArgs, ResumeArgs],
+    pueue_group: Optional[str] = None,
+    pueue_parallel: Optional[int] = 1,
+    dir_path: str = curr_dir,
+    pueue_return_task_id_only: bool = False,
+    dry_run: bool = False,
+    extra_submit_env: Optional[Dict[str, str]] = None,
+) -> str:  # Tuple[str, str]:
+    args = _build_pueue_add_args(parsed_args, pueue_group, pueue_return_task_id_only)
+
+    command = r" ".join(args)
+    logger.info(command)
+
+    if dry_run:
+        return command  # , ""
+
+    pueue_set_parallel(pueue_group, pueue_parallel)
+
+    output = _pueue_add(args, dir_path, _expand_submit_env(extra_submit_env))
+    if _pueue_poller is not None:
+        # So the new task shows up on next query
+        _pueue_poller.invalidate()
+    return output
+
+
+def pueue_submit_many(
+    parsed_args_list: Sequence[Union[TrainArgs, ResumeArgs]],
+    pueue_group: Optional[str] = None,
+    pueue_parallel: Optional[int] = 1,
+    dir_path: str = curr_dir,
+    pueue_return_task_id_only: bool = False,
+    dry_run: bool = False,
+    extra_submit_env: Optional[Dict[str, str]] = None,
+    extra_submit_envs: Optional[Sequence[Optional[Dict[str, str]]]] = None,
+) -> List[str]:
+    """
+    Same as `pueue_submit` for many tasks, but the group and parallelism are configured only once.
+    `extra_submit_envs` are per-task environments (on top of `extra_submit_env`), e.g. `MLFLOW_RUN_ID`.
+    NOTE: `pueue add` takes a single command, so we still need one `pueue add` per task.
+    """
+    args_list = [
+        _build_pueue_add_args(parsed_args, pueue_group, pueue_return_task_id_only)
+        for parsed_args in parsed_args_list
+    ]
+    commands = [r" ".join(args) for args in args_list]
+    for command in commands:
+        logger.info(command)
+
+    if dry_run:
+        return commands
+
+    pueue_set_parallel(pueue_group, pueue_parallel)
+
+    env = _expand_submit_env(extra_submit_env)
+    if extra_submit_envs is None:
+        outputs = [_pueue_add(args, dir_path, env) for args in args_list]
+    else:
+        outputs = [
+            _pueue_add(
+                args,
+                dir_path,
+                {**(env or os.environ), **task_env} if task_env else env,
+            )
+            for args, task_env in zip(args_list, extra_submit_envs)
+        ]
+    if _pueue_poller is not None:
+        _pueue_poller.invalidate()
+    return outputs
+
+
 def pueue_status(task_id: Optional[str] = None) -> dict:
     all_status = json.loads(
-        subprocess.run(
+        _run(
             ["pueue", "status", "--json"], stdout=subprocess.PIPE, check=True
         ).stdout.decode()
     )
@@ -142,41 +240,354 @@ def pueue_status(task_id: Optional[str] = None) -> dict:
 def pueue_logs(task_id: Optional[str] = None) -> dict:
     if task_id:
         return json.loads(
-            subprocess.run(
+            _run(
                 ["pueue", "log", task_id, "--json"], stdout=subprocess.PIPE, check=True
             ).stdout.decode()
         )[task_id]
 
     return json.loads(
-        subprocess.run(
+        _run(
             ["pueue", "log", "--json"], stdout=subprocess.PIPE, check=True
         ).stdout.decode()
     )
 
 
+async def _async_run(
+    args: List[str],
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    check: bool = True,
+) -> str:
+    """
+    `subprocess.run` counterpart that doesn't block the event loop
+    """
+    with PUEUE_COMMAND_SECONDS.time(command=args[1]):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=cwd,
+                env=env,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError:
+            PUEUE_COMMAND_ERRORS.inc(command=args[1])
+            raise
+        stdout, stderr = await process.communicate()
+    if check and process.returncode != 0:
+        PUEUE_COMMAND_ERRORS.inc(command=args[1])
+        raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+    return stdout.decode()
+
+
+async def async_pueue_set_parallel(
+    pueue_group: Optional[str] = None, pueue_parallel: Optional[int] = 1
+) -> None:
+    if pueue_group:
+        # Don't check this since if a group exist it will return 1
+        output = await _async_run(["pueue", "group", "add", pueue_group], check=False)
+        logger.info(f"Create pueue group {pueue_group}: {output.strip()}")
+
+    if pueue_parallel > 1:
+        if pueue_group:
+            output = await _async_run(
+                ["pueue", "parallel", "-g", pueue_group, f"{pueue_parallel}"]
+            )
+            logger.info(f"Set parallel for {pueue_group}: {output.strip()}")
+        else:
+            output = await _async_run(["pueue", "parallel", f"{pueue_parallel}"])
+            logger.info(f"Set parallel: {output.strip()}")
+
+
+async def async_pueue_submit(
+    parsed_args: Union[TrainArgs, ResumeArgs],
+    pueue_group: Optional[str] = None,
+    pueue_parallel: Optional[int] = 1,
+    dir_path: str = curr_dir,
+    pueue_return_task_id_only: bool = False,
+    dry_run: bool = False,
+    extra_submit_env: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Same as `pueue_submit` without blocking the event loop
+    """
+    return (
+        await async_pueue_submit_many(
+            [parsed_args],
+            pueue_group=pueue_group,
+            pueue_parallel=pueue_parallel,
+            dir_path=dir_path,
+            pueue_return_task_id_only=pueue_return_task_id_only,
+            dry_run=dry_run,
+            extra_submit_env=extra_submit_env,
+        )
+    )[0]
+
+
+async def async_pueue_submit_many(
+    parsed_args_list: Sequence[Union[TrainArgs, ResumeArgs]],
+    pueue_group: Optional[str] = None,
+    pueue_parallel: Optional[int] = 1,
+    dir_path: str = curr_dir,
+    pueue_return_task_id_only: bool = False,
+    dry_run: bool = False,
+    extra_submit_env: Optional[Dict[str, str]] = None,
+    extra_submit_envs: Optional[Sequence[Optional[Dict[str, str]]]] = None,
+) -> List[str]:
+    """
+    Same as `pueue_submit_many` without blocking the event loop
+    """
+    args_list = [
+        _build_pueue_add_args(parsed_args, pueue_group, pueue_return_task_id_only)
+        for parsed_args in parsed_args_list
+    ]
+    commands = [r" ".join(args) for args in args_list]
+    for command in commands:
+        logger.info(command)
+
+    if dry_run:
+        return commands
+
+    await async_pueue_set_parallel(pueue_group, pueue_parallel)
+
+    env = _expand_submit_env(extra_submit_env)
+    outputs = []
+    # NOTE: sequentially, to keep the queue order
+    for args, task_env in zip(args_list, extra_submit_envs or [None] * len(args_list)):
+        output = await _async_run(
+            args,
+            cwd=dir_path,
+            env={**(env or os.environ), **task_env} if task_env else env,
+        )
+        outputs.append(output.strip())
+    if _pueue_poller is not None:
+        _pueue_poller.invalidate()
+    return outputs
+
+
+async def async_pueue_status(task_id: Optional[str] = None) -> dict:
+    all_status = json.loads(await _async_run(["pueue", "status", "--json"]))
+    if task_id:
+        return all_status["tasks"][task_id]
+    return all_status
+
+
+async def async_pueue_logs(task_id: Optional[str] = None) -> dict:
+    if task_id:
+        return json.loads(await _async_run(["pueue", "log", task_id, "--json"]))[
+            task_id
+        ]
+    return json.loads(await _async_run(["pueue", "log", "--json"]))
+
+
+class PueueStatusPoller:
+    """
+    Keep a single in-memory snapshot of `pueue status --json`, refreshed by one background thread every `interval` seconds,
+    so that status queries don't fork a `pueue` subprocess each.
+
+    Per-task logs (`pueue log <task_id> --json`, needed for the output) are not part of `pueue status`,
+    they are cached per task for `interval` seconds and concurrent requests for the same task share one subprocess.
+    """
+
+    def __init__(self, interval: float = config.PUEUE_POLL_INTERVAL):
+        self._interval = interval
+        self._snapshot: Optional[dict] = None
+        self._snapshot_time = 0.0
+        self._error: Optional[Exception] = None
+        # Serialize refreshes so that concurrent callers share one subprocess
+        self._refresh_lock = threading.Lock()
+        self._logs: Dict[str, Tuple[float, dict]] = {}
+        self._logs_locks: Dict[str, threading.Lock] = {}
+        self._logs_locks_lock = threading.Lock()
+        # Same for callers on an event loop (api.py)
+        self._async_refreshing: Optional[asyncio.Future] = None
+        self._async_logs: Dict[str, asyncio.Future] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "PueueStatusPoller":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._worker, name="PueueStatusPoller", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _worker(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Failed to poll pueue status: {e}")
+            self._stop_event.wait(self._interval)
+
+    def refresh(self, newer_than: Optional[float] = None) -> dict:
+        """
+        Refresh the snapshot, unless another caller already refreshed it after `newer_than` (monotonic time).
+        """
+        with self._refresh_lock:
+            if (
+                newer_than is not None
+                and self._snapshot is not None
+                and self._snapshot_time >= newer_than
+            ):
+                return self._snapshot
+            try:
+                snapshot = pueue_status()
+            except Exception as e:
+                self._error = e
+                raise
+            return self._set_snapshot(snapshot)
+
+    def _set_snapshot(self, snapshot: dict) -> dict:
+        self._snapshot, self._snapshot_time, self._error = (
+            snapshot,
+            time.monotonic(),
+            None,
+        )
+        return snapshot
+
+    async def _async_refresh(self) -> dict:
+        if (
+            self._async_refreshing is None
+            or self._async_refreshing.done()
+            or self._async_refreshing.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._async_refreshing = asyncio.ensure_future(async_pueue_status())
+        # Shield so one cancelled request doesn't cancel the refresh for the others
+        return self._set_snapshot(await asyncio.shield(self._async_refreshing))
+
+    def invalidate(self) -> None:
+        """
+        Make the next query refresh the snapshot (e.g. right after submitting a task).
+        """
+        self._snapshot_time = 0.0
+
+    def _cached_snapshot(self, task_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the snapshot if it can answer the query without a subprocess, otherwise None.
+        """
+        now = time.monotonic()
+        if self._snapshot is None or now - self._snapshot_time > self._interval * 2:
+            # Not polled yet, or the poller is stuck/failing
+            return None
+        if (
+            task_id
+            and task_id not in self._snapshot["tasks"]
+            and now - self._snapshot_time > 0.5
+        ):
+            # Might be submitted after the last poll
+            return None
+        return self._snapshot
+
+    def snapshot(self) -> dict:
+        return self.status()
+
+    def status(self, task_id: Optional[str] = None) -> dict:
+        self.start()
+        if (all_status := self._cached_snapshot(task_id)) is None:
+            all_status = self.refresh(newer_than=time.monotonic() - 0.5)
+        return all_status["tasks"][task_id] if task_id else all_status
+
+    async def async_status(self, task_id: Optional[str] = None) -> dict:
+        self.start()
+        if (all_status := self._cached_snapshot(task_id)) is None:
+            all_status = await self._async_refresh()
+        return all_status["tasks"][task_id] if task_id else all_status
+
+    def _cached_logs(self, task_id: str) -> Optional[dict]:
+        cached = self._logs.get(task_id)
+        if cached is not None and time.monotonic() - cached[0] <= self._interval:
+            return cached[1]
+        return None
+
+    def logs(self, task_id: str) -> dict:
+        with self._logs_locks_lock:
+            task_lock = self._logs_locks.setdefault(task_id, threading.Lock())
+        with task_lock:
+            if (logs := self._cached_logs(task_id)) is not None:
+                return logs
+            logs = pueue_logs(task_id=task_id)
+            self._logs[task_id] = (time.monotonic(), logs)
+            return logs
+
+    async def async_logs(self, task_id: str) -> dict:
+        if (logs := self._cached_logs(task_id)) is not None:
+            return logs
+        future = self._async_logs.get(task_id)
+        if (
+            future is None
+            or future.done()
+            or future.get_loop() is not asyncio.get_running_loop()
+        ):
+            future = self._async_logs[task_id] = asyncio.ensure_future(
+                async_pueue_logs(task_id=task_id)
+            )
+        try:
+            logs = await asyncio.shield(future)
+        finally:
+            if future.done() and self._async_logs.get(task_id) is future:
+                del self._async_logs[task_id]
+        self._logs[task_id] = (time.monotonic(), logs)
+        return logs
+
+
+_pueue_poller: Optional[PueueStatusPoller] = None
+_pueue_poller_lock = threading.Lock()
+
+
+def get_pueue_poller() -> PueueStatusPoller:
+    """
+    Process-wide poller (started on first use)
+    """
+    global _pueue_poller
+    with _pueue_poller_lock:
+        if _pueue_poller is None:
+            _pueue_poller = PueueStatusPoller()
+        return _pueue_poller.start()
+
+
+def _get_running_status(task: dict) -> str:
+    status = task["status"]
+    if isinstance(status, dict):
+        # {'detail': 'Not Found'}
+        return "Success" if "Done" in status else status
+    elif isinstance(status, str):
+        return status
+    else:
+        raise ValueError(f"Unknown status {status}")
+
+
+def _get_output(log: dict) -> dict:
+    return dict(
+        output=log["output"],
+        is_finished="Done" in log["task"]["status"],
+    )
+
+
 def get_pueue_task_status(
     mode: Literal["status", "logs", "running_status", "output"],
     task_id: Optional[str] = None,
 ):
     """
-    Basically the same as api.py one
+    Served from the shared `PueueStatusPoller` snapshot
     NOTE: Won't have stats when the task has not run (e.g. Queued)
     """
+    poller = get_pueue_poller()
     if mode == "status":
-        return pueue_status(task_id=task_id)
+        return poller.status(task_id=task_id)
     elif mode == "logs":
-        return pueue_logs(task_id=task_id)
+        return poller.logs(task_id=task_id) if task_id else pueue_logs()
     elif mode == "running_status":
         try:
             assert task_id
-            status = pueue_logs(task_id=task_id)["task"]["status"]
-            if isinstance(status, dict):
-                # {'detail': 'Not Found'}
-                return "Success" if "Done" in status else status
-            elif isinstance(status, str):
-                return status
-            else:
-                raise ValueError(f"Unknown status {status}")
+            return _get_running_status(poller.status(task_id=task_id))
         except:
             raise ValueError(
                 "In running_status mode you should query for an existing task_id"
@@ -184,11 +595,43 @@ def get_pueue_task_status(
     elif mode == "output":
         try:
             assert task_id
-            log = pueue_logs(task_id=task_id)
-            return dict(
-                output=log["output"],
-                is_finished="Done" in log["task"]["status"],
+            return _get_output(poller.logs(task_id=task_id))
+        except:
+            raise ValueError(
+                "In output mode you should query for an existing task_id",
             )
+    else:
+        raise NotImplementedError(f"Unknown mode {mode}")
+
+
+async def async_get_pueue_task_status(
+    mode: Literal["status", "logs", "running_status", "output"],
+    task_id: Optional[str] = None,
+):
+    """
+    Same as `get_pueue_task_status` without blocking the event loop (api.py uses this)
+    """
+    poller = get_pueue_poller()
+    if mode == "status":
+        return await poller.async_status(task_id=task_id)
+    elif mode == "logs":
+        return (
+            await poller.async_logs(task_id=task_id)
+            if task_id
+            else await async_pueue_logs()
+        )
+    elif mode == "running_status":
+        try:
+            assert task_id
+            return _get_running_status(await poller.async_status(task_id=task_id))
+        except:
+            raise ValueError(
+                "In running_status mode you should query for an existing task_id"
+            )
+    elif mode == "output":
+        try:
+            assert task_id
+            return _get_output(await poller.async_logs(task_id=task_id))
         except:
             raise ValueError(
                 "In output mode you should query for an existing task_id",
@@ -197,6 +640,137 @@ def get_pueue_task_status(
         raise NotImplementedError(f"Unknown mode {mode}")
 
 
+def get_pueue_log_dir() -> Optional[str]:
+    """
+    Where the pueue daemon writes task logs (`<pueue_directory>/task_logs`), None if not found on this host.
+    `config.PUEUE_DIRECTORY`, else `pueue_directory` of pueue.yml, else pueue's default for the platform.
+    """
+    directory = config.PUEUE_DIRECTORY
+    if not directory:
+        if sys.platform == "win32":
+            config_dir = os.getenv("APPDATA", "")
+            data_dir = os.getenv("LOCALAPPDATA", "")
+        elif sys.platform == "darwin":
+            config_dir = data_dir = os.path.expanduser("~/Library/Application Support")
+        else:
+            config_dir = os.getenv("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
+            data_dir = os.getenv("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+        directory = os.path.join(data_dir, "pueue")
+        try:
+            with open(os.path.join(config_dir, "pueue", "pueue.yml")) as fp:
+                if match := re.search(
+                    r"^\s*pueue_directory:\s*(.+?)\s*$", fp.read(), re.M
+                ):
+                    directory = os.path.expanduser(match.group(1).strip("'\""))
+        except OSError:
+            pass
+    log_dir = os.path.join(directory, "task_logs")
+    return log_dir if os.path.isdir(log_dir) else None
+
+
+def _decode_complete(data: bytes) -> Tuple[str, int]:
+    """
+    Decode UTF-8, leaving an incomplete trailing character for the next read. Returns (text, bytes used)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    text = decoder.decode(data, final=False)
+    return text, len(data) - len(decoder.getstate()[0])
+
+
+def _read_from(data: Union[bytes, BinaryIO], offset: int, max_bytes: int):
+    """
+    Up to `max_bytes` from `offset` of a log (bytes or an open file).
+    Restarts from 0 if the log is shorter than `offset` (e.g. the task was restarted and its log reset).
+    """
+    size = len(data) if isinstance(data, bytes) else data.seek(0, os.SEEK_END)
+    reset = offset > size
+    if reset:
+        offset = 0
+    if isinstance(data, bytes):
+        chunk = data[offset : offset + max_bytes]
+    else:
+        data.seek(offset)
+        chunk = data.read(max_bytes)
+    text, used = _decode_complete(chunk)
+    return text, offset + used, size, reset
+
+
+def _tail_result(
+    text: str, offset: int, size: int, reset: bool, done: bool, source: str
+) -> dict:
+    return dict(
+        output=text,
+        offset=offset,
+        reset=reset,
+        # Nothing more will be written, and all of it was read
+        is_finished=done and offset >= size,
+        source=source,
+    )
+
+
+def _read_task_log_file(task_id: str, offset: int, max_bytes: int):
+    if (log_dir := get_pueue_log_dir()) is None:
+        return None
+    try:
+        with open(os.path.join(log_dir, f"{int(task_id)}.log"), "rb") as fp:
+            return _read_from(fp, offset, max_bytes)
+    except (OSError, ValueError):
+        return None
+
+
+def pueue_tail(
+    task_id: str, offset: int = 0, max_bytes: int = config.PUEUE_TAIL_MAX_BYTES
+) -> dict:
+    """
+    Output of a task written after byte `offset`: `output`, and `offset` to pass next time.
+    Read from pueue's task log file when the daemon runs on this host, otherwise sliced from `pueue log`.
+    """
+    poller = get_pueue_poller()
+    # NOTE: status before reading, so "done" means the read saw the whole log
+    done = "Done" in poller.status(task_id=task_id)["status"]
+    if (read := _read_task_log_file(task_id, offset, max_bytes)) is not None:
+        return _tail_result(*read, done, "file")
+    log = poller.logs(task_id)
+    read = _read_from(log["output"].encode(), offset, max_bytes)
+    return _tail_result(*read, "Done" in log["task"]["status"], "pueue")
+
+
+async def async_pueue_tail(
+    task_id: str, offset: int = 0, max_bytes: int = config.PUEUE_TAIL_MAX_BYTES
+) -> dict:
+    """
+    Same as `pueue_tail` without blocking the event loop
+    """
+    poller = get_pueue_poller()
+    done = "Done" in (await poller.async_status(task_id=task_id))["status"]
+    read = await asyncio.to_thread(_read_task_log_file, task_id, offset, max_bytes)
+    if read is not None:
+        return _tail_result(*read, done, "file")
+    log = await poller.async_logs(task_id)
+    read = _read_from(log["output"].encode(), offset, max_bytes)
+    return _tail_result(*read, "Done" in log["task"]["status"], "pueue")
+
+
+async def async_follow_pueue_log(
+    task_id: str,
+    offset: int = 0,
+    interval: float = config.PUEUE_TAIL_INTERVAL,
+    max_bytes: int = config.PUEUE_TAIL_MAX_BYTES,
+) -> AsyncIterator[dict]:
+    """
+    `async_pueue_tail` chunks as output is appended, checking every `interval` seconds, until the task is done
+    """
+    while True:
+        chunk = await async_pueue_tail(task_id, offset, max_bytes)
+        if chunk["output"] or chunk["reset"] or chunk["is_finished"]:
+            yield chunk
+        offset = chunk["offset"]
+        if chunk["is_finished"]:
+            return
+        if not chunk["output"]:
+            await asyncio.sleep(interval)
+
+
 if __name__ == "__main__":
     args: TrainArgs = TrainArgs().parse_args()
     print(pueue_submit(args, dry_run=True))
@@ -206,6 +780,13 @@ if __name__ == "__main__":
     args.save_every_epoch = True
     args.save_model = False
     print(pueue_submit(args, "Non-Default Group", dry_run=True))
+    print(
+        pueue_submit_many(
+            [args, TrainArgs().parse_args(["--learning_rate", "0.1"])],
+            "Non-Default Group",
+            dry_run=True,
+        )
+    )
     exit()
     # print(pueue_submit(args, "Non-Default Group"))
     print(pueue_status())
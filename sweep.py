@@ -0,0 +1,477 @@
+from typing import Optional, Literal, Dict, Any, List
+from bisect import bisect_left
+from concurrent.futures import Executor, Future
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import uuid
+import mlflow
+from pydantic import BaseModel
+from tap import Tap
+from train import TrainTask, TrainArgs, train_model, get_exp_id, get_args_from_model
+from utils import request_stop, clear_stop, JobRegistry
+from loguru import logger
+
+
+class SweepArgs(Tap):
+    search_space: str  # JSON search space over TrainArgs fields, e.g. '{"learning_rate": [0.001, 0.01, 0.1]}'
+    search_mode: Literal["grid", "random"] = "grid"  # Grid over all combinations, or random samples
+    num_samples: int = 10  # Number of trials in random mode
+    seed: Optional[int] = None  # Random seed for random mode
+    scheduler: Literal["none", "asha"] = "none"  # "asha" to early stop bad trials with successive halving
+    metric: str = "loss"  # Per-epoch metric used by the scheduler
+    metric_mode: Literal["min", "max"] = "min"  # Whether lower or higher metric is better
+    min_epochs: int = 1  # ASHA: epochs of the first rung
+    reduction_factor: int = 3  # ASHA: only the top 1/reduction_factor trials continue at each rung
+    backend: Literal["executor", "pueue"] = "executor"  # Run trials in a local process pool or submit them to pueue
+    parallel: int = 1  # Number of concurrent trials
+    pueue_group: Optional[str] = None  # Pueue group of the trials
+    poll_interval: float = 10  # Seconds between scheduler checks
+    sweep_name: Optional[str] = None  # Optional sweep name (used as run name prefix)
+
+
+class SweepTask(BaseModel):
+    base: TrainTask = TrainTask()  # Arguments shared by all trials
+    search_space: Dict[str, Any]  # Search space over TrainTask fields
+    search_mode: Literal["grid", "random"] = "grid"
+    num_samples: int = 10
+    seed: Optional[int] = None
+    scheduler: Literal["none", "asha"] = "none"
+    metric: str = "loss"
+    metric_mode: Literal["min", "max"] = "min"
+    min_epochs: int = 1
+    reduction_factor: int = 3
+    backend: Literal["executor", "pueue"] = "executor"
+    parallel: int = 1  # Pueue parallel (the executor backend uses the API executor)
+    pueue_group: Optional[str] = None
+    poll_interval: float = 10
+    sweep_name: Optional[str] = None
+
+
+def _sample(spec: Any, rng: random.Random) -> Any:
+    """
+    A spec is either a list of choices, a constant, or a distribution like
+    `{"distribution": "loguniform", "low": 1e-4, "high": 1e-1}`
+    (distributions: "choice" (with "values"), "uniform", "loguniform", "int" (inclusive))
+    """
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if not isinstance(spec, dict):
+        return spec
+    distribution = spec.get("distribution", "choice")
+    if distribution == "choice":
+        return rng.choice(spec["values"])
+    elif distribution == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    elif distribution == "loguniform":
+        return math.exp(rng.uniform(math.log(spec["low"]), math.log(spec["high"])))
+    elif distribution == "int":
+        return rng.randint(spec["low"], spec["high"])
+    else:
+        raise NotImplementedError(f"Unknown distribution {distribution}")
+
+
+def expand_search_space(
+    search_space: Dict[str, Any],
+    search_mode: Literal["grid", "random"] = "grid",
+    num_samples: int = 10,
+    seed: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Return the list of argument overrides (one per trial)
+    """
+    if unknown := set(search_space) - set(TrainTask.model_fields):
+        raise ValueError(f"Unknown fields in search space: {sorted(unknown)}")
+
+    if search_mode == "grid":
+        values = []
+        for name, spec in search_space.items():
+            if isinstance(spec, dict):
+                if spec.get("distribution", "choice") != "choice":
+                    raise ValueError(
+                        f"Grid search only supports lists of choices, got {spec} for {name}"
+                    )
+                spec = spec["values"]
+            values.append(spec if isinstance(spec, list) else [spec])
+        return [
+            dict(zip(search_space, combination))
+            for combination in itertools.product(*values)
+        ]
+    elif search_mode == "random":
+        rng = random.Random(seed)
+        return [
+            {name: _sample(spec, rng) for name, spec in search_space.items()}
+            for _ in range(num_samples)
+        ]
+    else:
+        raise NotImplementedError(f"Unknown search mode {search_mode}")
+
+
+class SuccessiveHalving:
+    """
+    Asynchronous successive halving (ASHA): rungs are at `min_epochs * reduction_factor ** k` epochs.
+    When a trial reaches a rung, it only continues if it's within the top `1 / reduction_factor`
+    of all trials that reached that rung so far (the first `reduction_factor - 1` trials always continue).
+    """
+
+    def __init__(
+        self,
+        max_epochs: int,
+        min_epochs: int = 1,
+        reduction_factor: int = 3,
+        mode: Literal["min", "max"] = "min",
+    ):
+        if reduction_factor < 2:
+            raise ValueError("reduction_factor should be at least 2")
+        self.reduction_factor = reduction_factor
+        self.mode = mode
+        self.rungs: List[int] = []
+        rung = max(1, min_epochs)
+        while rung < max_epochs:
+            self.rungs.append(rung)
+            rung *= reduction_factor
+        # rung -> trial -> metric value
+        self.rung_values: Dict[int, Dict[str, float]] = {
+            rung: {} for rung in self.rungs
+        }
+
+    def _sort_key(self, value: float) -> float:
+        # NaN is always the worst
+        if math.isnan(value):
+            return math.inf
+        return value if self.mode == "min" else -value
+
+    def report(self, trial_id: str, history: Dict[int, float]) -> bool:
+        """
+        `history` is step (0-based epoch) -> metric value. Return False if the trial should be stopped.
+        A rung takes the value at its epoch, or the first one logged after it (e.g. with `log_interval` > 1).
+        """
+        steps = sorted(history)
+        for rung in self.rungs:
+            values = self.rung_values[rung]
+            if trial_id in values:
+                continue
+            if (index := bisect_left(steps, rung - 1)) == len(steps):
+                break
+            values[trial_id] = history[steps[index]]
+            if len(values) < self.reduction_factor:
+                # Not enough trials reached this rung to compare with
+                continue
+            keep = len(values) // self.reduction_factor
+            top = sorted(values, key=lambda key: self._sort_key(values[key]))[:keep]
+            if trial_id not in top:
+                return False
+        return True
+
+
+class Sweep:
+    """
+    Create one MLFlow run per trial, schedule them on an executor or pueue, and optionally early stop trials with ASHA.
+
+    Stopping is cooperative (see `utils.stop_signal`), so the trials have to run on this host.
+    """
+
+    def __init__(
+        self,
+        base: TrainTask,
+        search_space: Dict[str, Any],
+        search_mode: Literal["grid", "random"] = "grid",
+        num_samples: int = 10,
+        seed: Optional[int] = None,
+        scheduler: Literal["none", "asha"] = "none",
+        metric: str = "loss",
+        metric_mode: Literal["min", "max"] = "min",
+        min_epochs: int = 1,
+        reduction_factor: int = 3,
+        sweep_name: Optional[str] = None,
+    ):
+        self.sweep_id = uuid.uuid4().hex
+        self.sweep_name = sweep_name or f"sweep-{self.sweep_id[:8]}"
+        self.metric = metric
+        self.metric_mode = metric_mode
+
+        self.trials: List[Dict[str, Any]] = []
+        for index, overrides in enumerate(
+            expand_search_space(search_space, search_mode, num_samples, seed)
+        ):
+            task = TrainTask(
+                **{
+                    **base.model_dump(),
+                    "run_name": f"{self.sweep_name}-trial-{index}",
+                    **overrides,
+                }
+            )
+            self.trials.append(
+                {
+                    "index": index,
+                    "overrides": overrides,
+                    "task": task,
+                    "run_id": None,
+                    "task_id": None,
+                    "job_id": None,
+                    "status": "created",
+                }
+            )
+
+        self.scheduler = (
+            SuccessiveHalving(
+                max(trial["task"].epochs for trial in self.trials),
+                min_epochs=min_epochs,
+                reduction_factor=reduction_factor,
+                mode=metric_mode,
+            )
+            if scheduler == "asha" and self.trials
+            else None
+        )
+
+        self._client = mlflow.MlflowClient()
+        self._futures: Dict[str, Future] = {}
+        self._exp_ids: List[str] = []
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, base: TrainArgs, args: SweepArgs) -> "Sweep":
+        return cls(
+            TrainTask(**base.as_dict()),
+            json.loads(args.search_space),
+            search_mode=args.search_mode,
+            num_samples=args.num_samples,
+            seed=args.seed,
+            scheduler=args.scheduler,
+            metric=args.metric,
+            metric_mode=args.metric_mode,
+            min_epochs=args.min_epochs,
+            reduction_factor=args.reduction_factor,
+            sweep_name=args.sweep_name,
+        )
+
+    @classmethod
+    def from_task(cls, sweep_task: SweepTask) -> "Sweep":
+        return cls(
+            sweep_task.base,
+            sweep_task.search_space,
+            search_mode=sweep_task.search_mode,
+            num_samples=sweep_task.num_samples,
+            seed=sweep_task.seed,
+            scheduler=sweep_task.scheduler,
+            metric=sweep_task.metric,
+            metric_mode=sweep_task.metric_mode,
+            min_epochs=sweep_task.min_epochs,
+            reduction_factor=sweep_task.reduction_factor,
+            sweep_name=sweep_task.sweep_name,
+        )
+
+    def _create_runs(self) -> None:
+        exp_ids = {
+            exp_name: get_exp_id(exp_name)
+            for exp_name in {trial["task"].exp_name for trial in self.trials}
+        }
+        self._exp_ids = sorted(set(exp_ids.values()))
+        for trial in self.trials:
+            run = self._client.create_run(
+                experiment_id=exp_ids[trial["task"].exp_name],
+                run_name=trial["task"].run_name,
+                tags={"sweep": self.sweep_name, "sweep.trial": str(trial["index"])},
+            )
+            trial["run_id"] = run.info.run_id
+
+    def launch(
+        self,
+        backend: Literal["executor", "pueue"] = "executor",
+        executor: Optional[Executor] = None,
+        pueue_group: Optional[str] = None,
+        pueue_parallel: int = 1,
+        job_registry: Optional[JobRegistry] = None,
+    ) -> List[str]:
+        """
+        Create the runs and submit all trials. Return run IDs (executor) or pueue task IDs (pueue).
+        Executor trials are also tracked in `job_registry` if given.
+        """
+        self._create_runs()
+        if backend == "executor":
+            if executor is None:
+                raise ValueError("Executor backend needs an executor")
+            for trial in self.trials:
+                self._futures[trial["run_id"]] = executor.submit(
+                    train_model, trial["task"], trial["run_id"]
+                )
+                if job_registry is not None:
+                    trial["job_id"] = job_registry.register(
+                        self._futures[trial["run_id"]],
+                        run_id=trial["run_id"],
+                        kind="sweep",
+                        name=trial["task"].run_name,
+                    )
+                trial["status"] = "submitted"
+            return [trial["run_id"] for trial in self.trials]
+        elif backend == "pueue":
+            from pueue import pueue_submit_many
+
+            task_ids = pueue_submit_many(
+                [get_args_from_model(trial["task"]) for trial in self.trials],
+                pueue_group=pueue_group,
+                pueue_parallel=pueue_parallel,
+                pueue_return_task_id_only=True,
+                # `mlflow.start_run` picks up the pre-created run from environment
+                extra_submit_envs=[
+                    {"MLFLOW_RUN_ID": trial["run_id"]} for trial in self.trials
+                ],
+            )
+            for trial, task_id in zip(self.trials, task_ids):
+                trial["task_id"] = task_id
+                trial["status"] = "submitted"
+            return task_ids
+        else:
+            raise NotImplementedError(f"Unknown backend {backend}")
+
+    def _is_process_gone(self, trial: Dict[str, Any]) -> bool:
+        """
+        The run is still RUNNING in MLFlow but nothing is going to finish it (e.g. the worker crashed)
+        """
+        if future := self._futures.get(trial["run_id"]):
+            return future.done()
+        if trial["task_id"] is not None:
+            from pueue import get_pueue_task_status
+
+            try:
+                status = get_pueue_task_status("status", trial["task_id"])["status"]
+            except Exception:
+                return False
+            return isinstance(status, dict) and "Done" in status
+        return False
+
+    def step(self) -> bool:
+        """
+        Check all active trials once. Return False when every trial is done.
+        """
+        with self._lock:
+            active = {
+                trial["run_id"]: trial
+                for trial in self.trials
+                if trial["status"] in ("submitted", "running", "stopping")
+            }
+            if not active:
+                return False
+
+            run_ids = ", ".join(f"'{run_id}'" for run_id in active)
+            runs = self._client.search_runs(
+                self._exp_ids,
+                filter_string=f"attributes.run_id IN ({run_ids})",
+                max_results=len(active),
+            )
+            for run in runs:
+                trial = active[run.info.run_id]
+                trial["latest_metric"] = run.data.metrics.get(self.metric)
+                if run.info.status in ("FINISHED", "FAILED", "KILLED"):
+                    if trial["status"] == "stopping":
+                        trial["status"] = "stopped"
+                        clear_stop(run.info.run_id)
+                    else:
+                        trial["status"] = (
+                            "finished" if run.info.status == "FINISHED" else "failed"
+                        )
+                    continue
+
+                if self._is_process_gone(trial):
+                    trial["status"] = "failed"
+                    clear_stop(run.info.run_id)
+                    continue
+
+                if trial["status"] == "submitted" and self.metric in run.data.metrics:
+                    trial["status"] = "running"
+
+                if (
+                    self.scheduler is not None
+                    and trial["status"] == "running"
+                    and self.metric in run.data.metrics
+                ):
+                    history = {
+                        metric.step: metric.value
+                        for metric in self._client.get_metric_history(
+                            run.info.run_id, self.metric
+                        )
+                    }
+                    if not self.scheduler.report(run.info.run_id, history):
+                        logger.info(
+                            f"Early stopping trial {trial['index']} (run {run.info.run_id}) at epoch {max(history) + 1}"
+                        )
+                        request_stop(run.info.run_id)
+                        trial["status"] = "stopping"
+            return True
+
+    def run(self, poll_interval: float = 10) -> Dict[str, Any]:
+        """
+        Block until every trial is done
+        """
+        while self.step():
+            time.sleep(poll_interval)
+        return self.summary()
+
+    def run_in_background(self, poll_interval: float = 10) -> None:
+        self._thread = threading.Thread(
+            target=self.run,
+            args=(poll_interval,),
+            name=f"Sweep-{self.sweep_name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            trials = [
+                {
+                    "index": trial["index"],
+                    "overrides": trial["overrides"],
+                    "run_id": trial["run_id"],
+                    "task_id": trial["task_id"],
+                    "job_id": trial["job_id"],
+                    "status": trial["status"],
+                    self.metric: trial.get("latest_metric"),
+                }
+                for trial in self.trials
+            ]
+        scored = [
+            trial
+            for trial in trials
+            if trial["status"] == "finished" and trial[self.metric] is not None
+        ]
+        best = (
+            (min if self.metric_mode == "min" else max)(
+                scored, key=lambda trial: trial[self.metric]
+            )
+            if scored
+            else None
+        )
+        return {
+            "sweep_id": self.sweep_id,
+            "sweep_name": self.sweep_name,
+            "rungs": self.scheduler.rungs if self.scheduler else [],
+            "trials": trials,
+            "best": best,
+        }
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+
+    sweep_args = SweepArgs().parse_args(known_only=True)
+    train_args = TrainArgs().parse_args(sweep_args.extra_args)
+
+    sweep = Sweep.from_args(train_args, sweep_args)
+    logger.info(f"Sweep {sweep.sweep_name}: {len(sweep.trials)} trials")
+    if sweep_args.backend == "executor":
+        with ProcessPoolExecutor(max_workers=sweep_args.parallel) as executor:
+            sweep.launch("executor", executor=executor)
+            summary = sweep.run(sweep_args.poll_interval)
+    else:
+        sweep.launch(
+            "pueue",
+            pueue_group=sweep_args.pueue_group,
+            pueue_parallel=sweep_args.parallel,
+        )
+        summary = sweep.run(sweep_args.poll_interval)
+    print(json.dumps(summary, indent=2))
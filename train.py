@@ -1,36 +1,82 @@
-from typing import Optional, Union, Literal
-import torch
+from typing import Callable, List, Optional, Union, Literal, TYPE_CHECKING
+import os
 from pydantic import BaseModel
-import mlflow
-import mlflow.pytorch
-import mlflow.tracking.fluent
 from tap import Tap
 import config
-from utils import TorchDeviceManager
 from loguru import logger
-from tqdm.auto import tqdm
+
+# NOTE: torch, MLFlow and friends are imported inside the functions that use them,
+# so importing this module for its arguments (e.g. to submit to pueue) stays fast
+if TYPE_CHECKING:
+    from utils import DistributedContext
 
 
 class TrainTask(BaseModel):
     learning_rate: float = 0.01  # Learning rate for the optimizer
     epochs: int = 10  # Number of epochs to train
     gpu_id: int = -1  # GPU ID to use, -1 for automatic allocation
+    gpu_memory: float = 0  # GPU memory (MiB) needed to share a GPU with other jobs, -1 to estimate from the model, 0 for an exclusive GPU
     run_name: Optional[str] = None  # Optional run name for MLFlow
     exp_name: Optional[str] = None  # Optional experiment name for MLFlow
     # NOTE: with `bool` you activate this as a flag like `--save_every_epoch`
     save_every_epoch: bool = False  # Whether to save state_dict at every epoch
     # NOTE: with `Literal[False, True]` you activate this as a flag like normal argument `--save_model True` or `--save_model False`
     save_model: Literal[False, True] = True  # Whether to save model at the end
+    checkpoint_interval: int = 1  # Save checkpoint every N epochs, 0 to disable
+    checkpoint_interval_seconds: float = 0  # Also save checkpoint when T seconds passed since last save, 0 to disable
+    keep_last_k: int = 0  # Keep only the last K epoch checkpoints (with save_every_epoch), 0 to keep all
+    best_metric: Optional[str] = None  # Keep the best checkpoint by this metric (e.g. loss) at checkpoint/best
+    best_metric_mode: Literal["min", "max"] = "min"  # Whether lower or higher best_metric is better
+    data_path: Optional[str] = None  # Glob of the data shards (e.g. data/train_*.npy), train on random dummy data if not given
+    data_format: Literal["npy", "raw"] = "npy"  # Shard format, `.npy` files or raw binary rows (needs data_dtype and data_columns)
+    data_dtype: str = "float32"  # Value type of raw shards
+    data_columns: Optional[int] = None  # Number of columns (features + targets) of raw shards
+    target_columns: int = 1  # The last N columns of a row are the targets
+    batch_size: int = 0  # Mini-batch size, 0 for the whole (dummy) dataset as one batch or config.DATA_BATCH_SIZE with data_path
+    shuffle_window: int = 1  # Shuffle rows within windows of N shards (shard order is shuffled too), 0 to not shuffle
+    data_workers: int = 0  # DataLoader worker processes, 0 to load in the training process
+    prefetch_factor: int = 2  # Batches prefetched by each data worker
+    data_seed: int = 0  # Seed of the shuffling order
+    grad_accumulation_steps: int = 1  # Accumulate gradients of N mini-batches per optimizer step
+    precision: Literal["fp32", "bf16"] = "fp32"  # Run forward and loss in bfloat16 autocast with bf16
+    compile_model: bool = False  # Compile the model with torch.compile (first steps are slow)
+    log_interval: int = 1  # Read the loss back and log it every N epochs (every epoch with best_metric)
+    profile_steps: int = 0  # Capture a torch.profiler trace of N training steps as run artifact (profiler/), 0 to disable
+    profile_skip: int = 1  # Training steps to skip before profiling (the first ones pay for warm-up)
+    world_size: int = 1  # Data-parallel processes (DDP) training the run, one per GPU (or CPU slice), batch_size is per process
 
 
 class TrainArgs(Tap):
     learning_rate: float = 0.01  # Learning rate for the optimizer
     epochs: int = 10  # Number of epochs to train
     gpu_id: int = -1  # GPU ID to use, -1 for automatic allocation
+    gpu_memory: float = 0  # GPU memory (MiB) needed to share a GPU with other jobs, -1 to estimate from the model, 0 for an exclusive GPU
     run_name: str = None  # Optional name for the MLFlow run
     exp_name: Optional[str] = None  # Optional experiment name for MLFlow
     save_every_epoch: bool = False  # Whether to save state_dict at every epoch
     save_model: Literal[False, True] = True  # Whether to save model at the end
+    checkpoint_interval: int = 1  # Save checkpoint every N epochs, 0 to disable
+    checkpoint_interval_seconds: float = 0  # Also save checkpoint when T seconds passed since last save, 0 to disable
+    keep_last_k: int = 0  # Keep only the last K epoch checkpoints (with save_every_epoch), 0 to keep all
+    best_metric: Optional[str] = None  # Keep the best checkpoint by this metric (e.g. loss) at checkpoint/best
+    best_metric_mode: Literal["min", "max"] = "min"  # Whether lower or higher best_metric is better
+    data_path: Optional[str] = None  # Glob of the data shards (e.g. data/train_*.npy), train on random dummy data if not given
+    data_format: Literal["npy", "raw"] = "npy"  # Shard format, `.npy` files or raw binary rows (needs data_dtype and data_columns)
+    data_dtype: str = "float32"  # Value type of raw shards
+    data_columns: Optional[int] = None  # Number of columns (features + targets) of raw shards
+    target_columns: int = 1  # The last N columns of a row are the targets
+    batch_size: int = 0  # Mini-batch size, 0 for the whole (dummy) dataset as one batch or config.DATA_BATCH_SIZE with data_path
+    shuffle_window: int = 1  # Shuffle rows within windows of N shards (shard order is shuffled too), 0 to not shuffle
+    data_workers: int = 0  # DataLoader worker processes, 0 to load in the training process
+    prefetch_factor: int = 2  # Batches prefetched by each data worker
+    data_seed: int = 0  # Seed of the shuffling order
+    grad_accumulation_steps: int = 1  # Accumulate gradients of N mini-batches per optimizer step
+    precision: Literal["fp32", "bf16"] = "fp32"  # Run forward and loss in bfloat16 autocast with bf16
+    compile_model: bool = False  # Compile the model with torch.compile (first steps are slow)
+    log_interval: int = 1  # Read the loss back and log it every N epochs (every epoch with best_metric)
+    profile_steps: int = 0  # Capture a torch.profiler trace of N training steps as run artifact (profiler/), 0 to disable
+    profile_skip: int = 1  # Training steps to skip before profiling (the first ones pay for warm-up)
+    world_size: int = 1  # Data-parallel processes (DDP) training the run, one per GPU (or CPU slice), batch_size is per process
 
 
 def get_args_from_model(param: TrainTask) -> TrainArgs:
@@ -42,30 +88,277 @@ def get_args_from_model(param: TrainTask) -> TrainArgs:
 
 
 def get_exp_id(exp_name: Optional[str] = None) -> str:
+    import mlflow.tracking.fluent
+    from utils import get_experiment_cache
+
     if not exp_name:
         exp_id = mlflow.tracking.fluent._get_experiment_id()
     else:
-        if (exp := mlflow.get_experiment_by_name(exp_name)) is None:
-            exp_id = mlflow.create_experiment(exp_name)
-        else:
-            exp_id = exp.experiment_id
+        # Resolved (or created) once per host, see `utils.ExperimentCache`
+        exp_id = get_experiment_cache().get_id(exp_name)
     return exp_id
 
 
-def train_model(
+def warm_up_worker() -> None:
+    """
+    Run by each API worker process before its first task, so the first training job doesn't pay for it
+    (heavy imports, tracking client connection, CUDA context, first kernel launches)
+    """
+    import torch
+    import mlflow
+
+    # Load what `train_model` is going to import
+    import mlflow.pytorch
+    from tqdm.auto import tqdm
+    from utils import (
+        TorchDeviceManager,
+        BatchMetricLogger,
+        AsyncCheckpointWriter,
+        CPUManager,
+    )
+
+    try:
+        mlflow.MlflowClient().search_experiments(max_results=1)
+    except Exception as e:
+        logger.warning(f"Tracking server not reachable during warm-up: {e}")
+    if torch.cuda.is_available():
+        torch.cuda.init()
+    model = torch.nn.Linear(10, 1)
+    torch.nn.functional.mse_loss(
+        model(torch.randn(4, 10)), torch.randn(4, 1)
+    ).backward()
+
+
+def build_train_step(
+    model,
+    optimizer,
+    criterion,
+    device,
+    precision: Literal["fp32", "bf16"] = "fp32",
+    grad_accumulation_steps: int = 1,
+    compile_model: bool = False,
+) -> Callable:
+    """
+    `train_step(features, targets, update)`: forward and backward of one mini-batch, with an optimizer step if `update`.
+    Returns the detached loss, so reading it back (a host sync on GPU) is left to the caller.
+    """
+    from contextlib import nullcontext
+    import torch
+
+    # NOTE: keep `model` itself for state_dict, compiled module's keys are prefixed
+    forward = torch.compile(model) if compile_model else model
+    # DDP averages gradients over the ranks in every backward, only needed before an optimizer step
+    no_sync = getattr(model, "no_sync", None)
+
+    def train_step(features, targets, update: bool = True):
+        with no_sync() if no_sync and not update else nullcontext():
+            with torch.autocast(
+                device.type, dtype=torch.bfloat16, enabled=precision == "bf16"
+            ):
+                loss = criterion(forward(features), targets)
+            (loss / grad_accumulation_steps).backward()
+        if update:
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+        return loss.detach()
+
+    return train_step
+
+
+def build_dataset_and_model(task: Union[TrainTask, TrainArgs]):
+    """
+    The dataset (None for dummy data) and the (example) model it trains
+    """
+    import torch
+    from utils import ShardedArrayDataset
+
+    dataset = (
+        ShardedArrayDataset.from_pattern(
+            task.data_path,
+            data_format=task.data_format,
+            target_columns=task.target_columns,
+            dtype=task.data_dtype,
+            num_columns=task.data_columns,
+        )
+        if task.data_path
+        else None
+    )
+    model = (
+        torch.nn.Linear(dataset.num_features, dataset.target_columns)
+        if dataset is not None
+        else torch.nn.Linear(10, 1)
+    )
+    return dataset, model
+
+
+def _train_rank(
+    rank: int,
+    contexts: List["DistributedContext"],
+    task: Union[TrainTask, TrainArgs],
+    run_id: str,
+    resume_state_dict: dict,
+    tracking_uri: str,
+) -> None:
+    import mlflow
+
+    # NOTE: ranks are fresh (spawned) processes, without what the launcher set in code
+    mlflow.set_tracking_uri(tracking_uri)
+    train_model(task, run_id, resume_state_dict, dist_context=contexts[rank])
+
+
+def train_distributed(
     task: Union[TrainTask, TrainArgs],
     run_id: Optional[str] = None,
     resume_state_dict: dict = {},
 ):
+    """
+    Train one run with `task.world_size` data-parallel processes on this host (DDP), each on its part of the data.
+    Their GPUs (or CPU slices) are locked as a gang for the whole run, only rank 0 logs metrics, checkpoints and the model.
+    """
+    import mlflow
+    from utils import (
+        TorchDeviceManager,
+        estimate_gpu_memory,
+        CPUManager,
+        DummyContextManager,
+        PhaseTimer,
+        create_rank_contexts,
+        spawn_ranks,
+        clear_stop,
+    )
+
     try:
+        if task.gpu_id != -1:
+            raise ValueError(
+                "gpu_id can't be combined with world_size, GPUs are allocated automatically"
+            )
+        timer = PhaseTimer()
+        _, model = build_dataset_and_model(task)
+        devices, lock = TorchDeviceManager().get_devices_and_lock(
+            task.world_size,
+            return_str=True,
+            memory=(
+                estimate_gpu_memory(model) if task.gpu_memory < 0 else task.gpu_memory
+            ),
+            timer=timer,
+        )
+        # Ranks training on CPU split a gang of CPU slices
+        cores, cpu_lock = (
+            CPUManager().get_gang_cpus_and_lock(task.world_size, timer=timer)
+            if devices[0] == "cpu"
+            else (None, DummyContextManager())
+        )
+
+        with lock, cpu_lock:
+            client = mlflow.MlflowClient()
+            # e.g. a sweep trial's run, like `mlflow.start_run` does on a single device
+            run_id = run_id or os.environ.get("MLFLOW_RUN_ID")
+            # Created here, so it can be marked failed whichever rank fails
+            if run_id is None:
+                run_id = client.create_run(
+                    get_exp_id(task.exp_name), run_name=task.run_name
+                ).info.run_id
+            client.set_tag(run_id, "Devices", ", ".join(devices))
+            # Rank 0 logs the other phases
+            for key, value in timer.pop_metrics().items():
+                client.log_metric(
+                    run_id, key, value, step=resume_state_dict.get("epoch", -1) + 1
+                )
+
+            contexts = create_rank_contexts(devices, cores)
+            logger.info(
+                f"Training run {run_id} with {task.world_size} ranks ({contexts[0].backend}) on {devices}"
+            )
+            try:
+                spawn_ranks(
+                    _train_rank,
+                    contexts,
+                    task,
+                    run_id,
+                    resume_state_dict,
+                    mlflow.get_tracking_uri(),
+                )
+            except Exception as e:
+                # The other ranks were terminated, maybe rank 0 before it could end the run
+                error = str(e).strip().splitlines()[-1]
+                logger.error(f"Distributed training failed: {error}")
+                if "error" not in client.get_run(run_id).data.params:
+                    client.log_param(run_id, "error", error)
+                client.set_terminated(run_id, "FAILED")
+            finally:
+                # Only rank 0 looks at it, the launcher cleans it up
+                clear_stop(run_id)
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+
+
+def train_model(
+    task: Union[TrainTask, TrainArgs],
+    run_id: Optional[str] = None,
+    resume_state_dict: dict = {},
+    dist_context: Optional["DistributedContext"] = None,
+):
+    """
+    Train one run, on a single device or (with `task.world_size` > 1) with `train_distributed`.
+    `dist_context` is set in the processes of `train_distributed`'s ranks.
+    """
+    if dist_context is None and task.world_size > 1:
+        return train_distributed(task, run_id, resume_state_dict)
+    # Logging and checkpoints are rank 0's job
+    is_main = dist_context is None or dist_context.is_main
 
-        device, lock = TorchDeviceManager().get_device_and_lock(task.gpu_id)
+    import torch
+    import mlflow
+    import mlflow.pytorch
+    from tqdm.auto import tqdm
+    from utils import (
+        TorchDeviceManager,
+        estimate_gpu_memory,
+        CPUManager,
+        DummyContextManager,
+        build_data_loader,
+        BatchMetricLogger,
+        AsyncCheckpointWriter,
+        CheckpointPolicy,
+        is_stop_requested,
+        clear_stop,
+        PhaseTimer,
+        create_profiler,
+    )
 
-        logger.info(f"Using device {device}")
+    try:
+        # Time spent per phase, logged as system/time/<phase> metrics every epoch
+        timer = PhaseTimer(record_functions=task.profile_steps > 0)
 
         # Example model and training loop
+        dataset, model = build_dataset_and_model(task)
+
+        if dist_context is None:
+            device, lock = TorchDeviceManager().get_device_and_lock(
+                task.gpu_id,
+                memory=(
+                    estimate_gpu_memory(model)
+                    if task.gpu_memory < 0
+                    else task.gpu_memory
+                ),
+                timer=timer,
+            )
+
+            logger.info(f"Using device {device}")
+            # Training on CPU gets its own slice of cores instead of competing for all of them
+            cpu_lock = (
+                CPUManager().get_cpus_and_lock(timer=timer)[1]
+                if device.type == "cpu"
+                else DummyContextManager()
+            )
+        else:
+            # Locked for all the ranks by `train_distributed`
+            device = dist_context.init()
+            lock, cpu_lock = DummyContextManager(), DummyContextManager()
+            logger.info(f"Rank {dist_context.rank} using device {device}")
+
         init_epoch = resume_state_dict.get("epoch", -1) + 1
-        model = torch.nn.Linear(10, 1).to(device)
+        model = model.to(device)
         if model_state := resume_state_dict.get("model_state_dict"):
             logger.info("Loading checkpoint model state...")
             model.load_state_dict(model_state)
@@ -76,76 +369,244 @@ def train_model(
             optimizer.load_state_dict(optimizer_state)
 
         criterion = torch.nn.MSELoss()
+        train_step = build_train_step(
+            # Broadcasts rank 0's parameters, then averages the gradients over the ranks in backward
+            (
+                torch.nn.parallel.DistributedDataParallel(
+                    model, device_ids=[device] if device.type == "cuda" else None
+                )
+                if dist_context is not None
+                else model
+            ),
+            optimizer,
+            criterion,
+            device,
+            precision=task.precision,
+            grad_accumulation_steps=task.grad_accumulation_steps,
+            compile_model=task.compile_model,
+        )
 
-        with lock:
+        with lock, cpu_lock:
             try:
-                with mlflow.start_run(
-                    run_id=run_id,
-                    experiment_id=get_exp_id(task.exp_name) if task.exp_name else None,
-                    run_name=task.run_name,
-                    tags={
-                        "Device": str(device),
-                    },
-                    # Currently set nested can by pass MLFlow multi-thread
-                    nested=config.USE_THREAD,
-                ):
+                with (
+                    mlflow.start_run(
+                        run_id=run_id,
+                        experiment_id=(
+                            get_exp_id(task.exp_name) if task.exp_name else None
+                        ),
+                        run_name=task.run_name,
+                        tags={
+                            "Device": str(device),
+                        },
+                        # Currently set nested can by pass MLFlow multi-thread
+                        nested=config.USE_THREAD,
+                    )
+                    if is_main
+                    else DummyContextManager()
+                ) as run, (
+                    BatchMetricLogger(run.info.run_id)
+                    if is_main
+                    else DummyContextManager()
+                ) as metric_logger, (
+                    AsyncCheckpointWriter(run.info.run_id)
+                    if is_main
+                    else DummyContextManager()
+                ) as checkpoint_writer, (
+                    create_profiler(
+                        run.info.run_id,
+                        device,
+                        task.profile_steps,
+                        task.profile_skip,
+                    )
+                    if is_main
+                    else None
+                ) or DummyContextManager() as profiler:
                     if isinstance(task, BaseModel):
                         task = get_args_from_model(task)
-                    mlflow.log_dict(task.as_dict(), "TrainArgs.json")
 
-                    # Log parameters
-                    mlflow.log_param("learning_rate", task.learning_rate)
-                    mlflow.log_param("epochs", task.epochs)
+                    checkpoint_policy = CheckpointPolicy.from_args(task)
+                    checkpoint_policy.load_state_dict(
+                        resume_state_dict.get("checkpoint_policy", {})
+                    )
 
-                    # Dummy data
-                    data = torch.randn(100, 10).to(device)
-                    target = torch.randn(100, 1).to(device)
+                    if is_main:
+                        run_id = run.info.run_id
+                        mlflow.log_dict(task.as_dict(), "TrainArgs.json")
+                        # Log parameters
+                        metric_logger.log_params(
+                            {"learning_rate": task.learning_rate, "epochs": task.epochs}
+                        )
+
+                    if dataset is not None:
+                        # Streamed from memory-mapped shards, prefetched by the data workers
+                        loader = build_data_loader(
+                            dataset,
+                            # NOTE: never the whole dataset, it may not fit in memory
+                            batch_size=task.batch_size or config.DATA_BATCH_SIZE,
+                            shuffle_window=task.shuffle_window,
+                            seed=task.data_seed,
+                            num_workers=task.data_workers,
+                            prefetch_factor=task.prefetch_factor,
+                            pin_memory=device.type == "cuda",
+                            num_replicas=task.world_size if dist_context else 1,
+                            rank=dist_context.rank if dist_context else 0,
+                        )
+                    else:
+                        # Dummy data (the same on every rank, each training on its part)
+                        generator = (
+                            torch.Generator().manual_seed(task.data_seed)
+                            if dist_context is not None
+                            else None
+                        )
+                        data = torch.randn(100, 10, generator=generator)
+                        target = torch.randn(100, 1, generator=generator)
+                        if dist_context is not None:
+                            # As many rows as the other ranks, so they all run as many steps
+                            rows = slice(
+                                dist_context.rank,
+                                len(data) // task.world_size * task.world_size,
+                                task.world_size,
+                            )
+                            data, target = data[rows], target[rows]
+                        data, target = data.to(device), target.to(device)
+                        batch_size = task.batch_size or len(data)
+                        loader = list(
+                            zip(data.split(batch_size), target.split(batch_size))
+                        )
 
                     # Training loop
-                    pbar = tqdm(range(init_epoch, task.epochs), desc="Train")
+                    # Epoch losses not read back to the host yet
+                    pending_losses = []
+                    pbar = tqdm(
+                        range(init_epoch, task.epochs),
+                        desc="Train",
+                        disable=not is_main,
+                    )
                     for epoch in pbar:
-                        optimizer.zero_grad()
-                        output = model(data)
-                        loss = criterion(output, target)
-                        loss.backward()
-                        optimizer.step()
-                        # logger.info(f"Epoch {epoch + 1}, Loss: {loss.item()}")
+                        if dataset is not None:
+                            loader.batch_sampler.sampler.set_epoch(epoch)
+                        # NOTE: summed on the device, so the host only waits for the GPU once per logging interval
+                        total_loss = torch.zeros((), device=device)
+                        num_rows = 0
+                        num_batches = len(loader)
+                        batches = iter(loader)
+                        for batch_index in range(num_batches):
+                            with timer.span("data"):
+                                features, targets = next(batches)
+                                features = features.to(device, non_blocking=True)
+                                targets = targets.to(device, non_blocking=True)
+                            # Optimizer steps every N batches, and on the last (maybe partial) group
+                            update = (
+                                (batch_index + 1) % task.grad_accumulation_steps == 0
+                                or batch_index == num_batches - 1
+                            )
+                            with timer.span("forward_backward"):
+                                loss = train_step(features, targets, update=update)
+                                total_loss += loss * len(features)
+                            num_rows += len(features)
+                            if profiler is not None:
+                                profiler.step()
+                        epoch_loss = total_loss / max(num_rows, 1)
                         pbar.set_description(f"Train Epoch {epoch + 1}")
-                        pbar.set_postfix(loss=loss.item())
-
-                        # Log metrics
-                        mlflow.log_metric("loss", loss.item(), step=epoch)
-                        # All the information needed for resuming goes here
-                        if task.save_every_epoch:
-                            mlflow.pytorch.log_state_dict(
-                                {
-                                    "epoch": epoch,
-                                    "model_state_dict": model.state_dict(),
-                                    "optimizer_state_dict": optimizer.state_dict(),
-                                },
-                                # NOTE: this path is a "folder name"
-                                f"checkpoint/state_dict_epoch_{epoch}",
+
+                        # e.g. early stopped by a sweep scheduler
+                        stop_requested = is_main and is_stop_requested(run.info.run_id)
+                        if dist_context is not None:
+                            # Ranks have as many rows, so the mean of their losses is the loss over all rows
+                            epoch_loss = dist_context.average(epoch_loss)
+                            # All ranks stop at the same epoch, or the others would wait for it forever
+                            stop_requested = dist_context.broadcast_flag(
+                                stop_requested, device
                             )
-                        mlflow.pytorch.log_state_dict(
-                            {
-                                "epoch": epoch,
-                                "model_state_dict": model.state_dict(),
-                                "optimizer_state_dict": optimizer.state_dict(),
-                            },
-                            # NOTE: this path is a "folder name"
-                            f"checkpoint/latest",
+                            if not is_main:
+                                if stop_requested:
+                                    break
+                                continue
+                        pending_losses.append((epoch, epoch_loss))
+                        is_last = epoch == task.epochs - 1 or stop_requested
+                        metrics = {}
+                        with timer.span("metrics"):
+                            if (
+                                is_last
+                                or task.best_metric
+                                or len(pending_losses) >= task.log_interval
+                            ):
+                                # One host sync for the whole interval
+                                loss_values = torch.stack(
+                                    [loss for _, loss in pending_losses]
+                                ).tolist()
+                                for (loss_epoch, _), loss_value in zip(
+                                    pending_losses, loss_values
+                                ):
+                                    # Log metrics (buffered, sent by background thread)
+                                    metric_logger.log_metric(
+                                        "loss", loss_value, step=loss_epoch
+                                    )
+                                pending_losses = []
+                                # logger.info(f"Epoch {epoch + 1}, Loss: {loss_value}")
+                                pbar.set_postfix(loss=loss_value)
+                                metrics["loss"] = loss_value
+                        # NOTE: these paths are "folder names"
+                        checkpoint_paths, outdated_paths = checkpoint_policy.step(
+                            epoch,
+                            is_last=is_last,
+                            metrics=metrics,
                         )
-                    if task.save_model:
-                        mlflow.pytorch.log_model(model, f"model/latest")
+                        with timer.span("checkpoint"):
+                            if checkpoint_paths:
+                                # All the information needed for resuming goes here
+                                # Snapshot to CPU once, serialize and upload in background
+                                checkpoint_writer.submit(
+                                    {
+                                        "epoch": epoch,
+                                        "model_state_dict": model.state_dict(),
+                                        "optimizer_state_dict": optimizer.state_dict(),
+                                        "checkpoint_policy": checkpoint_policy.state_dict(),
+                                    },
+                                    *checkpoint_paths,
+                                )
+                            checkpoint_writer.delete(*outdated_paths)
+                        metric_logger.log_metrics(timer.pop_metrics(), step=epoch)
+                        if stop_requested:
+                            logger.info(f"Stop requested, stopping at epoch {epoch}")
+                            metric_logger.set_tag("early_stopped_epoch", epoch)
+                            break
+                    if is_main:
+                        # Make sure the final checkpoint is uploaded before the run ends
+                        with timer.span("checkpoint_flush"):
+                            checkpoint_writer.flush()
+                        if task.save_model:
+                            with timer.span("save_model"):
+                                mlflow.pytorch.log_model(model, f"model/latest")
+                        # Spent by the background threads over the whole run
+                        timer.add("checkpoint_upload", checkpoint_writer.upload_time)
+                        # NOTE: drain the metrics still buffered first, their send time would be missed otherwise
+                        with timer.span("metric_flush"):
+                            metric_logger.flush()
+                        timer.add("metric_send", metric_logger.send_time)
+                        metric_logger.log_metrics(timer.pop_metrics(), step=task.epochs)
             except Exception as e:
                 logger.error(f"An error occurred: {e}")
-                mlflow.log_param("error", str(e))
+                if is_main:
+                    mlflow.log_param("error", str(e))
+                if dist_context is not None:
+                    # Let `train_distributed` stop the other ranks
+                    raise
             finally:
                 if lock:
                     logger.info("Released lock for GPU")
-                else:
+                elif dist_context is None:
                     logger.info(
                         "No lock to be released. We don't create lock when we are using CPU."
                     )
     except Exception as e:
+        if dist_context is not None:
+            # Logged by `train_distributed`, which stops the other ranks
+            raise
         logger.error(f"An error occurred: {e}")
+    finally:
+        if dist_context is not None:
+            dist_context.destroy()
+        elif run_id:
+            # Done with it, don't leave the stop file behind
+            clear_stop(run_id)
@@ -1,3 +1,7 @@
+from typing import Iterator, Tuple
+import json
+import time
+import pandas as pd
 import streamlit as st
 import requests
 from streamlit.components.v1 import iframe
@@ -11,6 +15,9 @@ if "submitted_tasks" not in st.session_state:
     st.session_state["submitted_tasks"] = {}
 if "submitted_pueue_tasks" not in st.session_state:
     st.session_state["submitted_pueue_tasks"] = {}
+# task ID -> output read so far and its byte offset
+if "pueue_outputs" not in st.session_state:
+    st.session_state["pueue_outputs"] = {}
 
 # Streamlit UI
 st.title("MLFlow Training Task Manager")
@@ -126,13 +133,24 @@ with resume_tab:
 # st.experimental_fragment will be removed after 2025-01-01.
 @st.fragment(run_every="30s")
 def display_status():
+    if not (run_ids := list(st.session_state["submitted_tasks"])):
+        return
+    # One request (and one cached tracking server query) for all tasks
+    status_response = requests.post(
+        f"{API_URL}/status",
+        json={
+            "run_ids": run_ids,
+            "fields": ["status", "start_time", "end_time", "metrics"],
+        },
+    )
+    if status_response.status_code != 200:
+        st.error(f"Failed to retrieve the status of tasks: {status_response.text}")
+        return
+    runs = status_response.json()["runs"]
     for run_id, status in st.session_state["submitted_tasks"].items():
         st.write(f"Run ID: {run_id}, Status: {status}")
 
-        # Check the status of the task
-        status_response = requests.get(f"{API_URL}/status/{run_id}")
-        if status_response.status_code == 200:
-            status_data = status_response.json()
+        if (status_data := runs.get(run_id)) is not None:
             st.session_state["submitted_tasks"][run_id] = status_data["status"]
             st.write(status_data)
         else:
@@ -147,19 +165,79 @@ def display_pueue_status():
         ).json()
         st.session_state["submitted_pueue_tasks"][task_id] = running_status
         st.write(f"Task ID: {task_id}, Status: {running_status}")
-        # Check the status of the task
-        output = requests.get(
-            f"{API_URL}/pueue/output/{task_id}",
-        ).json()["output"]
-        st.markdown(f"```\n{output}\n```", unsafe_allow_html=True)
+        # Only fetch the output written since the last refresh
+        tail = st.session_state["pueue_outputs"].setdefault(
+            task_id, {"offset": 0, "output": ""}
+        )
+        chunk = requests.get(
+            f"{API_URL}/pueue/tail/{task_id}", params={"offset": tail["offset"]}
+        ).json()
+        if chunk["reset"]:
+            tail["output"] = ""
+        tail["output"] += chunk["output"]
+        tail["offset"] = chunk["offset"]
+        st.markdown(f"```\n{tail['output']}\n```", unsafe_allow_html=True)
+
+
+def iter_sse(response: requests.Response) -> Iterator[Tuple[str, dict]]:
+    """
+    (event, data) of a Server-Sent Events response
+    """
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:") :].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:") :].strip())
+
+
+# Pushed by the API as the run logs them, instead of polling the tracking server
+@st.fragment
+def display_live_metrics():
+    if not (run_ids := list(st.session_state["submitted_tasks"])):
+        st.write("No task submitted yet")
+        return
+    run_id = st.selectbox("Run ID", run_ids)
+    metric = st.text_input("Metric", "loss")
+    if not st.button("Watch"):
+        return
+
+    chart = st.empty()
+    points = {}
+    last_draw = 0.0
+    try:
+        with requests.get(
+            f"{API_URL}/runs/{run_id}/stream", stream=True, timeout=(5, 60)
+        ) as response:
+            response.raise_for_status()
+            for event, data in iter_sse(response):
+                if event == "end":
+                    break
+                if metric in data["metrics"]:
+                    points[data["step"]] = data["metrics"][metric]
+                # Redraw at most twice a second
+                if points and time.time() - last_draw > 0.5:
+                    chart.line_chart(pd.Series(points, name=metric))
+                    last_draw = time.time()
+        if points:
+            chart.line_chart(pd.Series(points, name=metric))
+        st.success(f"Run {run_id} finished")
+    except requests.RequestException as e:
+        st.error(f"Failed to stream the metrics of {run_id}: {e}")
 
 
 st.header("Submitted Tasks")
-fastapi_tab, pueue_tab = st.tabs(["FastAPI", "Pueue"])
+fastapi_tab, pueue_tab, live_tab = st.tabs(["FastAPI", "Pueue", "Live"])
 with fastapi_tab:
     display_status()
 with pueue_tab:
     display_pueue_status()
+with live_tab:
+    display_live_metrics()
 
 # Try to embed MLFlow
 try:
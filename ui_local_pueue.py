@@ -4,7 +4,7 @@ from streamlit.components.v1 import iframe
 import utils
 from train import TrainArgs
 from cli import ResumeArgs
-from pueue import pueue_submit, get_pueue_task_status
+from pueue import pueue_submit, get_pueue_task_status, pueue_tail
 
 
 # Streamlit UI
@@ -39,6 +39,9 @@ pueue_dry_run = st.checkbox(
 # A dictionary to keep track of submitted tasks and their statuses
 if "submitted_pueue_tasks" not in st.session_state:
     st.session_state["submitted_pueue_tasks"] = {}
+# task ID -> output read so far and its byte offset
+if "pueue_outputs" not in st.session_state:
+    st.session_state["pueue_outputs"] = {}
 
 
 train_tab, resume_tab = st.tabs(["Train", "Resume"])
@@ -116,10 +119,17 @@ def display_pueue_status():
             running_status = get_pueue_task_status("running_status", task_id)
             st.session_state["submitted_pueue_tasks"][task_id] = running_status
             st.write(f"Task ID: {task_id}, Status: {running_status}")
-            # Check the status of the task
+            # Only read the output written since the last refresh (from pueue's log file)
             # NOTE: Won't have output when the task has not run (e.g. Queued)
-            output = get_pueue_task_status("output", task_id)["output"]
-            st.markdown(f"```\n{output}\n```", unsafe_allow_html=True)
+            tail = st.session_state["pueue_outputs"].setdefault(
+                task_id, {"offset": 0, "output": ""}
+            )
+            chunk = pueue_tail(task_id, tail["offset"])
+            if chunk["reset"]:
+                tail["output"] = ""
+            tail["output"] += chunk["output"]
+            tail["offset"] = chunk["offset"]
+            st.markdown(f"```\n{tail['output']}\n```", unsafe_allow_html=True)
         except:
             to_remove.append(task_id)
     for task_id in to_remove:
@@ -1,2 +1,87 @@
-from .gpu import *
-from .tap_parser import *
+import importlib
+
+# NOTE: submodules are only imported when one of their names is first used (PEP 562),
+# so e.g. `from utils import request_stop` doesn't pay for torch, MLFlow or Streamlit
+_SUBMODULE_NAMES = {
+    "gpu": [
+        "DummyContextManager",
+        "GPUBackend",
+        "CudaGPUBackend",
+        "FakeGPUBackend",
+        "get_default_backend",
+        "estimate_gpu_memory",
+        "GPULock",
+        "GPULease",
+        "GangLock",
+        "GPUAllocator",
+        "TorchDeviceManager",
+        "get_parallel_num",
+    ],
+    "tap_parser": [
+        "create_streamlit_ui",
+        "create_pydantic_model",
+        "create_pydantic_model_from_func",
+    ],
+    "mlflow_logger": [
+        "MAX_METRICS_PER_BATCH",
+        "MAX_PARAMS_PER_BATCH",
+        "MAX_TAGS_PER_BATCH",
+        "BatchMetricLogger",
+    ],
+    "checkpoint": [
+        "STATE_DICT_FILE_NAME",
+        "CHECKSUM_FILE_NAME",
+        "file_sha256",
+        "snapshot_state_dict",
+        "AsyncCheckpointWriter",
+        "CheckpointPolicy",
+    ],
+    "checkpoint_cache": ["CheckpointCache"],
+    "stop_signal": ["request_stop", "is_stop_requested", "clear_stop"],
+    "job_registry": ["JobRegistry"],
+    "scheduler": ["QueueFullError", "Reservation", "PriorityScheduler"],
+    "cpu": ["get_available_cores", "split_cores", "CPUSliceLock", "CPUManager"],
+    "worker_pool": ["get_rss", "WarmProcessPool"],
+    "data": [
+        "ShardedArrayDataset",
+        "ShardShuffleSampler",
+        "build_data_loader",
+        "write_shards",
+    ],
+    "profiling": ["PHASE_METRIC_PREFIX", "PhaseTimer", "create_profiler"],
+    "metrics": ["Counter", "Gauge", "Histogram", "MetricsRegistry", "REGISTRY"],
+    "run_status": [
+        "RUN_STATUS_FIELDS",
+        "run_to_status",
+        "project_status",
+        "RunStatusCache",
+    ],
+    "metric_stream": ["MetricStreamPublisher", "MetricStreamHub"],
+    "experiment_cache": ["ExperimentCache", "get_experiment_cache"],
+    "distributed": [
+        "find_free_port",
+        "DistributedContext",
+        "create_rank_contexts",
+        "spawn_ranks",
+    ],
+}
+_NAME_TO_SUBMODULE = {
+    name: submodule
+    for submodule, names in _SUBMODULE_NAMES.items()
+    for name in names
+}
+
+__all__ = list(_NAME_TO_SUBMODULE)
+
+
+def __getattr__(name: str):
+    if (submodule := _NAME_TO_SUBMODULE.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{submodule}", __name__), name)
+    # Cache it, so next access doesn't go through here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
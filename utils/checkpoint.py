@@ -0,0 +1,335 @@
+from typing import Any, Dict, Optional, List, Literal, Tuple
+from collections import OrderedDict
+import atexit
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+import torch
+import mlflow
+import mlflow.pytorch
+from mlflow.store.artifact.artifact_repository_registry import get_artifact_repository
+import config
+from loguru import logger
+
+# NOTE: same file name as `mlflow.pytorch.log_state_dict` uses
+STATE_DICT_FILE_NAME = "state_dict.pth"
+# Checksum of the state dict file, uploaded next to it so readers can validate cached copies
+CHECKSUM_FILE_NAME = "state_dict.sha256"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while chunk := fp.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def snapshot_state_dict(state: Any) -> Any:
+    """
+    Recursively copy all tensors in a (nested) state dict to CPU so training can keep mutating the originals.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    elif isinstance(state, dict):
+        return type(state)(
+            (key, snapshot_state_dict(value)) for key, value in state.items()
+        )
+    elif isinstance(state, (list, tuple)):
+        return type(state)(snapshot_state_dict(value) for value in state)
+    return state
+
+
+class AsyncCheckpointWriter:
+    """
+    Serialize and upload state dicts to MLFlow artifacts on a worker thread.
+
+    Checkpoints are keyed by artifact path. If a checkpoint for the same path (e.g. `checkpoint/latest`) is still
+    waiting to be uploaded when a newer one arrives, the older one is dropped.
+    `submit` only blocks when `max_pending` distinct paths are already waiting.
+    `delete` removes artifacts on the same worker thread, in order with the uploads.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        client: Optional[mlflow.MlflowClient] = None,
+        max_pending: int = config.CHECKPOINT_MAX_PENDING,
+    ):
+        self._run_id = run_id
+        self._client = client or mlflow.MlflowClient()
+        self._max_pending = max(1, max_pending)
+
+        # artifact path -> snapshot to upload, or None to delete (insertion ordered, oldest first)
+        self._pending: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._artifact_uri: Optional[str] = None
+        self._uploading: Optional[str] = None
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.uploaded_count = 0
+        self.dropped_count = 0
+        self.deleted_count = 0
+        self.failed_count = 0
+        # Seconds the background thread spent serializing and uploading checkpoints
+        self.upload_time = 0.0
+
+        self._thread = threading.Thread(
+            target=self._worker, name=f"AsyncCheckpointWriter-{run_id}", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def run_id(self) -> str:
+        return self._run_id
+
+    def submit(self, state_dict: Dict[str, Any], *artifact_paths: str) -> None:
+        """
+        Snapshot `state_dict` to CPU once and queue it for every given artifact path (a "folder name").
+        """
+        if not artifact_paths:
+            return
+        snapshot = snapshot_state_dict(state_dict)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Can't submit checkpoint to a closed writer.")
+            for artifact_path in artifact_paths:
+                if artifact_path in self._pending:
+                    # Newer checkpoint supersedes the one not yet uploaded
+                    if self._pending[artifact_path] is not None:
+                        self.dropped_count += 1
+                    self._pending[artifact_path] = snapshot
+                    continue
+                # Backpressure only for distinct paths, which we must not drop
+                self._cond.wait_for(lambda: len(self._pending) < self._max_pending)
+                self._pending[artifact_path] = snapshot
+            self._cond.notify_all()
+
+    def delete(self, *artifact_paths: str) -> None:
+        """
+        Delete artifact paths (e.g. outdated epoch checkpoints) after everything submitted before is done.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Can't delete checkpoint with a closed writer.")
+            for artifact_path in artifact_paths:
+                if self._pending.get(artifact_path) is not None:
+                    # Never uploaded, but an older version might already exist
+                    self.dropped_count += 1
+                # Move to the end so the deletion happens after earlier uploads
+                self._pending.pop(artifact_path, None)
+                self._pending[artifact_path] = None
+            self._cond.notify_all()
+
+    def _delete(self, artifact_path: str) -> None:
+        if self._artifact_uri is None:
+            self._artifact_uri = self._client.get_run(self._run_id).info.artifact_uri
+        try:
+            get_artifact_repository(self._artifact_uri).delete_artifacts(artifact_path)
+        except FileNotFoundError:
+            pass
+
+    def _upload(self, artifact_path: str, snapshot: Dict[str, Any]) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Same layout as `mlflow.pytorch.log_state_dict` so `mlflow.pytorch.load_state_dict` can read it back
+            local_path = os.path.join(tmp_dir, "state_dict")
+            mlflow.pytorch.save_state_dict(snapshot, local_path)
+            checksum = file_sha256(os.path.join(local_path, STATE_DICT_FILE_NAME))
+            with open(os.path.join(local_path, CHECKSUM_FILE_NAME), "w") as fp:
+                fp.write(checksum)
+            self._client.log_artifacts(self._run_id, local_path, artifact_path)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                artifact_path, snapshot = self._pending.popitem(last=False)
+                self._uploading = artifact_path
+                self._cond.notify_all()
+
+            try:
+                if snapshot is None:
+                    self._delete(artifact_path)
+                    self.deleted_count += 1
+                else:
+                    start = time.perf_counter()
+                    self._upload(artifact_path, snapshot)
+                    self.upload_time += time.perf_counter() - start
+                    self.uploaded_count += 1
+            except Exception as e:
+                self.failed_count += 1
+                logger.error(
+                    f"Failed to {'delete' if snapshot is None else 'upload'} checkpoint {artifact_path} of run {self._run_id}: {e}"
+                )
+
+            with self._cond:
+                self._uploading = None
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every submitted checkpoint is uploaded (or dropped) and every deletion is done. Return False on timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and self._uploading is None, timeout
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(
+                f"AsyncCheckpointWriter for run {self._run_id} did not finish uploading within {timeout} seconds."
+            )
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> "AsyncCheckpointWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class CheckpointPolicy:
+    """
+    Decide when to save checkpoints and which ones to keep.
+
+    - `checkpoint/latest` is saved every `interval` epochs, or when `interval_seconds` passed since the last save,
+      and always at the last epoch.
+    - With `save_every_epoch`, each save also keeps a copy at `checkpoint/state_dict_epoch_{epoch}`,
+      and only the last `keep_last_k` of them are kept (0 means keep all).
+    - With `best_metric`, `checkpoint/best` is saved whenever the metric improves.
+
+    The bookkeeping is stored in the checkpoint itself (see `state_dict`) so retention still works after resume.
+    """
+
+    LATEST_PATH = "checkpoint/latest"
+    BEST_PATH = "checkpoint/best"
+    EPOCH_PATH = "checkpoint/state_dict_epoch_{epoch}"
+
+    def __init__(
+        self,
+        interval: int = 1,
+        interval_seconds: float = 0,
+        save_every_epoch: bool = False,
+        keep_last_k: int = 0,
+        best_metric: Optional[str] = None,
+        best_metric_mode: Literal["min", "max"] = "min",
+    ):
+        if best_metric_mode not in ("min", "max"):
+            raise ValueError(f"Invalid best_metric_mode {best_metric_mode}")
+        self.interval = interval
+        self.interval_seconds = interval_seconds
+        self.save_every_epoch = save_every_epoch
+        self.keep_last_k = keep_last_k
+        self.best_metric = best_metric
+        self.best_metric_mode = best_metric_mode
+
+        self.saved_epochs: List[int] = []
+        self.best_value: Optional[float] = None
+        self._last_save_time = time.monotonic()
+
+    @classmethod
+    def from_args(cls, args) -> "CheckpointPolicy":
+        return cls(
+            interval=args.checkpoint_interval,
+            interval_seconds=args.checkpoint_interval_seconds,
+            save_every_epoch=args.save_every_epoch,
+            keep_last_k=args.keep_last_k,
+            best_metric=args.best_metric,
+            best_metric_mode=args.best_metric_mode,
+        )
+
+    def _is_better(self, value: float) -> bool:
+        if math.isnan(value):
+            return False
+        if self.best_value is None:
+            return True
+        if self.best_metric_mode == "min":
+            return value < self.best_value
+        return value > self.best_value
+
+    def step(
+        self,
+        epoch: int,
+        is_last: bool = False,
+        metrics: Optional[Dict[str, float]] = None,
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Return (artifact paths to save this epoch's state to, artifact paths to delete).
+        """
+        save_paths, delete_paths = [], []
+
+        now = time.monotonic()
+        if (
+            is_last
+            or (self.interval > 0 and (epoch + 1) % self.interval == 0)
+            or (
+                self.interval_seconds > 0
+                and now - self._last_save_time >= self.interval_seconds
+            )
+        ):
+            self._last_save_time = now
+            save_paths.append(self.LATEST_PATH)
+            if self.save_every_epoch:
+                save_paths.append(self.EPOCH_PATH.format(epoch=epoch))
+                self.saved_epochs.append(epoch)
+                if self.keep_last_k > 0:
+                    while len(self.saved_epochs) > self.keep_last_k:
+                        delete_paths.append(
+                            self.EPOCH_PATH.format(epoch=self.saved_epochs.pop(0))
+                        )
+
+        if self.best_metric and metrics and self.best_metric in metrics:
+            value = float(metrics[self.best_metric])
+            if self._is_better(value):
+                self.best_value = value
+                save_paths.append(self.BEST_PATH)
+
+        return save_paths, delete_paths
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"saved_epochs": list(self.saved_epochs), "best_value": self.best_value}
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        self.saved_epochs = list(state_dict.get("saved_epochs", []))
+        self.best_value = state_dict.get("best_value")
+
+
+if __name__ == "__main__":
+    model = torch.nn.Linear(10, 1)
+    policy = CheckpointPolicy(
+        interval=2, save_every_epoch=True, keep_last_k=2, best_metric="loss"
+    )
+    with mlflow.start_run() as run:
+        with AsyncCheckpointWriter(run.info.run_id) as writer:
+            for epoch in range(7):
+                save_paths, delete_paths = policy.step(
+                    epoch, is_last=epoch == 6, metrics={"loss": abs(epoch - 3)}
+                )
+                print(epoch, save_paths, delete_paths)
+                writer.submit(
+                    {
+                        "epoch": epoch,
+                        "model_state_dict": model.state_dict(),
+                        "checkpoint_policy": policy.state_dict(),
+                    },
+                    *save_paths,
+                )
+                writer.delete(*delete_paths)
+        print(
+            f"uploaded={writer.uploaded_count} dropped={writer.dropped_count} deleted={writer.deleted_count} failed={writer.failed_count}"
+        )
+        print(mlflow.MlflowClient().list_artifacts(run.info.run_id, "checkpoint"))
+    print(mlflow.pytorch.load_state_dict(run.info.artifact_uri + "/checkpoint/latest"))
@@ -0,0 +1,200 @@
+from typing import Any, Dict, Optional
+import json
+import os
+import shutil
+import tempfile
+import time
+import torch
+import mlflow
+import mlflow.artifacts
+import mlflow.pytorch
+from filelock import FileLock
+import config
+from loguru import logger
+from .checkpoint import STATE_DICT_FILE_NAME, CHECKSUM_FILE_NAME, file_sha256
+
+
+class CheckpointCache:
+    """
+    Size-bounded, on-disk LRU cache for checkpoints (state dicts) stored as MLFlow artifacts.
+
+    Cached files are content-addressed by the checksum uploaded next to the checkpoint (see `AsyncCheckpointWriter`),
+    and indexed by run ID + artifact path. A cached copy is only used if its checksum still matches the one in the
+    artifact store, so an overwritten `checkpoint/latest` is downloaded again.
+    The index is shared by every process on the host (guarded by a file lock).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = config.CHECKPOINT_CACHE_DIR,
+        max_size: int = config.CHECKPOINT_CACHE_MAX_SIZE,
+    ):
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self._objects_dir = os.path.join(cache_dir, "objects")
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._lock = FileLock(os.path.join(cache_dir, "index.lock"))
+        os.makedirs(self._objects_dir, exist_ok=True)
+
+        # Statistics of this instance (cumulative statistics are stored in the index)
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+
+    def _object_path(self, checksum: str) -> str:
+        return os.path.join(self._objects_dir, f"{checksum}.pth")
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self._index_path) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"entries": {}, "objects": {}, "stats": {}}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(index, fp)
+        os.replace(tmp_path, self._index_path)
+
+    @staticmethod
+    def _count(index: Dict[str, Any], name: str) -> None:
+        index["stats"][name] = index["stats"].get(name, 0) + 1
+
+    def _evict(self, index: Dict[str, Any]) -> None:
+        objects: Dict[str, Dict[str, Any]] = index["objects"]
+        total_size = sum(item["size"] for item in objects.values())
+        # Least recently used first
+        for checksum in sorted(objects, key=lambda key: objects[key]["last_access"]):
+            if total_size <= self._max_size:
+                break
+            total_size -= objects.pop(checksum)["size"]
+            try:
+                os.remove(self._object_path(checksum))
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            self._count(index, "evictions")
+        index["entries"] = {
+            key: checksum
+            for key, checksum in index["entries"].items()
+            if checksum in objects
+        }
+
+    def _get_remote_checksum(self, artifact_uri: str) -> Optional[str]:
+        try:
+            return mlflow.artifacts.load_text(
+                f"{artifact_uri}/{CHECKSUM_FILE_NAME}"
+            ).strip()
+        except Exception:
+            # e.g. checkpoints written before checksums were uploaded
+            return None
+
+    def load_state_dict(
+        self,
+        run_id: str,
+        artifact_path: str = "checkpoint/latest",
+        artifact_uri: Optional[str] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Drop-in replacement of `mlflow.pytorch.load_state_dict` that reads from the local cache when possible.
+        `artifact_uri` is the run's artifact root (`run.info.artifact_uri`), pass it to save a `get_run` call.
+        `kwargs` are passed to `torch.load`.
+        """
+        if artifact_uri is None:
+            artifact_uri = mlflow.MlflowClient().get_run(run_id).info.artifact_uri
+        checkpoint_uri = f"{artifact_uri}/{artifact_path}"
+        key = f"{run_id}/{artifact_path}"
+
+        checksum = self._get_remote_checksum(checkpoint_uri)
+        if checksum is None:
+            self.bypasses += 1
+            with self._lock:
+                index = self._read_index()
+                self._count(index, "bypasses")
+                self._write_index(index)
+            logger.warning(
+                f"No checksum found for {checkpoint_uri}, loading without cache."
+            )
+            return mlflow.pytorch.load_state_dict(checkpoint_uri, **kwargs)
+
+        object_path = self._object_path(checksum)
+        with self._lock:
+            index = self._read_index()
+            if checksum in index["objects"] and os.path.exists(object_path):
+                self.hits += 1
+                self._count(index, "hits")
+                index["entries"][key] = checksum
+                index["objects"][checksum]["last_access"] = time.time()
+                self._write_index(index)
+                logger.info(f"Checkpoint cache hit: {key} ({checksum})")
+                return torch.load(object_path, **kwargs)
+
+        self.misses += 1
+        logger.info(f"Checkpoint cache miss: {key} ({checksum}), downloading...")
+        with tempfile.TemporaryDirectory(dir=self._cache_dir) as tmp_dir:
+            local_path = mlflow.artifacts.download_artifacts(
+                artifact_uri=f"{checkpoint_uri}/{STATE_DICT_FILE_NAME}",
+                dst_path=tmp_dir,
+            )
+            if (local_checksum := file_sha256(local_path)) != checksum:
+                # Don't cache something that doesn't match, it might be overwritten while we were downloading
+                logger.warning(
+                    f"Checksum mismatch for {checkpoint_uri}: expected {checksum}, got {local_checksum}. Not caching."
+                )
+                with self._lock:
+                    index = self._read_index()
+                    self._count(index, "misses")
+                    self._write_index(index)
+                return torch.load(local_path, **kwargs)
+
+            size = os.path.getsize(local_path)
+            with self._lock:
+                index = self._read_index()
+                self._count(index, "misses")
+                if size > self._max_size:
+                    self._write_index(index)
+                    logger.warning(
+                        f"Checkpoint {key} ({size} bytes) is larger than the cache size {self._max_size}. Not caching."
+                    )
+                    return torch.load(local_path, **kwargs)
+
+                os.replace(local_path, object_path)
+                index["entries"][key] = checksum
+                index["objects"][checksum] = {"size": size, "last_access": time.time()}
+                self._evict(index)
+                self._write_index(index)
+                return torch.load(object_path, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            index = self._read_index()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "total": index["stats"],
+            "entries": len(index["entries"]),
+            "objects": len(index["objects"]),
+            "size": sum(item["size"] for item in index["objects"].values()),
+            "max_size": self._max_size,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self._objects_dir, ignore_errors=True)
+            os.makedirs(self._objects_dir, exist_ok=True)
+            self._write_index({"entries": {}, "objects": {}, "stats": {}})
+
+
+if __name__ == "__main__":
+    import sys
+
+    cache = CheckpointCache()
+    run_id = sys.argv[1]
+    for _ in range(2):
+        print(cache.load_state_dict(run_id)["epoch"])
+    print(cache.stats())
@@ -0,0 +1,253 @@
+from typing import List, Optional, Tuple, Union, TYPE_CHECKING
+import os
+import time
+import torch
+from filelock import FileLock
+import config
+from loguru import logger
+from .gpu import DummyContextManager, GangLock
+from .metrics import DEVICE_LOCK_WAIT_SECONDS
+
+if TYPE_CHECKING:
+    from .profiling import PhaseTimer
+
+
+def _get_affinity() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# NOTE: taken before any slice is applied, a reused executor worker may still be pinned to its last job's slice
+_AVAILABLE_CORES = _get_affinity()
+
+
+def get_available_cores() -> List[int]:
+    """
+    Cores this process may run on (respects taskset / container CPU sets where supported), as of its start
+    """
+    return list(_AVAILABLE_CORES)
+
+
+def split_cores(cores: List[int], parts: int) -> List[List[int]]:
+    """
+    Contiguous, near-equal chunks (earlier chunks get the remainder)
+    """
+    size, remainder = divmod(len(cores), parts)
+    chunks, start = [], 0
+    for index in range(parts):
+        end = start + size + (index < remainder)
+        chunks.append(cores[start:end])
+        start = end
+    return chunks
+
+
+class CPUSliceLock:
+    """
+    An acquired slice of cores, held until released (or leaving `with lock:`).
+    Releasing it also undoes `CPUManager.apply` of the slice, if it was applied through `get_cpus_and_lock`.
+    """
+
+    def __init__(self, index: int, cores: List[int], file_lock: FileLock):
+        self.index = index
+        self.cores = cores
+        self._file_lock = file_lock
+        # Cores and thread count of the process before the slice was applied
+        self._previous: Optional[Tuple[List[int], int]] = None
+
+    @property
+    def is_locked(self) -> bool:
+        return self._file_lock.is_locked
+
+    def acquire(self) -> None:
+        if not self.is_locked:
+            self._file_lock.acquire()
+
+    def release(self) -> None:
+        if self.is_locked:
+            self._file_lock.release(force=True)
+        if self._previous is not None:
+            CPUManager.restore(*self._previous)
+            self._previous = None
+
+    def __enter__(self) -> "CPUSliceLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def __repr__(self) -> str:
+        return f"CPUSliceLock(index={self.index}, cores={self.cores}, locked={self.is_locked})"
+
+
+class CPUManager:
+    """
+    CPU counterpart of `TorchDeviceManager`: split the cores into per-job slices, so parallel CPU jobs don't oversubscribe them.
+
+    - "narrow": one core per job, as many jobs as cores (best throughput for small models)
+    - "wide": `wide_jobs` jobs sharing all cores (faster individual jobs for bigger models)
+
+    A job locks a slice (file lock, shared by all processes on the host), pins itself to the slice's cores and sizes
+    PyTorch's thread pools to it.
+    """
+
+    def __init__(
+        self,
+        mode: str = config.CPU_JOB_MODE,
+        wide_jobs: int = config.CPU_WIDE_JOBS,
+        cores: Optional[List[int]] = None,
+        lock_dir: str = config.LOCK_DIR,
+        lock_extension: str = config.LOCK_EXTENSION,
+        poll_interval: float = config.GPU_POLL_INTERVAL,
+    ):
+        if mode not in ("narrow", "wide"):
+            raise ValueError(f"Invalid CPU job mode {mode}, should be narrow or wide")
+        self._cores = cores or get_available_cores()
+        self._num_slices = (
+            len(self._cores)
+            if mode == "narrow"
+            else max(1, min(wide_jobs, len(self._cores)))
+        )
+        self._lock_dir = lock_dir
+        self._lock_extension = lock_extension
+        self._poll_interval = poll_interval
+
+    @property
+    def num_slices(self) -> int:
+        return self._num_slices
+
+    def get_slices(self) -> List[List[int]]:
+        return split_cores(self._cores, self._num_slices)
+
+    def _get_lock_file_path(self, index: int) -> str:
+        # NOTE: the slice layout is part of the name, so managers with different layouts don't share locks by mistake
+        return os.path.join(
+            self._lock_dir,
+            f"cpu_{self._num_slices}x_{index}{self._lock_extension}",
+        )
+
+    def acquire(self, timeout: Optional[float] = None) -> CPUSliceLock:
+        """
+        Lock a free slice, waiting (up to `timeout` seconds) if all are taken.
+        """
+        return self.acquire_gang(1, timeout=timeout)[0]
+
+    def acquire_gang(
+        self, count: int, timeout: Optional[float] = None
+    ) -> List[CPUSliceLock]:
+        """
+        Lock `count` free slices at once (all or nothing), waiting (up to `timeout` seconds) until enough are free.
+        """
+        if count > self._num_slices:
+            raise ValueError(
+                f"Can't lock {count} CPU slices, only {self._num_slices} on this host"
+            )
+        os.makedirs(self._lock_dir, exist_ok=True)
+        deadline = None if timeout is None else time.time() + timeout
+        waiting_logged = False
+        while True:
+            locks = []
+            for index, cores in enumerate(self.get_slices()):
+                file_lock = FileLock(self._get_lock_file_path(index))
+                try:
+                    file_lock.acquire(timeout=0)
+                except TimeoutError:
+                    continue
+                locks.append(CPUSliceLock(index, cores, file_lock))
+                if len(locks) == count:
+                    return locks
+            for lock in locks:
+                lock.release()
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"No CPU slice acquired within {timeout} seconds")
+            if not waiting_logged:
+                logger.info(
+                    "No free CPU slice. Waiting..."
+                    if count == 1
+                    else f"Fewer than {count} free CPU slices. Waiting..."
+                )
+                waiting_logged = True
+            time.sleep(self._poll_interval)
+
+    @staticmethod
+    def apply(cores: List[int]) -> Tuple[List[int], int]:
+        """
+        Pin this process to `cores` and size PyTorch's thread pools to them.
+        Returns the previous cores and thread count (see `restore`).
+        """
+        previous = _get_affinity(), torch.get_num_threads()
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(len(cores))
+        try:
+            torch.set_num_interop_threads(min(2, len(cores)))
+        except RuntimeError:
+            # Can only be set once per process, before any inter-op parallel work (e.g. reused executor worker)
+            pass
+        return previous
+
+    @staticmethod
+    def restore(cores: List[int], num_threads: int) -> None:
+        """
+        Undo `apply`, e.g. before an executor worker runs its next job
+        """
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(num_threads)
+
+    def get_cpus_and_lock(
+        self, timeout: Optional[float] = None, timer: Optional["PhaseTimer"] = None
+    ) -> Tuple[List[int], Union[CPUSliceLock, DummyContextManager]]:
+        """
+        Acquire and apply a slice. Returns all cores and a dummy lock when threads share the process (`config.USE_THREAD`),
+        since affinity and thread pools are per process.
+        Time spent waiting for a slice goes to the `device_lock_wait` phase of `timer` and to `/metrics`.
+        """
+        if config.USE_THREAD:
+            return self._cores, DummyContextManager()
+        with DEVICE_LOCK_WAIT_SECONDS.time(device="cpu"):
+            with timer.span("device_lock_wait") if timer else DummyContextManager():
+                lock = self.acquire(timeout=timeout)
+        lock._previous = self.apply(lock.cores)
+        logger.info(
+            f"Using CPU slice {lock.index} (cores {lock.cores}, {torch.get_num_threads()} threads)"
+        )
+        return lock.cores, lock
+
+    def get_gang_cpus_and_lock(
+        self,
+        count: int,
+        timeout: Optional[float] = None,
+        timer: Optional["PhaseTimer"] = None,
+    ) -> Tuple[List[List[int]], Union[GangLock, DummyContextManager]]:
+        """
+        Cores for each of `count` processes of one job (e.g. the ranks of a distributed run), to `apply` in each of them.
+        Up to `count` slices are locked as a gang (all of them if there are fewer) and their cores split between the
+        processes, so e.g. 2 ranks still run on a single core (sharing it).
+        """
+        if config.USE_THREAD:
+            cores, lock = self._cores, DummyContextManager()
+        else:
+            with DEVICE_LOCK_WAIT_SECONDS.time(device="cpu"):
+                with timer.span("device_lock_wait") if timer else DummyContextManager():
+                    locks = self.acquire_gang(
+                        min(count, self._num_slices), timeout=timeout
+                    )
+            cores = [core for slice_lock in locks for core in slice_lock.cores]
+            lock = GangLock(locks)
+        if len(cores) < count:
+            logger.warning(f"{count} processes share {len(cores)} cores")
+            return [[cores[index % len(cores)]] for index in range(count)], lock
+        return split_cores(cores, count), lock
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    for mode in ("narrow", "wide"):
+        manager = CPUManager(mode=mode, lock_dir=tempfile.mkdtemp())
+        print(mode, manager.num_slices, manager.get_slices())
+    cores, lock = manager.get_cpus_and_lock()
+    with lock:
+        print(lock, torch.get_num_threads(), torch.get_num_interop_threads())
@@ -0,0 +1,258 @@
+from typing import Iterator, List, Literal, Optional, Sequence, Tuple
+import glob
+import itertools
+import os
+import numpy as np
+import torch
+from torch.utils.data import BatchSampler, DataLoader, Dataset, Sampler
+from loguru import logger
+
+
+class ShardedArrayDataset(Dataset):
+    """
+    Rows of features followed by `target_columns` targets, stored in `.npy` or raw binary shards and read through memory
+    mapping, so only the rows being used are paged in.
+
+    Raw shards need `dtype` and `num_columns` (a row is `num_columns` values of `dtype`, no header).
+    Supports batched reads (`__getitems__`): a batch is read with one fancy indexing per shard instead of row by row.
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[str],
+        data_format: Literal["npy", "raw"] = "npy",
+        target_columns: int = 1,
+        dtype: str = "float32",
+        num_columns: Optional[int] = None,
+    ):
+        if not paths:
+            raise ValueError("No data shard given")
+        if data_format == "raw" and not num_columns:
+            raise ValueError("Raw shards need num_columns")
+        self.paths = list(paths)
+        self.data_format = data_format
+        self.target_columns = target_columns
+        self.dtype = np.dtype(dtype)
+        self.num_columns = num_columns
+        # NOTE: maps are opened lazily, so each DataLoader worker opens its own instead of pickling them
+        self._shards: List[Optional[np.ndarray]] = [None] * len(self.paths)
+
+        lengths = []
+        for index in range(len(self.paths)):
+            shard = self._get_shard(index)
+            if shard.ndim != 2:
+                raise ValueError(
+                    f"Shard {self.paths[index]} should be 2D (rows, columns), got shape {shard.shape}"
+                )
+            if num_columns is not None and shard.shape[1] != num_columns:
+                raise ValueError(
+                    f"Shard {self.paths[index]} has {shard.shape[1]} columns, expected {num_columns}"
+                )
+            num_columns = shard.shape[1]
+            lengths.append(shard.shape[0])
+        self._shards = [None] * len(self.paths)
+        self.num_columns = num_columns
+        self.shard_lengths = lengths
+        # Global index of each shard's first row
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    @classmethod
+    def from_pattern(cls, pattern: str, **kwargs) -> "ShardedArrayDataset":
+        """
+        Shards matching a glob pattern, in sorted order
+        """
+        if not (paths := sorted(glob.glob(os.path.expanduser(pattern)))):
+            raise ValueError(f"No data shard matches {pattern}")
+        return cls(paths, **kwargs)
+
+    @property
+    def num_features(self) -> int:
+        return self.num_columns - self.target_columns
+
+    def _get_shard(self, index: int) -> np.ndarray:
+        if (shard := self._shards[index]) is None:
+            path = self.paths[index]
+            if self.data_format == "npy":
+                shard = np.load(path, mmap_mode="r")
+            else:
+                shard = np.memmap(path, dtype=self.dtype, mode="r").reshape(
+                    -1, self.num_columns
+                )
+            self._shards[index] = shard
+        return shard
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = [None] * len(self.paths)
+        return state
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def _split(self, rows: np.ndarray) -> Tuple[torch.Tensor, torch.Tensor]:
+        # NOTE: copy out of the map (fancy indexing already does), tensors must not keep the file mapped
+        rows = torch.from_numpy(np.ascontiguousarray(rows, dtype=np.float32))
+        return rows[:, : self.num_features], rows[:, self.num_features :]
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        shard = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        features, targets = self._split(
+            self._get_shard(shard)[[index - self.offsets[shard]]]
+        )
+        return features[0], targets[0]
+
+    def __getitems__(self, indices: List[int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        indices = np.asarray(indices)
+        shards = np.searchsorted(self.offsets, indices, side="right") - 1
+        rows = np.empty((len(indices), self.num_columns), dtype=self.dtype)
+        for shard in np.unique(shards):
+            positions = np.nonzero(shards == shard)[0]
+            local = indices[positions] - self.offsets[shard]
+            # Sorted reads are sequential on disk
+            order = np.argsort(local)
+            rows[positions[order]] = self._get_shard(shard)[local[order]]
+        return self._split(rows)
+
+
+class ShardShuffleSampler(Sampler[int]):
+    """
+    Shuffle across shards without random access over the whole dataset: each epoch the shard order is shuffled,
+    then the rows of every `window` consecutive shards are shuffled together.
+    `window=0` keeps the original order. Call `set_epoch` for a different (but reproducible) order per epoch.
+
+    With `num_replicas` data-parallel ranks, each takes every `num_replicas`-th index of the same order
+    (the last `len(dataset) % num_replicas` rows are dropped, so all ranks run as many steps).
+    """
+
+    def __init__(
+        self,
+        dataset: ShardedArrayDataset,
+        window: int = 1,
+        seed: int = 0,
+        num_replicas: int = 1,
+        rank: int = 0,
+    ):
+        self.dataset = dataset
+        self.window = window
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return len(self.dataset) // self.num_replicas
+
+    def __iter__(self) -> Iterator[int]:
+        if self.num_replicas == 1:
+            yield from self._iter_order()
+            return
+        yield from itertools.islice(
+            self._iter_order(),
+            self.rank,
+            len(self) * self.num_replicas,
+            self.num_replicas,
+        )
+
+    def _iter_order(self) -> Iterator[int]:
+        offsets = self.dataset.offsets
+        num_shards = len(self.dataset.shard_lengths)
+        if self.window <= 0:
+            yield from range(len(self.dataset))
+            return
+        rng = np.random.default_rng((self.seed, self.epoch))
+        shard_order = rng.permutation(num_shards)
+        for start in range(0, num_shards, self.window):
+            # Only one window of indices in memory at a time
+            indices = np.concatenate(
+                [
+                    np.arange(offsets[shard], offsets[shard + 1])
+                    for shard in shard_order[start : start + self.window]
+                ]
+            )
+            rng.shuffle(indices)
+            yield from indices.tolist()
+
+
+def _collate_batch(batch: Tuple[torch.Tensor, torch.Tensor]):
+    # Batches come already collated from `ShardedArrayDataset.__getitems__`
+    return batch
+
+
+def build_data_loader(
+    dataset: ShardedArrayDataset,
+    batch_size: int,
+    shuffle_window: int = 1,
+    seed: int = 0,
+    num_workers: int = 0,
+    prefetch_factor: int = 2,
+    pin_memory: bool = False,
+    num_replicas: int = 1,
+    rank: int = 0,
+) -> DataLoader:
+    """
+    Stream mini-batches of a sharded dataset, prefetched by `num_workers` worker processes (`prefetch_factor` batches each).
+    Use `pin_memory` when training on GPU, so batches can be copied with `non_blocking=True`.
+    With `num_replicas` > 1, only the part of data-parallel rank `rank` (see `ShardShuffleSampler`).
+    """
+    sampler = ShardShuffleSampler(
+        dataset,
+        window=shuffle_window,
+        seed=seed,
+        num_replicas=num_replicas,
+        rank=rank,
+    )
+    return DataLoader(
+        dataset,
+        batch_sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+        collate_fn=_collate_batch,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+        persistent_workers=num_workers > 0,
+        pin_memory=pin_memory,
+    )
+
+
+def write_shards(
+    directory: str,
+    num_shards: int,
+    rows_per_shard: int,
+    num_features: int = 10,
+    target_columns: int = 1,
+    data_format: Literal["npy", "raw"] = "npy",
+    seed: int = 0,
+) -> str:
+    """
+    Write random shards (e.g. to try the pipeline out), return the glob pattern
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for index in range(num_shards):
+        rows = rng.standard_normal(
+            (rows_per_shard, num_features + target_columns), dtype=np.float32
+        )
+        if data_format == "npy":
+            np.save(os.path.join(directory, f"shard_{index:05d}.npy"), rows)
+        else:
+            rows.tofile(os.path.join(directory, f"shard_{index:05d}.bin"))
+    logger.info(f"Wrote {num_shards} shards of {rows_per_shard} rows to {directory}")
+    return os.path.join(
+        directory, f"shard_*.{'npy' if data_format == 'npy' else 'bin'}"
+    )
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    pattern = write_shards(tempfile.mkdtemp(), num_shards=8, rows_per_shard=10000)
+    dataset = ShardedArrayDataset.from_pattern(pattern)
+    print(len(dataset), dataset.num_features, dataset.shard_lengths)
+    loader = build_data_loader(dataset, batch_size=256, shuffle_window=2, num_workers=2)
+    for epoch in range(2):
+        loader.batch_sampler.sampler.set_epoch(epoch)
+        start = time.time()
+        num_rows = sum(len(features) for features, _ in loader)
+        print(f"Epoch {epoch}: {num_rows} rows in {time.time() - start:.2f}s")
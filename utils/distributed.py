@@ -0,0 +1,126 @@
+from typing import Callable, List, Optional, Union
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing
+from .cpu import CPUManager
+
+
+def find_free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class DistributedContext:
+    """
+    One rank of a data-parallel run (`torch.distributed`, one process per device on this host):
+    the device (and cores) it trains on and where it meets the other ranks.
+
+    The launcher locks the devices of all ranks as a gang and creates the contexts (`create_rank_contexts`),
+    so ranks don't acquire anything themselves. Collectives go over NCCL on GPUs, gloo otherwise.
+    """
+
+    def __init__(
+        self,
+        rank: int,
+        world_size: int,
+        device: str,
+        init_method: str,
+        cores: Optional[List[int]] = None,
+    ):
+        self.rank = rank
+        self.world_size = world_size
+        self.device = device
+        self.init_method = init_method
+        self.cores = cores
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+    @property
+    def backend(self) -> str:
+        return "nccl" if torch.device(self.device).type == "cuda" else "gloo"
+
+    def init(self) -> torch.device:
+        """
+        Join the process group from the rank's process (blocks until all ranks did), returns the device to train on
+        """
+        if self.cores:
+            CPUManager.apply(self.cores)
+        device = torch.device(self.device)
+        if device.type == "cuda":
+            torch.cuda.set_device(device)
+        dist.init_process_group(
+            self.backend,
+            init_method=self.init_method,
+            rank=self.rank,
+            world_size=self.world_size,
+        )
+        return device
+
+    def destroy(self) -> None:
+        if dist.is_initialized():
+            dist.destroy_process_group()
+
+    def average(self, tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Mean of `tensor` over the ranks
+        NOTE: on GPU it's queued like any other kernel, reading it back is still left to the caller
+        """
+        tensor = tensor.clone()
+        dist.all_reduce(tensor)
+        return tensor / self.world_size
+
+    def broadcast_flag(self, flag: bool, device: Union[torch.device, str]) -> bool:
+        """
+        Rank 0's `flag` on every rank, so they all take the same branch (e.g. stopping early)
+        """
+        tensor = torch.tensor([int(flag)], device=device)
+        dist.broadcast(tensor, src=0)
+        return bool(tensor.item())
+
+    def __repr__(self) -> str:
+        return f"DistributedContext(rank={self.rank}, world_size={self.world_size}, device={self.device}, backend={self.backend})"
+
+
+def create_rank_contexts(
+    devices: List[str],
+    cores: Optional[List[List[int]]] = None,
+    host: str = "127.0.0.1",
+) -> List[DistributedContext]:
+    """
+    A context per device (and per slice of `cores`), all meeting on a free port of `host`
+    """
+    init_method = f"tcp://{host}:{find_free_port(host)}"
+    return [
+        DistributedContext(
+            rank, len(devices), device, init_method, cores[rank] if cores else None
+        )
+        for rank, device in enumerate(devices)
+    ]
+
+
+def spawn_ranks(fn: Callable, contexts: List[DistributedContext], *args) -> None:
+    """
+    Run `fn(rank, contexts, *args)` in a new process per rank and wait for all of them.
+    If a rank fails, the others are terminated and its error is raised here.
+    """
+    torch.multiprocessing.spawn(
+        fn, args=(contexts, *args), nprocs=len(contexts), join=True
+    )
+
+
+def _demo_rank(rank: int, contexts: List[DistributedContext]) -> None:
+    context = contexts[rank]
+    device = context.init()
+    mean = context.average(torch.tensor(float(rank), device=device))
+    print(
+        f"{context}: mean rank {mean.item()}, stop {context.broadcast_flag(rank == 0, device)}"
+    )
+    context.destroy()
+
+
+if __name__ == "__main__":
+    spawn_ranks(_demo_rank, create_rank_contexts(["cpu"] * 3))
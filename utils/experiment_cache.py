@@ -0,0 +1,163 @@
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+import mlflow
+from mlflow.exceptions import MlflowException
+from mlflow.entities import LifecycleStage
+from filelock import FileLock
+import config
+from loguru import logger
+
+
+class ExperimentCache:
+    """
+    Experiment name -> ID, resolved (and created if needed) once, then shared by every process of the host
+    (API, executor workers, pueue jobs) through a small JSON file guarded by a file lock.
+
+    Two processes creating the same new experiment are serialized by the lock; a creation that still loses a race
+    (e.g. against another host) re-reads the winner's ID.
+    Cached IDs are checked again every `ttl` seconds, so a deleted (or renamed) experiment is dropped and resolved again.
+    Call `invalidate` to drop one right away (e.g. when creating a run in it failed).
+    """
+
+    def __init__(
+        self,
+        path: str = config.EXPERIMENT_CACHE_PATH,
+        ttl: float = config.EXPERIMENT_CACHE_TTL,
+        client: Optional[mlflow.MlflowClient] = None,
+    ):
+        self._path = path
+        self._ttl = ttl
+        self._client = client
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file_lock = FileLock(f"{path}.lock")
+        self._lock = threading.Lock()
+        # (tracking URI, name) -> (ID, last checked at)
+        self._memo: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _get_client(self) -> mlflow.MlflowClient:
+        if self._client is None:
+            self._client = mlflow.MlflowClient()
+        return self._client
+
+    def _read_store(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        try:
+            with open(self._path) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_store(self, store: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(store, fp)
+        os.replace(tmp_path, self._path)
+
+    def _is_active(self, experiment_id: str, name: str) -> bool:
+        try:
+            experiment = self._get_client().get_experiment(experiment_id)
+        except MlflowException:
+            # e.g. permanently deleted
+            return False
+        return (
+            experiment.lifecycle_stage == LifecycleStage.ACTIVE
+            and experiment.name == name
+        )
+
+    def _resolve(self, name: str) -> str:
+        client = self._get_client()
+        if (experiment := client.get_experiment_by_name(name)) is None:
+            try:
+                return client.create_experiment(name)
+            except MlflowException:
+                # Created in the meantime by someone not sharing this cache, use theirs
+                if (experiment := client.get_experiment_by_name(name)) is None:
+                    raise
+                logger.info(f"Experiment {name} was created concurrently, reusing it")
+        if experiment.lifecycle_stage != LifecycleStage.ACTIVE:
+            # NOTE: the name stays taken until the experiment is restored or permanently deleted
+            raise MlflowException(
+                f"Experiment {name} is deleted, restore it or delete it permanently to use the name again"
+            )
+        return experiment.experiment_id
+
+    def get_id(self, name: str) -> str:
+        """
+        ID of the experiment named `name`, created if it doesn't exist
+        """
+        key = (mlflow.get_tracking_uri(), name)
+        if (cached := self._memo.get(key)) and time.time() - cached[1] <= self._ttl:
+            self.hits += 1
+            return cached[0]
+
+        with self._lock, self._file_lock:
+            store = self._read_store()
+            entries = store.setdefault(key[0], {})
+            now = time.time()
+            if (entry := entries.get(name)) and now - entry["checked_at"] <= self._ttl:
+                # Resolved (or checked) by another process
+                self.hits += 1
+                experiment_id, checked_at = entry["id"], entry["checked_at"]
+            else:
+                if entry and self._is_active(entry["id"], name):
+                    self.hits += 1
+                    experiment_id = entry["id"]
+                else:
+                    self.misses += 1
+                    experiment_id = self._resolve(name)
+                checked_at = now
+                entries[name] = {"id": experiment_id, "checked_at": checked_at}
+                self._write_store(store)
+            self._memo[key] = (experiment_id, checked_at)
+            return experiment_id
+
+    def invalidate(self, name: str) -> None:
+        """
+        Forget the ID of `name` in every process, so the next `get_id` resolves it again
+        """
+        tracking_uri = mlflow.get_tracking_uri()
+        with self._lock, self._file_lock:
+            self._memo.pop((tracking_uri, name), None)
+            store = self._read_store()
+            if store.get(tracking_uri, {}).pop(name, None) is not None:
+                self._write_store(store)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "names": len(self._memo),
+            "ttl": self._ttl,
+        }
+
+
+_experiment_cache: Optional[ExperimentCache] = None
+_experiment_cache_lock = threading.Lock()
+
+
+def get_experiment_cache() -> ExperimentCache:
+    """
+    Process-wide cache
+    """
+    global _experiment_cache
+    with _experiment_cache_lock:
+        if _experiment_cache is None:
+            _experiment_cache = ExperimentCache()
+        return _experiment_cache
+
+
+if __name__ == "__main__":
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = get_experiment_cache()
+    name = sys.argv[1] if len(sys.argv) > 1 else "experiment cache demo"
+    # Concurrent first uses of a new experiment create it once
+    with ThreadPoolExecutor(8) as pool:
+        print(set(pool.map(lambda _: cache.get_id(name), range(8))))
+    print(cache.stats())
@@ -1,11 +1,18 @@
-from typing import Tuple, Union, Optional, Literal, ContextManager
+from typing import Tuple, Union, Optional, Literal, ContextManager, List, Dict, Any, TYPE_CHECKING
 import config
+import json
 import os
+import threading
 import time
+import uuid
 import GPUtil
 from filelock import FileLock
 import torch
 from loguru import logger
+from .metrics import DEVICE_LOCK_WAIT_SECONDS
+
+if TYPE_CHECKING:
+    from .profiling import PhaseTimer
 
 
 class DummyContextManager:
@@ -25,25 +32,522 @@ class DummyContextManager:
         return
 
 
-class TorchDeviceManager:
+class GPUBackend:
+    """
+    Where the allocator gets its devices from
+    """
+
+    def device_count(self) -> int:
+        raise NotImplementedError
+
+    def available_devices(self) -> List[int]:
+        """
+        Devices that look idle (low load and memory usage)
+        """
+        raise NotImplementedError
+
+    def memory_total(self, gpu_id: int) -> float:
+        """
+        Device memory in MiB
+        """
+        raise NotImplementedError
+
+    def device(self, gpu_id: int, return_str: bool = False) -> Union[torch.device, str]:
+        raise NotImplementedError
+
+
+class CudaGPUBackend(GPUBackend):
+    def device_count(self) -> int:
+        return len(GPUtil.getGPUs()) if torch.cuda.is_available() else 0
+
+    def available_devices(self) -> List[int]:
+        return GPUtil.getAvailable(
+            order="first",
+            limit=self.device_count(),
+            maxLoad=0.05,
+            maxMemory=0.05,
+            includeNan=False,
+        )
+
+    def memory_total(self, gpu_id: int) -> float:
+        return GPUtil.getGPUs()[gpu_id].memoryTotal
+
+    def device(self, gpu_id: int, return_str: bool = False) -> Union[torch.device, str]:
+        return torch.device(f"cuda:{gpu_id}") if not return_str else f"cuda:{gpu_id}"
+
+
+class FakeGPUBackend(GPUBackend):
+    """
+    Pretend to have `num_devices` GPUs of `memory` MiB (training runs on CPU), to exercise GPU allocation on CPU-only machines.
+    Devices in `busy` are reported as used by someone else.
+    """
+
+    def __init__(
+        self,
+        num_devices: int = config.FAKE_GPU_NUM,
+        memory: float = config.FAKE_GPU_MEMORY,
+        busy: List[int] = [],
+    ):
+        self.num_devices = num_devices
+        self.memory = memory
+        self.busy = set(busy)
+
+    def device_count(self) -> int:
+        return self.num_devices
+
+    def available_devices(self) -> List[int]:
+        return [gpu_id for gpu_id in range(self.num_devices) if gpu_id not in self.busy]
+
+    def memory_total(self, gpu_id: int) -> float:
+        return self.memory
+
+    def device(self, gpu_id: int, return_str: bool = False) -> Union[torch.device, str]:
+        return torch.device("cpu") if not return_str else "cpu"
+
+
+def get_default_backend() -> GPUBackend:
+    return FakeGPUBackend() if config.FAKE_GPU_NUM else CudaGPUBackend()
+
+
+def estimate_gpu_memory(
+    model: torch.nn.Module,
+    optimizer_states: int = 1,
+    overhead: float = config.GPU_MEMORY_OVERHEAD,
+) -> float:
+    """
+    Rough GPU memory (MiB) to train `model`: parameters, gradients and `optimizer_states` copies (e.g. 1 for SGD momentum, 2 for Adam),
+    plus `overhead` for the CUDA context and activations.
+    """
+    param_bytes = sum(
+        param.numel() * param.element_size() for param in model.parameters()
+    )
+    return param_bytes * (2 + optimizer_states) / 1024**2 + overhead
+
+
+# The queue lock is only held for a moment, so don't wait the default 50ms between attempts
+QUEUE_LOCK_POLL_INTERVAL = 0.005
+
+# Bumped on every release (or ticket leaving the queue) in this process, so waiters here wake up right away
+_release_condition = threading.Condition()
+_release_generation = 0
+
+
+def _notify_waiters() -> None:
+    global _release_generation
+    with _release_condition:
+        _release_generation += 1
+        _release_condition.notify_all()
+
+
+class GPULock:
+    """
+    An acquired GPU lock. Releasing it (or leaving `with lock:`) wakes the waiting allocators.
+    """
+
+    def __init__(self, gpu_id: int, file_lock: FileLock):
+        self.gpu_id = gpu_id
+        self._file_lock = file_lock
+
+    @property
+    def is_locked(self) -> bool:
+        return self._file_lock.is_locked
+
+    def acquire(self) -> None:
+        if not self.is_locked:
+            self._file_lock.acquire()
+
+    def release(self) -> None:
+        if self.is_locked:
+            self._file_lock.release(force=True)
+            _notify_waiters()
+
+    def __enter__(self) -> "GPULock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(gpu_id={self.gpu_id}, locked={self.is_locked})"
+
+
+class GPULease(GPULock):
+    """
+    A share of a GPU's memory. The GPU is held as long as any lease on it is (its lease file is locked).
+    """
 
     def __init__(
         self,
+        gpu_id: int,
+        file_lock: FileLock,
+        allocator: "GPUAllocator",
+        lease_id: str,
+        memory: float,
+    ):
+        super().__init__(gpu_id, file_lock)
+        self._allocator = allocator
+        self.lease_id = lease_id
+        self.memory = memory
+
+    def acquire(self) -> None:
+        if not self.is_locked:
+            raise RuntimeError("A released GPU lease can't be acquired again")
+
+    def release(self) -> None:
+        if self.is_locked:
+            self._allocator._remove_lease(self.gpu_id, self.lease_id)
+            super().release()
+
+
+class GangLock:
+    """
+    Locks acquired together for one job (e.g. a GPU or CPU slice per rank of a distributed run), released together.
+    """
+
+    def __init__(self, locks: List[Any]):
+        self.locks = locks
+
+    def __bool__(self) -> bool:
+        return bool(self.locks)
+
+    def acquire(self) -> None:
+        for lock in self.locks:
+            lock.acquire()
+
+    def release(self) -> None:
+        for lock in self.locks:
+            lock.release()
+
+    def __enter__(self) -> "GangLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def __repr__(self) -> str:
+        return f"GangLock({self.locks})"
+
+
+class GPUAllocator:
+    """
+    Hand out GPUs (file locks, shared by all processes on the host) in first come first served order.
+
+    Waiters queue up in a ticket file, a GPU goes to the earliest ticket that can use it.
+    Releases in this process wake waiters immediately, releases in other processes are noticed within `poll_interval`
+    (a non-blocking lock attempt, no GPU query).
+    Waiters only read the queue, it's written when a ticket joins or leaves it (got its GPUs, timed out, or crashed).
+    A waiter holds a lock file for its ticket, so the tickets of crashed waiters are dropped by whoever sees them next.
+
+    A job asking for `memory` (MiB) gets a lease instead of an exclusive lock: leases are packed onto a GPU (best fit)
+    as long as they add up to at most `1 - memory_headroom` of its memory, and exclusive jobs wait until all leases are gone.
+
+    A gang (`acquire_gang`, e.g. the ranks of a distributed run) gets all its GPUs at once or none of them,
+    so two gangs never deadlock holding part of what the other is waiting for.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[GPUBackend] = None,
         lock_dir: str = config.LOCK_DIR,
         lock_extension: str = config.LOCK_EXTENSION,
-        wait_time: int = config.WAIT_TIME,
+        poll_interval: float = config.GPU_POLL_INTERVAL,
+        memory_headroom: float = config.GPU_MEMORY_HEADROOM,
+        refresh_interval: float = config.WAIT_TIME,
     ):
+        self.backend = backend or get_default_backend()
         self._lock_dir = lock_dir
         self._lock_extension = lock_extension
-        self._wait_time = wait_time
+        self._poll_interval = poll_interval
+        self._memory_headroom = memory_headroom
+        os.makedirs(self._lock_dir, exist_ok=True)
+        self._queue_path = os.path.join(lock_dir, "gpu_queue.json")
+        self._leases_path = os.path.join(lock_dir, "gpu_leases.json")
+        self._queue_lock = FileLock(
+            os.path.join(lock_dir, f"gpu_queue{lock_extension}")
+        )
 
-    def _create_lock_dir(self) -> None:
-        if not os.path.exists(self._lock_dir):
-            os.makedirs(self._lock_dir)
+        # NOTE: querying nvidia-smi is slow, so which GPUs are busy because of someone else is reused for a while
+        self._refresh_interval = refresh_interval
+        self._external_busy: Optional[set] = None
+        self._external_busy_time = 0.0
 
     def _get_lock_file_path(self, gpu_id: int) -> str:
         return os.path.join(self._lock_dir, f"gpu_{gpu_id}{self._lock_extension}")
 
+    def _get_lease_file_path(self, gpu_id: int, lease_id: str) -> str:
+        return os.path.join(
+            self._lock_dir, f"gpu_{gpu_id}.lease_{lease_id}{self._lock_extension}"
+        )
+
+    def _get_ticket_file_path(self, ticket: str) -> str:
+        return os.path.join(
+            self._lock_dir, f"gpu_ticket_{ticket}{self._lock_extension}"
+        )
+
+    def _read_json(self, path: str, default: Any) -> Any:
+        try:
+            with open(path) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+
+    def _write_json(self, path: str, data: Any) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, path)
+
+    def _enqueue(
+        self, gpu_id: int, memory: float, count: int = 1
+    ) -> Tuple[str, FileLock]:
+        """
+        Add a ticket to the queue, returns it with its lock file (held until the ticket leaves the queue)
+        """
+        ticket = uuid.uuid4().hex
+        ticket_lock = FileLock(self._get_ticket_file_path(ticket))
+        ticket_lock.acquire(timeout=0)
+        with self._queue_lock.acquire(poll_interval=QUEUE_LOCK_POLL_INTERVAL):
+            queue = self._read_json(self._queue_path, [])
+            queue.append(
+                {
+                    "ticket": ticket,
+                    "gpu_id": gpu_id,
+                    "memory": memory,
+                    "count": count,
+                    "time": time.time(),
+                }
+            )
+            self._write_json(self._queue_path, queue)
+        return ticket, ticket_lock
+
+    def _dequeue(self, ticket: str, ticket_lock: FileLock) -> None:
+        with self._queue_lock.acquire(poll_interval=QUEUE_LOCK_POLL_INTERVAL):
+            self._write_json(
+                self._queue_path,
+                [
+                    item
+                    for item in self._read_json(self._queue_path, [])
+                    if item["ticket"] != ticket
+                ],
+            )
+        ticket_lock.release()
+        self._remove_file(self._get_ticket_file_path(ticket))
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _is_held(file_lock: FileLock) -> bool:
+        try:
+            file_lock.acquire(timeout=0)
+        except TimeoutError:
+            return True
+        file_lock.release()
+        return False
+
+    def _read_leases(self) -> Dict[int, Dict[str, float]]:
+        """
+        GPU ID -> lease ID -> memory, without the leases of crashed holders
+        """
+        leases = {}
+        for gpu_id, items in self._read_json(self._leases_path, {}).items():
+            for lease_id, memory in items.items():
+                lease_path = self._get_lease_file_path(gpu_id, lease_id)
+                if self._is_held(FileLock(lease_path)):
+                    leases.setdefault(int(gpu_id), {})[lease_id] = memory
+                else:
+                    self._remove_file(lease_path)
+        return leases
+
+    def _remove_lease(self, gpu_id: int, lease_id: str) -> None:
+        with self._queue_lock.acquire(poll_interval=QUEUE_LOCK_POLL_INTERVAL):
+            leases = self._read_leases()
+            leases.get(gpu_id, {}).pop(lease_id, None)
+            self._write_json(self._leases_path, leases)
+
+    def _get_usable(self, leases: Dict[int, Dict[str, float]]) -> set:
+        """
+        GPUs not used by processes outside of our locks
+        NOTE: a GPU busy with our own jobs is usable again as soon as they release it, without waiting for the next query
+        """
+        if (
+            self._external_busy is None
+            or time.time() - self._external_busy_time > self._refresh_interval
+        ):
+            busy = set(range(self.backend.device_count())) - set(
+                self.backend.available_devices()
+            )
+            self._external_busy = {
+                gpu_id
+                for gpu_id in busy
+                if gpu_id not in leases
+                and not self._is_held(FileLock(self._get_lock_file_path(gpu_id)))
+            }
+            self._external_busy_time = time.time()
+        return set(range(self.backend.device_count())) - self._external_busy
+
+    def _try_acquire(
+        self, ticket: str, gpu_id: int, memory: float, count: int = 1
+    ) -> Optional[List[GPULock]]:
+        with self._queue_lock.acquire(poll_interval=QUEUE_LOCK_POLL_INTERVAL):
+            leases = self._read_leases()
+            usable = self._get_usable(leases)
+            # GPUs an earlier ticket is waiting for
+            claimed = set()
+            crashed = set()
+            queue = self._read_json(self._queue_path, [])
+            for item in queue:
+                if item["ticket"] == ticket:
+                    break
+                if not self._is_held(
+                    FileLock(self._get_ticket_file_path(item["ticket"]))
+                ):
+                    crashed.add(item["ticket"])
+                    continue
+                claimed |= usable if item["gpu_id"] == -1 else {item["gpu_id"]}
+            # NOTE: the only write while waiting, and only when a waiter died without leaving the queue
+            if crashed:
+                self._write_json(
+                    self._queue_path,
+                    [item for item in queue if item["ticket"] not in crashed],
+                )
+                for crashed_ticket in crashed:
+                    self._remove_file(self._get_ticket_file_path(crashed_ticket))
+
+            wanted = sorted(usable) if gpu_id == -1 else [gpu_id]
+            candidates = [candidate for candidate in wanted if candidate not in claimed]
+            if memory <= 0:
+                locks = []
+                for candidate in candidates:
+                    if candidate in leases:
+                        continue
+                    file_lock = FileLock(self._get_lock_file_path(candidate))
+                    try:
+                        file_lock.acquire(timeout=0)
+                    except TimeoutError:
+                        continue
+                    locks.append(GPULock(candidate, file_lock))
+                    if len(locks) == count:
+                        return locks
+                # All or nothing
+                for lock in locks:
+                    lock._file_lock.release(force=True)
+                return None
+
+            # Best fit: the GPUs with the least memory left after placing this job
+            fits = []
+            for candidate in candidates:
+                capacity = self.backend.memory_total(candidate) * (
+                    1 - self._memory_headroom
+                )
+                left = capacity - sum(leases.get(candidate, {}).values()) - memory
+                if left >= 0 and not self._is_held(
+                    FileLock(self._get_lock_file_path(candidate))
+                ):
+                    fits.append((left, candidate))
+            if len(fits) < count:
+                return None
+            locks = []
+            for _, candidate in sorted(fits)[:count]:
+                lease_id = uuid.uuid4().hex
+                file_lock = FileLock(self._get_lease_file_path(candidate, lease_id))
+                file_lock.acquire(timeout=0)
+                leases.setdefault(candidate, {})[lease_id] = memory
+                locks.append(GPULease(candidate, file_lock, self, lease_id, memory))
+            self._write_json(self._leases_path, leases)
+            return locks
+
+    def acquire(
+        self, gpu_id: int = -1, timeout: Optional[float] = None, memory: float = 0
+    ) -> Tuple[int, GPULock]:
+        """
+        Wait for `gpu_id` (-1 for any idle GPU) and lock it. Raise `TimeoutError` after `timeout` seconds.
+        With `memory` (MiB) > 0, share the GPU with other such jobs instead of locking it exclusively.
+        """
+        (lock,) = self._acquire(gpu_id, timeout, memory)
+        return lock.gpu_id, lock
+
+    def acquire_gang(
+        self, count: int, timeout: Optional[float] = None, memory: float = 0
+    ) -> List[GPULock]:
+        """
+        Wait until `count` GPUs can be locked at once and lock them, in the same queue as single GPU jobs.
+        `timeout` and `memory` (per GPU) as in `acquire`.
+        """
+        if count > self.backend.device_count():
+            raise ValueError(
+                f"Can't lock {count} GPUs, only {self.backend.device_count()} on this host"
+            )
+        return self._acquire(-1, timeout, memory, count)
+
+    def _acquire(
+        self,
+        gpu_id: int,
+        timeout: Optional[float],
+        memory: float,
+        count: int = 1,
+    ) -> List[GPULock]:
+        deadline = None if timeout is None else time.time() + timeout
+        ticket, ticket_lock = self._enqueue(gpu_id, memory, count)
+        waiting_logged = False
+        try:
+            while True:
+                with _release_condition:
+                    generation = _release_generation
+                if locks := self._try_acquire(ticket, gpu_id, memory, count):
+                    return locks
+
+                if not waiting_logged:
+                    if gpu_id != -1:
+                        logger.info(f"GPU {gpu_id} is currently occupied. Waiting...")
+                    elif count > 1:
+                        logger.info(f"Fewer than {count} available GPUs. Waiting...")
+                    else:
+                        logger.info("No available GPUs. Waiting...")
+                    waiting_logged = True
+                wait_time = self._poll_interval
+                if deadline is not None:
+                    if (remaining := deadline - time.time()) <= 0:
+                        raise TimeoutError(f"No GPU acquired within {timeout} seconds")
+                    wait_time = min(wait_time, remaining)
+                with _release_condition:
+                    _release_condition.wait_for(
+                        lambda: _release_generation != generation, timeout=wait_time
+                    )
+        finally:
+            self._dequeue(ticket, ticket_lock)
+            # The next ticket may be waiting for us to leave the queue
+            _notify_waiters()
+
+    def queue(self) -> List[Dict[str, Any]]:
+        with self._queue_lock.acquire(poll_interval=QUEUE_LOCK_POLL_INTERVAL):
+            return self._read_json(self._queue_path, [])
+
+    def leases(self) -> Dict[int, Dict[str, float]]:
+        with self._queue_lock.acquire(poll_interval=QUEUE_LOCK_POLL_INTERVAL):
+            return self._read_leases()
+
+
+class TorchDeviceManager:
+
+    def __init__(
+        self,
+        lock_dir: str = config.LOCK_DIR,
+        lock_extension: str = config.LOCK_EXTENSION,
+        wait_time: int = config.WAIT_TIME,
+        backend: Optional[GPUBackend] = None,
+    ):
+        self._lock_dir = lock_dir
+        self._lock_extension = lock_extension
+        self._wait_time = wait_time
+        self._backend = backend or get_default_backend()
+
     @staticmethod
     def is_gpu_available(mode: Literal["torch", "gputils"] = "torch") -> bool:
         if mode == "torch":
@@ -59,36 +563,18 @@ class TorchDeviceManager:
 
     @staticmethod
     def get_gpu_number(mode: Literal["torch", "gputils"] = "torch", default: int = 0) -> int:
+        if config.FAKE_GPU_NUM:
+            return config.FAKE_GPU_NUM
         return (
             len(GPUtil.getGPUs())
             if TorchDeviceManager.is_gpu_available(mode=mode)
             else default
         )
 
-    def _get_available_gpu(self) -> Optional[Tuple[int, FileLock]]:
-        if not self.is_gpu_available():
-            logger.warning("No valid GPU.")
-            return None
-        self._create_lock_dir()
-        while True:
-            available_gpus = GPUtil.getAvailable(
-                order="first",
-                limit=self.get_gpu_number(),
-                maxLoad=0.05,
-                maxMemory=0.05,
-                includeNan=False,
-            )
-            for gpu_id in available_gpus:
-                lock_file = self._get_lock_file_path(gpu_id)
-                lock = FileLock(lock_file)
-                try:
-                    lock.acquire(timeout=0)  # Try to acquire the lock without waiting
-                    return gpu_id, lock
-                except:
-                    continue
-
-            logger.info("No available GPUs. Waiting...")
-            time.sleep(self._wait_time)
+    def get_allocator(self) -> GPUAllocator:
+        return GPUAllocator(
+            self._backend, lock_dir=self._lock_dir, lock_extension=self._lock_extension
+        )
 
     @staticmethod
     def _get_dummy_lock() -> ContextManager:
@@ -98,49 +584,97 @@ class TorchDeviceManager:
         self,
         gpu_id: int = -1,
         return_str: bool = False,
-    ) -> Tuple[Union[torch.device], Union[FileLock, DummyContextManager]]:
-        if self.is_gpu_available():
-            if gpu_id == -1:
-                gpu_id, lock = self._get_available_gpu()
-            else:
-                gpu_id = gpu_id
-                lock_file = self._get_lock_file_path(gpu_id)
-                lock = FileLock(lock_file)
-                try:
-                    lock.acquire(timeout=0)
-                except:
-                    logger.info(f"GPU {gpu_id} is currently occupied. Waiting...")
-                    while True:
-                        try:
-                            lock.acquire(timeout=0)
-                            break
-                        except:
-                            time.sleep(self._wait_time)
-
-            device = (
-                torch.device(f"cuda:{gpu_id}") if not return_str else f"cuda:{gpu_id}"
-            )
+        timeout: Optional[float] = None,
+        memory: float = 0,
+        timer: Optional["PhaseTimer"] = None,
+    ) -> Tuple[Union[torch.device, str], Union[GPULock, DummyContextManager]]:
+        """
+        `memory` (MiB) > 0 shares a GPU with other jobs (see `GPUAllocator`), otherwise the GPU is locked exclusively.
+        Time spent waiting for the GPU goes to the `device_lock_wait` phase of `timer` and to `/metrics`.
+        """
+        if self._backend.device_count() > 0:
+            with DEVICE_LOCK_WAIT_SECONDS.time(device="gpu"):
+                with timer.span("device_lock_wait") if timer else DummyContextManager():
+                    gpu_id, lock = self.get_allocator().acquire(
+                        gpu_id, timeout=timeout, memory=memory
+                    )
+            device = self._backend.device(gpu_id, return_str=return_str)
         else:
             device = torch.device("cpu") if not return_str else "cpu"
             lock = self._get_dummy_lock()
 
         return device, lock
 
+    def get_devices_and_lock(
+        self,
+        count: int,
+        return_str: bool = False,
+        timeout: Optional[float] = None,
+        memory: float = 0,
+        timer: Optional["PhaseTimer"] = None,
+    ) -> Tuple[List[Union[torch.device, str]], Union[GangLock, DummyContextManager]]:
+        """
+        `count` GPUs locked as a gang (see `GPUAllocator.acquire_gang`), e.g. one per rank of a distributed run.
+        Without GPUs, `count` times the CPU and a dummy lock.
+        """
+        if self._backend.device_count() > 0:
+            with DEVICE_LOCK_WAIT_SECONDS.time(device="gpu"):
+                with timer.span("device_lock_wait") if timer else DummyContextManager():
+                    locks = self.get_allocator().acquire_gang(
+                        count, timeout=timeout, memory=memory
+                    )
+            devices = [
+                self._backend.device(lock.gpu_id, return_str=return_str)
+                for lock in locks
+            ]
+            return devices, GangLock(locks)
+
+        device = torch.device("cpu") if not return_str else "cpu"
+        return [device] * count, self._get_dummy_lock()
+
 
 def get_parallel_num() -> Optional[int]:
+    if config.FAKE_GPU_NUM:
+        return config.FAKE_GPU_NUM * config.MAX_JOBS_PER_GPU
     if torch.cuda.is_available():
-        return len(GPUtil.getGPUs())
+        return len(GPUtil.getGPUs()) * config.MAX_JOBS_PER_GPU
     else:
-        return None if not config.MAX_PARALLEL_NUM else config.MAX_PARALLEL_NUM
+        from .cpu import CPUManager
+
+        # One worker per CPU slice, so jobs don't oversubscribe cores
+        num_slices = CPUManager().num_slices
+        return (
+            num_slices
+            if not config.MAX_PARALLEL_NUM
+            else min(num_slices, config.MAX_PARALLEL_NUM)
+        )
 
 
 if __name__ == "__main__":
-    manager = TorchDeviceManager()
-    print(manager.get_gpu_number())
-    device, lock = manager.get_device_and_lock()
-    lock.acquire()
-    print(device, lock)
-    import ipdb
-
-    ipdb.set_trace()
-    lock.release()
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Two fake GPUs, five exclusive jobs: granted in submission order, each as soon as the previous holder releases
+    manager = TorchDeviceManager(
+        lock_dir=tempfile.mkdtemp(), backend=FakeGPUBackend(num_devices=2)
+    )
+    start = time.time()
+
+    def job(index: int, memory: float = 0) -> None:
+        device, lock = manager.get_device_and_lock(memory=memory)
+        with lock:
+            print(f"{time.time() - start:.2f}s job {index} got {lock} ({device})")
+            time.sleep(0.5)
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        for index in range(5):
+            executor.submit(job, index)
+            time.sleep(0.01)
+
+    # Ten 4 GiB jobs on two fake 16 GiB GPUs (10% headroom): three per GPU at a time
+    print(estimate_gpu_memory(torch.nn.Linear(10, 1)))
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        for index in range(10):
+            executor.submit(job, index, 4096)
+            time.sleep(0.01)
@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import time
+import uuid
+import config
+from loguru import logger
+from .stop_signal import request_stop
+
+
+class JobRegistry:
+    """
+    Keep track of the futures submitted to the training executor, so queue depth, job state and cancellation
+    can be answered in-process without asking the tracking server.
+
+    NOTE: a future only tells us whether it is running when we look at it,
+    so `started_at` is the first time we observed it running (or its finish time if we never did).
+    `ProcessPoolExecutor` also marks a job running once it is handed to the worker queue (a few before a worker is free),
+    such a job can't be cancelled anymore but is stopped at its first epoch instead.
+    """
+
+    def __init__(self, max_finished: int = config.JOB_REGISTRY_MAX_FINISHED):
+        self._max_finished = max_finished
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        future: Future,
+        run_id: Optional[str] = None,
+        kind: str = "train",
+        name: Optional[str] = None,
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "run_id": run_id,
+            "kind": kind,
+            "name": name,
+            "future": future,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "stop_requested": False,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        future.add_done_callback(lambda _: self._on_done(job_id))
+        return job_id
+
+    def _on_done(self, job_id: str) -> None:
+        with self._lock:
+            if (job := self._jobs.get(job_id)) is None:
+                return
+            job["finished_at"] = time.time()
+            if job["started_at"] is None and not job["future"].cancelled():
+                job["started_at"] = job["finished_at"]
+            self._finished[job_id] = None
+            while len(self._finished) > self._max_finished:
+                old_job_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_job_id, None)
+
+    @staticmethod
+    def _get_state(job: Dict[str, Any]) -> str:
+        future: Future = job["future"]
+        if future.cancelled():
+            return "cancelled"
+        if future.done():
+            if future.exception() is not None:
+                return "failed"
+            return "stopped" if job["stop_requested"] else "finished"
+        if future.running():
+            if job["started_at"] is None:
+                job["started_at"] = time.time()
+            return "stopping" if job["stop_requested"] else "running"
+        return "queued"
+
+    def _to_dict(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        state = self._get_state(job)
+        result = {key: value for key, value in job.items() if key != "future"}
+        result["state"] = state
+        if state == "failed":
+            result["error"] = str(job["future"].exception())
+        return result
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if (job := self._jobs.get(job_id)) is None:
+                return None
+            return self._to_dict(job)
+
+    def list(
+        self, state: Optional[str] = None, run_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = [self._to_dict(job) for job in self._jobs.values()]
+        return [
+            job
+            for job in jobs
+            if (state is None or job["state"] == state)
+            and (run_id is None or job["run_id"] == run_id)
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {
+            "queued": 0,
+            "running": 0,
+            "stopping": 0,
+            "finished": 0,
+            "stopped": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+        with self._lock:
+            for job in self._jobs.values():
+                counts[self._get_state(job)] += 1
+        return counts
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a queued job, or ask a running one to stop after its current epoch.
+        Return the job after the request (None if not found).
+        """
+        with self._lock:
+            if (job := self._jobs.get(job_id)) is None:
+                return None
+        future: Future = job["future"]
+        # NOTE: outside the lock, since a successful cancel runs the done callback right away
+        if not future.cancel() and not future.done():
+            if job["run_id"] is None:
+                logger.warning(f"Job {job_id} is running and has no run to signal.")
+            else:
+                request_stop(job["run_id"])
+                job["stop_requested"] = True
+        return self.get(job_id)
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    registry = JobRegistry()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job_ids = [registry.register(executor.submit(time.sleep, 1)) for _ in range(3)]
+        time.sleep(0.1)
+        print(registry.counts())
+        print(registry.cancel(job_ids[-1]))
+    print(registry.list())
@@ -0,0 +1,196 @@
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+from collections import OrderedDict, deque
+import asyncio
+import json
+import socket
+import time
+import config
+from loguru import logger
+
+# Datagrams beyond this are dropped by the hub, keep published batches small
+MAX_DATAGRAM_SIZE = 65000
+
+
+class MetricStreamPublisher:
+    """
+    Publish the metrics of a run to the API's `MetricStreamHub` (`GET /runs/{run_id}/stream`) as UDP datagrams on localhost.
+
+    Fire and forget: never blocks or fails training, whether the API is running or not.
+    NOTE: live view only, a datagram may be lost (e.g. under load), MLFlow stays the record of the run.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        address: Tuple[str, int] = (
+            config.METRIC_STREAM_HOST,
+            config.METRIC_STREAM_PORT,
+        ),
+    ):
+        self._run_id = run_id
+        self._address = address
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def _send(self, event: Dict[str, Any]) -> None:
+        data = json.dumps({"run_id": self._run_id, **event}).encode()
+        if len(data) > MAX_DATAGRAM_SIZE:
+            logger.warning(f"Metric stream event of {len(data)} bytes dropped")
+            return
+        try:
+            self._socket.sendto(data, self._address)
+        except OSError:
+            # Nobody listening, or the socket buffer is full
+            pass
+
+    def publish(
+        self,
+        metrics: Dict[str, float],
+        step: Optional[int] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        self._send(
+            {
+                "event": "metrics",
+                "step": step or 0,
+                "timestamp": (
+                    timestamp if timestamp is not None else int(time.time() * 1000)
+                ),
+                "metrics": metrics,
+            }
+        )
+
+    def close(self) -> None:
+        """
+        Tell subscribers the run is done
+        """
+        if self._socket.fileno() == -1:
+            return
+        self._send({"event": "end", "timestamp": int(time.time() * 1000)})
+        self._socket.close()
+
+
+class MetricStreamHub(asyncio.DatagramProtocol):
+    """
+    Receive what `MetricStreamPublisher`s send and fan it out to subscribers of each run (see `subscribe`).
+
+    The last `backlog` events of the last `max_runs` runs are kept, so a new subscriber first gets the recent history.
+    A subscriber that can't keep up loses its oldest events instead of slowing down the others.
+    """
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = (
+            config.METRIC_STREAM_HOST,
+            config.METRIC_STREAM_PORT,
+        ),
+        backlog: int = config.METRIC_STREAM_BACKLOG,
+        max_runs: int = 256,
+        queue_size: int = 1024,
+    ):
+        self._address = address
+        self._backlog = backlog
+        self._max_runs = max_runs
+        self._queue_size = queue_size
+        # run ID -> recent events, least recently updated first
+        self._events: "OrderedDict[str, deque]" = OrderedDict()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    @property
+    def running(self) -> bool:
+        return self._transport is not None
+
+    async def start(self) -> bool:
+        """
+        Start listening, False if the address is taken (e.g. by another API instance on this host)
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: self, local_addr=self._address
+            )
+        except OSError as e:
+            logger.warning(
+                f"Metric streaming disabled, could not listen on {self._address}: {e}"
+            )
+            return False
+        self._transport = transport
+        logger.info(f"Listening for metric streams on {self._address}")
+        return True
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            event = json.loads(data)
+            run_id = event.pop("run_id")
+        except (ValueError, KeyError, AttributeError):
+            return
+        self.publish(run_id, event)
+
+    def publish(self, run_id: str, event: Dict[str, Any]) -> None:
+        if (events := self._events.get(run_id)) is None:
+            events = self._events[run_id] = deque(maxlen=self._backlog)
+            while len(self._events) > self._max_runs:
+                self._events.popitem(last=False)
+        else:
+            self._events.move_to_end(run_id)
+        events.append(event)
+        for queue in self._subscribers.get(run_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def subscribe(
+        self, run_id: str, keepalive: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Recent then live events of a run, until its `end` event.
+        Yields None every `keepalive` seconds without events (e.g. to keep a connection open).
+        """
+        # Room for the whole backlog
+        queue = asyncio.Queue(max(self._queue_size, self._backlog))
+        for event in self._events.get(run_id, ()):
+            queue.put_nowait(event)
+        self._subscribers.setdefault(run_id, set()).add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event.get("event") == "end":
+                    return
+        finally:
+            subscribers = self._subscribers[run_id]
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[run_id]
+
+
+if __name__ == "__main__":
+
+    async def main() -> None:
+        hub = MetricStreamHub()
+        await hub.start()
+        publisher = MetricStreamPublisher("demo")
+
+        async def train() -> None:
+            for step in range(5):
+                publisher.publish({"loss": 1 / (step + 1)}, step=step)
+                await asyncio.sleep(0.1)
+            publisher.close()
+
+        task = asyncio.create_task(train())
+        async for event in hub.subscribe("demo"):
+            print(event)
+        await task
+        hub.close()
+
+    asyncio.run(main())
@@ -0,0 +1,314 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+# Seconds, from a cached lookup to a job waiting for a GPU
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+    1800,
+)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple, **extra) -> str:
+    pairs = list(zip(label_names, label_values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        # label values -> value(s)
+        self._values: Dict[Tuple, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join(
+            [
+                f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.type}",
+                *self._samples(),
+            ]
+        )
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}_total{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Either `set` values, or `set_function` to compute all label values when scraped
+    (e.g. queue depth, so the hot path doesn't have to maintain it).
+    """
+
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], Dict[Tuple, float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Dict[Tuple, float]]) -> None:
+        """
+        `function` returns label values (tuple in `label_names` order, `()` without labels) -> value
+        """
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            values = self._function()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.label_names, tuple(key))} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        # Index of the first bucket the value fits in, len(buckets) for +Inf only
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            if (state := self._values.get(key)) is None:
+                # [count per bucket (not cumulative) + Inf, sum]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {
+                key: (list(counts), total)
+                for key, (counts, total) in self._values.items()
+            }
+        samples = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(
+                    f"{self.name}_bucket{_format_labels(self.label_names, key, le=_format_value(bound))} {cumulative}"
+                )
+            samples.append(
+                f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}"
+            )
+            samples.append(
+                f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}"
+            )
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text format (`render()`) for a `/metrics` endpoint.
+
+    Recording is a dict update under a lock, cheap enough for every request.
+    Worker processes `drain()` what they recorded (counters and histograms) and send it to the parent, which `merge()`s it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(
+        self, cls, name: str, documentation: str, label_names: Sequence[str], **kwargs
+    ):
+        with self._lock:
+            if (metric := self._metrics.get(name)) is None:
+                metric = self._metrics[name] = cls(
+                    name, documentation, label_names, **kwargs
+                )
+            elif not isinstance(metric, cls):
+                raise ValueError(
+                    f"Metric {name} is already registered as a {metric.type}"
+                )
+            return metric
+
+    def counter(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(
+        self, name: str, documentation: str, label_names: Sequence[str] = ()
+    ) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, label_names, buckets=buckets
+        )
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def drain(self) -> Dict[str, Any]:
+        """
+        Take (and reset) what counters and histograms recorded since the last drain, as a picklable dict
+        """
+        drained = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if isinstance(metric, Gauge):
+                continue
+            with metric._lock:
+                values, metric._values = metric._values, {}
+            if values:
+                drained[metric.name] = {
+                    "type": metric.type,
+                    "documentation": metric.documentation,
+                    "label_names": metric.label_names,
+                    "buckets": getattr(metric, "buckets", None),
+                    "values": values,
+                }
+        return drained
+
+    def merge(self, drained: Dict[str, Any]) -> None:
+        """
+        Add what another process `drain()`ed
+        """
+        for name, item in drained.items():
+            if item["type"] == "counter":
+                metric = self.counter(name, item["documentation"], item["label_names"])
+                for key, value in item["values"].items():
+                    metric.inc(value, **dict(zip(metric.label_names, key)))
+            elif item["type"] == "histogram":
+                metric = self.histogram(
+                    name, item["documentation"], item["label_names"], item["buckets"]
+                )
+                if metric.buckets != tuple(item["buckets"]):
+                    continue
+                with metric._lock:
+                    for key, (counts, total) in item["values"].items():
+                        if (state := metric._values.get(key)) is None:
+                            state = metric._values[key] = [[0] * len(counts), 0.0]
+                        state[0] = [a + b for a, b in zip(state[0], counts)]
+                        state[1] += total
+
+
+# NOTE: one registry per process, like the default registry of prometheus_client
+REGISTRY = MetricsRegistry()
+
+# Recorded wherever the work happens (API process or training workers)
+DEVICE_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "device_lock_wait_seconds", "Time jobs waited for a GPU or a CPU slice", ["device"]
+)
+PUEUE_COMMAND_SECONDS = REGISTRY.histogram(
+    "pueue_command_duration_seconds", "Latency of pueue subprocesses", ["command"]
+)
+PUEUE_COMMAND_ERRORS = REGISTRY.counter(
+    "pueue_command_errors", "pueue subprocesses that failed", ["command"]
+)
+MLFLOW_CALL_SECONDS = REGISTRY.histogram(
+    "mlflow_call_duration_seconds",
+    "Latency of tracking server calls made by the API",
+    ["method"],
+)
+MLFLOW_CALL_ERRORS = REGISTRY.counter(
+    "mlflow_call_errors",
+    "Tracking server calls made by the API that raised",
+    ["method"],
+)
+
+
+if __name__ == "__main__":
+    requests = REGISTRY.histogram("demo_request_duration_seconds", "Demo", ["endpoint"])
+    for seconds in (0.002, 0.03, 0.4):
+        requests.observe(seconds, endpoint="/train")
+    with requests.time(endpoint="/status"):
+        time.sleep(0.01)
+    REGISTRY.counter("demo_errors", "Demo", ["endpoint"]).inc(endpoint="/train")
+    REGISTRY.gauge("demo_queue_depth", "Demo").set_function(lambda: {(): 3})
+
+    # As if recorded in a worker process
+    worker = MetricsRegistry()
+    worker.histogram("demo_request_duration_seconds", "Demo", ["endpoint"]).observe(
+        1.5, endpoint="/train"
+    )
+    REGISTRY.merge(worker.drain())
+    print(REGISTRY.render())
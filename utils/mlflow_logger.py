@@ -0,0 +1,218 @@
+from typing import Optional, Dict, Any, List
+import atexit
+import threading
+import time
+import mlflow
+from mlflow.entities import Metric, Param, RunTag
+import config
+from loguru import logger
+from .metric_stream import MetricStreamPublisher
+
+# https://mlflow.org/docs/latest/rest-api.html#log-batch
+# NOTE: a single log_batch request can carry at most 1000 metrics, 100 params and 100 tags (1000 entities in total)
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_PER_BATCH = 100
+MAX_TAGS_PER_BATCH = 100
+
+
+class BatchMetricLogger:
+    """
+    Buffer metrics, params and tags in memory and send them with `MlflowClient.log_batch` from a background thread.
+
+    The buffer is flushed when it holds `max_batch_size` metrics or every `flush_interval` seconds, whichever comes first.
+    Use it as a context manager (or call `close()`) so the buffer is drained when the run ends or fails.
+    With `stream`, metrics are also published right away for live viewers (see `MetricStreamPublisher`).
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        client: Optional[mlflow.MlflowClient] = None,
+        max_batch_size: int = config.METRIC_BATCH_SIZE,
+        flush_interval: float = config.METRIC_FLUSH_INTERVAL,
+        stream: bool = config.METRIC_STREAM,
+    ):
+        self._run_id = run_id
+        self._publisher = MetricStreamPublisher(run_id) if stream else None
+        self._client = client or mlflow.MlflowClient()
+        self._max_batch_size = max(1, min(max_batch_size, MAX_METRICS_PER_BATCH))
+        self._flush_interval = flush_interval
+
+        self._metrics: List[Metric] = []
+        # Params and tags are key-value, later value overrides earlier one
+        self._params: Dict[str, Param] = {}
+        self._tags: Dict[str, RunTag] = {}
+
+        self._cond = threading.Condition()
+        # Number of flush requests (explicit flush / close) the worker has not yet served
+        self._flush_requested = 0
+        self._flush_served = 0
+        self._closed = False
+        # Seconds the background thread spent sending batches
+        self.send_time = 0.0
+
+        self._thread = threading.Thread(
+            target=self._worker, name=f"BatchMetricLogger-{run_id}", daemon=True
+        )
+        self._thread.start()
+        # Last resort in case the caller forgot to close (e.g. process is exiting)
+        atexit.register(self.close)
+
+    @property
+    def run_id(self) -> str:
+        return self._run_id
+
+    def _pending_count(self) -> int:
+        return len(self._metrics) + len(self._params) + len(self._tags)
+
+    def log_metric(
+        self,
+        key: str,
+        value: float,
+        step: Optional[int] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        self.log_metrics({key: value}, step=step, timestamp=timestamp)
+
+    def log_metrics(
+        self,
+        metrics: Dict[str, float],
+        step: Optional[int] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        batch = [
+            Metric(key, float(value), timestamp, step or 0)
+            for key, value in metrics.items()
+        ]
+        with self._cond:
+            self._metrics.extend(batch)
+            if len(self._metrics) >= self._max_batch_size:
+                self._cond.notify()
+        if self._publisher is not None:
+            self._publisher.publish(
+                {metric.key: metric.value for metric in batch}, step, timestamp
+            )
+
+    def log_param(self, key: str, value: Any) -> None:
+        with self._cond:
+            self._params[key] = Param(key, str(value))
+
+    def log_params(self, params: Dict[str, Any]) -> None:
+        for key, value in params.items():
+            self.log_param(key, value)
+
+    def set_tag(self, key: str, value: Any) -> None:
+        with self._cond:
+            self._tags[key] = RunTag(key, str(value))
+
+    def set_tags(self, tags: Dict[str, Any]) -> None:
+        for key, value in tags.items():
+            self.set_tag(key, value)
+
+    def _take_buffer(self):
+        metrics, params, tags = (
+            self._metrics,
+            list(self._params.values()),
+            list(self._tags.values()),
+        )
+        self._metrics, self._params, self._tags = [], {}, {}
+        return metrics, params, tags
+
+    def _send(
+        self, metrics: List[Metric], params: List[Param], tags: List[RunTag]
+    ) -> None:
+        # Params and tags go first so that they show up even if metrics are large
+        while metrics or params or tags:
+            param_chunk, params = (
+                params[:MAX_PARAMS_PER_BATCH],
+                params[MAX_PARAMS_PER_BATCH:],
+            )
+            tag_chunk, tags = tags[:MAX_TAGS_PER_BATCH], tags[MAX_TAGS_PER_BATCH:]
+            metric_room = MAX_METRICS_PER_BATCH - len(param_chunk) - len(tag_chunk)
+            metric_chunk, metrics = metrics[:metric_room], metrics[metric_room:]
+            try:
+                self._client.log_batch(
+                    self._run_id,
+                    metrics=metric_chunk,
+                    params=param_chunk,
+                    tags=tag_chunk,
+                    synchronous=True,
+                )
+            except Exception as e:
+                # NOTE: never let tracking I/O break the training loop, we just drop this chunk
+                logger.error(
+                    f"Failed to log batch ({len(metric_chunk)} metrics, {len(param_chunk)} params, {len(tag_chunk)} tags) to run {self._run_id}: {e}"
+                )
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self._flush_interval
+                while (
+                    not self._closed
+                    and self._flush_requested == self._flush_served
+                    and len(self._metrics) < self._max_batch_size
+                    and (remaining := deadline - time.monotonic()) > 0
+                ):
+                    self._cond.wait(remaining)
+                closed = self._closed
+                flush_target = self._flush_requested
+                buffers = self._take_buffer()
+
+            start = time.perf_counter()
+            self._send(*buffers)
+            self.send_time += time.perf_counter() - start
+
+            with self._cond:
+                self._flush_served = flush_target
+                self._cond.notify_all()
+                if closed and not self._pending_count():
+                    return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until everything logged before this call has been sent. Return False on timeout.
+        """
+        with self._cond:
+            if not self._thread.is_alive():
+                return not self._pending_count()
+            self._flush_requested += 1
+            target = self._flush_requested
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._flush_served >= target, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._publisher is not None:
+            self._publisher.close()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(
+                f"BatchMetricLogger for run {self._run_id} did not drain within {timeout} seconds."
+            )
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> "BatchMetricLogger":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    with mlflow.start_run() as run:
+        with BatchMetricLogger(
+            run.info.run_id, max_batch_size=5, flush_interval=1
+        ) as metric_logger:
+            metric_logger.log_params({"learning_rate": 0.01, "epochs": 12})
+            metric_logger.set_tag("Device", "cpu")
+            for step in range(12):
+                metric_logger.log_metric("loss", 1 / (step + 1), step=step)
+            print(metric_logger.flush())
+    print(mlflow.MlflowClient().get_metric_history(run.info.run_id, "loss"))
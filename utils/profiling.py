@@ -0,0 +1,104 @@
+from typing import Dict, Optional
+from contextlib import contextmanager
+import os
+import tempfile
+import time
+import torch
+import torch.profiler
+import mlflow
+from loguru import logger
+
+# Prefix of the phase timing metrics, next to MLFlow's own system metrics (system/cpu_utilization_percentage, ...)
+PHASE_METRIC_PREFIX = "system/time/"
+
+
+class PhaseTimer:
+    """
+    Accumulate wall time per phase of a run (`with timer.span("data"): ...`), to be logged with `pop_metrics()` as
+    `system/time/<phase>` metrics (seconds since the last pop).
+
+    NOTE: on GPU, kernels run asynchronously, so their time shows up in whichever phase waits for them next
+    (e.g. reading the loss back), not where they were launched.
+    With `record_functions`, spans are also labeled in `torch.profiler` traces.
+    """
+
+    def __init__(self, record_functions: bool = False):
+        self._record_functions = record_functions
+        self._totals: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self._totals[phase] = self._totals.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def span(self, phase: str):
+        start = time.perf_counter()
+        try:
+            if self._record_functions:
+                with torch.profiler.record_function(phase):
+                    yield
+            else:
+                yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def pop_metrics(self) -> Dict[str, float]:
+        metrics = {
+            f"{PHASE_METRIC_PREFIX}{phase}": seconds
+            for phase, seconds in self._totals.items()
+        }
+        self._totals = {}
+        return metrics
+
+
+def create_profiler(
+    run_id: str, device: torch.device, steps: int, skip: int = 1, warmup: int = 1
+) -> Optional[torch.profiler.profile]:
+    """
+    Profile `steps` training steps (call `.step()` after each) after skipping `skip` and warming up `warmup` steps.
+    The trace (open it in chrome://tracing or https://ui.perfetto.dev) and a table of the most expensive operators are
+    logged to the run under `profiler/`. None if `steps` is 0.
+    """
+    if steps <= 0:
+        return None
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device.type == "cuda":
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    client = mlflow.MlflowClient()
+
+    def on_trace_ready(profiler: torch.profiler.profile) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trace_path = os.path.join(tmp_dir, "trace.json")
+            profiler.export_chrome_trace(trace_path)
+            client.log_artifact(run_id, trace_path, "profiler")
+        client.log_text(
+            run_id,
+            profiler.key_averages().table(
+                sort_by=(
+                    "self_cuda_time_total"
+                    if device.type == "cuda"
+                    else "self_cpu_time_total"
+                ),
+                row_limit=30,
+            ),
+            "profiler/key_averages.txt",
+        )
+        logger.info(f"Logged profiler trace of {steps} steps")
+
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(
+            skip_first=skip, wait=0, warmup=warmup, active=steps, repeat=1
+        ),
+        on_trace_ready=on_trace_ready,
+    )
+
+
+if __name__ == "__main__":
+    timer = PhaseTimer()
+    for _ in range(3):
+        with timer.span("sleep"):
+            time.sleep(0.1)
+    with timer.span("compute"):
+        sum(range(1000000))
+    print(timer.pop_metrics())
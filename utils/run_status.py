@@ -0,0 +1,295 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from concurrent.futures import Future
+import re
+import threading
+import time
+import mlflow
+from mlflow.entities import Run, ViewType
+import config
+from loguru import logger
+
+RUN_STATUS_FIELDS = ("status", "start_time", "end_time", "metrics", "params", "tags")
+# Run IDs per `search_runs` filter, so the filter string stays short
+SEARCH_CHUNK_SIZE = 100
+_RUN_ID_PATTERN = re.compile(r"^[0-9a-zA-Z_-]+$")
+
+
+def run_to_status(run: Run) -> Dict[str, Any]:
+    """
+    Same fields as `GET /status/{run_id}`
+    """
+    return {
+        "run_id": run.info.run_id,
+        "status": run.info.status,
+        "start_time": run.info.start_time,
+        "end_time": run.info.end_time,
+        "metrics": run.data.metrics,
+        "params": run.data.params,
+        "tags": run.data.tags,
+    }
+
+
+def project_status(
+    status: Dict[str, Any], fields: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    """
+    Keep only `fields` of a run status: whole fields (`metrics`) or single keys (`metrics.loss`, `tags.mlflow.runName`)
+    """
+    if not fields:
+        return status
+    projected = {"run_id": status["run_id"]}
+    for field in fields:
+        name, _, key = field.partition(".")
+        if name not in RUN_STATUS_FIELDS or (
+            key and name not in ("metrics", "params", "tags")
+        ):
+            raise ValueError(
+                f"Unknown field {field}, expected one of {RUN_STATUS_FIELDS} or metrics/params/tags.<key>"
+            )
+        if not key:
+            projected[name] = status[name]
+        elif key in status[name]:
+            projected.setdefault(name, {})[key] = status[name][key]
+        else:
+            projected.setdefault(name, {})
+    return projected
+
+
+class RunStatusCache:
+    """
+    Statuses of many runs resolved with one `search_runs` query (instead of a `get_run` per run),
+    cached for `ttl` seconds and shared by every request of the process.
+
+    Concurrent requests coalesce: a run (or experiment) already being fetched by another request is waited for
+    instead of queried again. Thread safe (used from the API's tracking thread pool).
+    """
+
+    def __init__(
+        self,
+        ttl: float = config.RUN_STATUS_CACHE_TTL,
+        client: Optional[mlflow.MlflowClient] = None,
+    ):
+        self._ttl = ttl
+        self._client = client
+        self._lock = threading.Lock()
+        # run ID -> (fetched at, status)
+        self._runs: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # (experiment ID, max results) -> (fetched at, run IDs)
+        self._experiments: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        # run ID / experiment key -> query in flight, resolving to run ID -> status
+        self._pending: Dict[Hashable, Future] = {}
+        # Experiments to search run IDs in, refreshed when a run isn't found
+        self._experiment_ids: Optional[List[str]] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.queries = 0
+
+    def _get_client(self) -> mlflow.MlflowClient:
+        if self._client is None:
+            self._client = mlflow.MlflowClient()
+        return self._client
+
+    def _search(
+        self,
+        experiment_ids: List[str],
+        filter_string: str = "",
+        max_results: Optional[int] = None,
+        run_view_type: int = ViewType.ACTIVE_ONLY,
+    ) -> Dict[str, Dict[str, Any]]:
+        statuses = {}
+        page_token = None
+        while True:
+            self.queries += 1
+            page = self._get_client().search_runs(
+                experiment_ids,
+                filter_string=filter_string,
+                run_view_type=run_view_type,
+                max_results=min(max_results or SEARCH_CHUNK_SIZE * 10, 50000),
+                page_token=page_token,
+            )
+            statuses.update((run.info.run_id, run_to_status(run)) for run in page)
+            page_token = page.token
+            if not page_token or (max_results and len(statuses) >= max_results):
+                return statuses
+
+    def _get_experiment_ids(self, refresh: bool = False) -> List[str]:
+        if self._experiment_ids is None or refresh:
+            self.queries += 1
+            self._experiment_ids = [
+                experiment.experiment_id
+                for experiment in self._get_client().search_experiments(
+                    view_type=ViewType.ALL
+                )
+            ]
+        return self._experiment_ids
+
+    def _search_run_ids(self, run_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        def search(experiment_ids: List[str], run_ids: List[str]):
+            statuses = {}
+            for start in range(0, len(run_ids), SEARCH_CHUNK_SIZE):
+                chunk = run_ids[start : start + SEARCH_CHUNK_SIZE]
+                statuses.update(
+                    self._search(
+                        experiment_ids,
+                        "attributes.run_id IN ({})".format(
+                            ", ".join(f"'{run_id}'" for run_id in chunk)
+                        ),
+                        # Deleted runs too, like `get_run`
+                        run_view_type=ViewType.ALL,
+                    )
+                )
+            return statuses
+
+        known = self._get_experiment_ids()
+        statuses = search(known, run_ids)
+        if missing := [run_id for run_id in run_ids if run_id not in statuses]:
+            # Might be in an experiment created since the list was fetched
+            if new := sorted(set(self._get_experiment_ids(refresh=True)) - set(known)):
+                statuses.update(search(new, missing))
+        return statuses
+
+    def _fetch(
+        self,
+        keys: List[Hashable],
+        future: Future,
+        fetch: Callable[[], Dict[str, Dict[str, Any]]],
+        on_fetched: Optional[Callable[[float, Dict[str, Dict[str, Any]]], None]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Run `fetch` for `keys` (registered as pending with `future`) and publish the result to the requests waiting on it
+        """
+        try:
+            statuses = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._release(keys, future)
+            future.set_exception(e)
+            raise
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired entries, so the cache doesn't grow with every run ever asked for
+            self._runs = {
+                run_id: item
+                for run_id, item in self._runs.items()
+                if now - item[0] <= self._ttl
+            }
+            self._runs.update(
+                (run_id, (now, status)) for run_id, status in statuses.items()
+            )
+            if on_fetched is not None:
+                on_fetched(now, statuses)
+            self._release(keys, future)
+        future.set_result(statuses)
+        return statuses
+
+    def _release(self, keys: List[Hashable], future: Future) -> None:
+        for key in keys:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def get_runs(self, run_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        run ID -> status (see `run_to_status`), runs that don't exist are left out
+        """
+        now = time.monotonic()
+        statuses: Dict[str, Dict[str, Any]] = {}
+        waiting: Dict[str, Future] = {}
+        to_fetch: List[str] = []
+        with self._lock:
+            for run_id in dict.fromkeys(run_ids):
+                if not _RUN_ID_PATTERN.match(run_id):
+                    continue
+                if (cached := self._runs.get(run_id)) and now - cached[0] <= self._ttl:
+                    statuses[run_id] = cached[1]
+                    self.hits += 1
+                elif (future := self._pending.get(run_id)) is not None:
+                    waiting[run_id] = future
+                    self.coalesced += 1
+                else:
+                    to_fetch.append(run_id)
+                    self.misses += 1
+            if to_fetch:
+                future = Future()
+                for run_id in to_fetch:
+                    self._pending[run_id] = future
+
+        if to_fetch:
+            statuses.update(
+                self._fetch(to_fetch, future, lambda: self._search_run_ids(to_fetch))
+            )
+        for run_id, future in waiting.items():
+            if (status := future.result().get(run_id)) is not None:
+                statuses[run_id] = status
+        # In the order asked
+        return {run_id: statuses[run_id] for run_id in run_ids if run_id in statuses}
+
+    def get_experiment_runs(
+        self, experiment_id: str, max_results: int = 1000
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        run ID -> status of the (active) runs of an experiment, most recently started first
+        """
+        key = (experiment_id, max_results)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._experiments.get(key)
+            if cached and now - cached[0] <= self._ttl:
+                # NOTE: runs are cached as long as the experiment query, all of them are still there
+                runs = {run_id: self._runs.get(run_id) for run_id in cached[1]}
+                if all(runs.values()):
+                    self.hits += 1
+                    return {run_id: item[1] for run_id, item in runs.items()}
+            if (future := self._pending.get(key)) is None:
+                future = self._pending[key] = Future()
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        def on_fetched(fetched_at: float, statuses: Dict[str, Dict[str, Any]]) -> None:
+            self._experiments = {
+                other: item
+                for other, item in self._experiments.items()
+                if fetched_at - item[0] <= self._ttl
+            }
+            self._experiments[key] = (fetched_at, list(statuses))
+
+        return self._fetch(
+            [key],
+            future,
+            lambda: self._search([experiment_id], max_results=max_results),
+            on_fetched,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "queries": self.queries,
+                "runs": len(self._runs),
+                "experiments": len(self._experiments),
+                "pending": len(self._pending),
+                "ttl": self._ttl,
+            }
+
+
+if __name__ == "__main__":
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = RunStatusCache()
+    run_ids = sys.argv[1:]
+    # Concurrent requests for the same runs share one query
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: cache.get_runs(run_ids), range(8)))
+    for status in results[0].values():
+        logger.info(project_status(status, ["status", "end_time"]))
+    print(cache.stats())
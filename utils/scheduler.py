@@ -0,0 +1,314 @@
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from collections import deque
+from concurrent.futures import Executor, Future
+import math
+import threading
+import time
+import config
+from loguru import logger
+
+
+class QueueFullError(RuntimeError):
+    """
+    The scheduler queue is full, try again after `retry_after` seconds.
+    """
+
+    def __init__(self, queue_size: int, retry_after: int):
+        super().__init__(
+            f"Scheduler queue is full ({queue_size} jobs waiting), retry after {retry_after} seconds"
+        )
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """
+    Queue slots taken ahead of submission (e.g. before creating MLFlow runs), released on exit if not used.
+    Quacks like an `Executor` (`submit`) with a fixed priority and group.
+    """
+
+    def __init__(
+        self,
+        scheduler: "PriorityScheduler",
+        count: int,
+        priority: int = 0,
+        group: Optional[str] = None,
+    ):
+        self._scheduler = scheduler
+        self.remaining = count
+        self.priority = priority
+        self.group = group
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return self._scheduler.schedule(
+            fn,
+            *args,
+            priority=self.priority,
+            group=self.group,
+            reservation=self,
+            **kwargs,
+        )
+
+    def release(self) -> None:
+        self._scheduler._release(self)
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class PriorityScheduler:
+    """
+    Admission control and ordering in front of an executor.
+
+    Jobs wait here (not in the executor's unbounded FIFO) and are handed to the executor only when one of its
+    `max_workers` is free: highest priority first, then the group (e.g. experiment name) with the fewest running jobs,
+    then the least recently served group, then first come first served.
+    At most `max_queue` jobs can wait, beyond that `QueueFullError` is raised with a Retry-After estimate.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        max_workers: int,
+        max_queue: int = config.SCHEDULER_MAX_QUEUE,
+    ):
+        self._executor = executor
+        self._max_workers = max_workers
+        self._max_queue = max_queue
+
+        # priority -> group -> FIFO of (future, fn, args, kwargs)
+        self._queues: Dict[int, Dict[Optional[str], Deque[Tuple]]] = {}
+        self._queued = 0
+        self._reserved = 0
+        self._in_flight = 0
+        self._running: Dict[Optional[str], int] = {}
+        self._last_served: Dict[Optional[str], float] = {}
+        # Moving average of job duration, for the Retry-After estimate
+        self._avg_duration: Optional[float] = None
+
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._worker, name="PriorityScheduler", daemon=True
+        )
+        self._thread.start()
+
+    def _retry_after(self) -> int:
+        if self._avg_duration is None:
+            return config.SCHEDULER_RETRY_AFTER
+        # Roughly when the next job finishes and a queued one moves to the executor
+        return max(1, math.ceil(self._avg_duration / self._max_workers))
+
+    def _admit(self, count: int) -> None:
+        if self._queued + self._reserved + count > self._max_queue:
+            raise QueueFullError(self._queued + self._reserved, self._retry_after())
+
+    def reserve(
+        self, count: int = 1, priority: int = 0, group: Optional[str] = None
+    ) -> Reservation:
+        """
+        Take `count` queue slots now or raise `QueueFullError`.
+        """
+        with self._cond:
+            self._admit(count)
+            self._reserved += count
+        return Reservation(self, count, priority, group)
+
+    def _release(self, reservation: Reservation) -> None:
+        with self._cond:
+            self._reserved -= reservation.remaining
+            reservation.remaining = 0
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        return self.schedule(fn, *args, **kwargs)
+
+    def schedule(
+        self,
+        fn: Callable,
+        /,
+        *args,
+        priority: int = 0,
+        group: Optional[str] = None,
+        reservation: Optional[Reservation] = None,
+        **kwargs,
+    ) -> Future:
+        """
+        Queue `fn(*args, **kwargs)`, higher `priority` runs first. The returned future stays pending while queued
+        (so it can be cancelled) and is running once handed to the executor.
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Cannot schedule new jobs after shutdown")
+            if reservation is not None and reservation.remaining > 0:
+                reservation.remaining -= 1
+                self._reserved -= 1
+            else:
+                self._admit(1)
+            item = (future, fn, args, kwargs)
+            self._queues.setdefault(priority, {}).setdefault(group, deque()).append(
+                item
+            )
+            self._queued += 1
+            self._cond.notify()
+        future.add_done_callback(lambda _: self._on_cancelled(item, priority, group))
+        return future
+
+    def _on_cancelled(self, item: Tuple, priority: int, group: Optional[str]) -> None:
+        if not item[0].cancelled():
+            return
+        # Free the queue slot right away instead of when the job reaches the front
+        with self._cond:
+            try:
+                self._queues[priority][group].remove(item)
+            except (KeyError, ValueError):
+                return
+            self._queued -= 1
+            self._prune(priority, group)
+
+    def _prune(self, priority: int, group: Optional[str]) -> None:
+        if not self._queues[priority][group]:
+            del self._queues[priority][group]
+            if not self._queues[priority]:
+                del self._queues[priority]
+
+    def _pop(self) -> Tuple[Tuple, Optional[str]]:
+        priority = max(self._queues)
+        groups = self._queues[priority]
+        # Fair share: fewest running jobs first, then least recently served
+        group = min(
+            groups,
+            key=lambda group: (
+                self._running.get(group, 0),
+                self._last_served.get(group, 0.0),
+            ),
+        )
+        item = groups[group].popleft()
+        self._prune(priority, group)
+        self._queued -= 1
+        return item, group
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed
+                    or (self._queued and self._in_flight < self._max_workers)
+                )
+                if self._closed:
+                    return
+                (future, fn, args, kwargs), group = self._pop()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._in_flight += 1
+                self._running[group] = self._running.get(group, 0) + 1
+                self._last_served[group] = time.time()
+
+            started_at = time.time()
+            try:
+                inner = self._executor.submit(fn, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Failed to submit job to executor: {e}")
+                self._on_done(group, None)
+                future.set_exception(e)
+                continue
+            inner.add_done_callback(
+                lambda inner, future=future, group=group, started_at=started_at: self._on_inner_done(
+                    inner, future, group, started_at
+                )
+            )
+
+    def _on_inner_done(
+        self, inner: Future, future: Future, group: Optional[str], started_at: float
+    ) -> None:
+        self._on_done(group, time.time() - started_at)
+        if inner.cancelled():
+            # e.g. executor shut down with cancel_futures
+            future.set_exception(RuntimeError("Job was cancelled by the executor"))
+        elif (exception := inner.exception()) is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(inner.result())
+
+    def _on_done(self, group: Optional[str], duration: Optional[float]) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if (running := self._running[group] - 1) > 0:
+                self._running[group] = running
+            else:
+                del self._running[group]
+            if duration is not None:
+                self._avg_duration = (
+                    duration
+                    if self._avg_duration is None
+                    else 0.8 * self._avg_duration + 0.2 * duration
+                )
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": self._queued,
+                "reserved": self._reserved,
+                "in_flight": self._in_flight,
+                "max_workers": self._max_workers,
+                "max_queue": self._max_queue,
+                "queued_by_priority": {
+                    priority: sum(len(queue) for queue in groups.values())
+                    for priority, groups in self._queues.items()
+                },
+                "running_by_group": dict(self._running),
+                "avg_duration": self._avg_duration,
+            }
+
+    def shutdown(self, cancel_queued: bool = True) -> None:
+        """
+        Stop dispatching. Queued jobs are cancelled (jobs already in the executor are not affected).
+        """
+        with self._cond:
+            self._closed = True
+            items = [
+                item
+                for groups in self._queues.values()
+                for queue in groups.values()
+                for item in queue
+            ]
+            self._cond.notify_all()
+        if cancel_queued:
+            for future, *_ in items:
+                future.cancel()
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    order = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = PriorityScheduler(executor, max_workers=1, max_queue=5)
+        futures = [scheduler.schedule(time.sleep, 0.2, group="warmup")]
+        # Let it occupy the only worker
+        time.sleep(0.05)
+        for index, (priority, group) in enumerate(
+            [(0, "a"), (0, "a"), (0, "a"), (0, "b"), (1, "c")]
+        ):
+            futures.append(
+                scheduler.schedule(
+                    order.append,
+                    (index, priority, group),
+                    priority=priority,
+                    group=group,
+                )
+            )
+        try:
+            scheduler.schedule(print, "overflow")
+        except QueueFullError as e:
+            print(e, e.retry_after)
+        for future in futures:
+            future.result()
+        print(order)
+        print(scheduler.stats())
+        scheduler.shutdown()
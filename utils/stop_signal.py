@@ -0,0 +1,28 @@
+import os
+import config
+
+# NOTE: file based, so it works for runs started by any process on this host (executor workers, pueue tasks, ...)
+
+
+def _get_stop_file_path(run_id: str, stop_dir: str = config.STOP_DIR) -> str:
+    return os.path.join(stop_dir, f"{run_id}.stop")
+
+
+def request_stop(run_id: str, stop_dir: str = config.STOP_DIR) -> None:
+    """
+    Ask a training run to stop gracefully after the current epoch.
+    """
+    os.makedirs(stop_dir, exist_ok=True)
+    with open(_get_stop_file_path(run_id, stop_dir), "w"):
+        pass
+
+
+def is_stop_requested(run_id: str, stop_dir: str = config.STOP_DIR) -> bool:
+    return os.path.exists(_get_stop_file_path(run_id, stop_dir))
+
+
+def clear_stop(run_id: str, stop_dir: str = config.STOP_DIR) -> None:
+    try:
+        os.remove(_get_stop_file_path(run_id, stop_dir))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,331 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Executor, Future
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+import traceback
+import config
+from loguru import logger
+from .metrics import REGISTRY as METRICS_REGISTRY
+
+
+def get_rss() -> Optional[int]:
+    """
+    Resident memory (bytes) of this process, None if unknown
+    """
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        # NOTE: peak instead of current usage, KiB on Linux but bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+
+def _worker_main(conn, parent_conn, initializer: Optional[Callable]) -> None:
+    # Our copy of the pool's end, otherwise `recv` never sees EOF if the pool process dies
+    parent_conn.close()
+    if initializer is not None:
+        try:
+            initializer()
+        except Exception as e:
+            # Not fatal, the task will load whatever it needs itself
+            logger.error(f"Worker initializer failed: {e}")
+    conn.send(("ready", os.getpid(), get_rss()))
+
+    while (item := conn.recv()) is not None:
+        fn, args, kwargs = item
+        start = time.time()
+        try:
+            message = ("done", True, fn(*args, **kwargs))
+        except BaseException as e:
+            message = ("done", False, e)
+        stats = {
+            "task_time": time.time() - start,
+            "rss": get_rss(),
+            # What the task recorded (e.g. device lock waits), for the pool process' `/metrics`
+            "metrics": METRICS_REGISTRY.drain(),
+        }
+        try:
+            conn.send((*message, stats))
+        except Exception as e:
+            # Result or exception can't be pickled
+            conn.send(
+                (
+                    "done",
+                    False,
+                    RuntimeError(
+                        f"Could not send back the result: {e}\n{traceback.format_exc()}"
+                    ),
+                    stats,
+                )
+            )
+
+
+class _WorkerSlot:
+    """
+    One worker process, fed by its own thread from the pool queue and replaced when recycled or dead
+    """
+
+    def __init__(self, pool: "WarmProcessPool", index: int):
+        self._pool = pool
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self._conn = None
+        self.stats: Dict[str, Any] = {
+            "index": index,
+            "state": "stopped",
+            "pid": None,
+            "spawned_at": None,
+            "startup_time": None,
+            "tasks": 0,
+            "total_tasks": 0,
+            "last_task_time": None,
+            "avg_task_time": None,
+            "avg_latency": None,
+            "rss": None,
+            "recycles": 0,
+            "crashes": 0,
+        }
+        self.thread = threading.Thread(
+            target=self._run, name=f"WarmProcessPool-{index}", daemon=True
+        )
+
+    def _update(self, **kwargs) -> None:
+        with self._pool._lock:
+            self.stats.update(kwargs)
+
+    def _recv(self) -> Optional[Tuple]:
+        """
+        Wait for the worker's next message, None if it died
+        """
+        while not self._conn.poll(1.0):
+            if not self.process.is_alive():
+                return None
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError):
+            return None
+
+    def _spawn(self) -> None:
+        parent_conn, child_conn = self._pool._context.Pipe()
+        spawned_at = time.time()
+        self.process = self._pool._context.Process(
+            target=_worker_main,
+            args=(child_conn, parent_conn, self._pool._initializer),
+            name=f"WarmProcessPool-{self.index}",
+            # NOTE: not daemonic, so tasks can start processes of their own (e.g. DataLoader workers),
+            # the pool terminates them at exit instead
+            daemon=False,
+        )
+        self._update(state="starting", spawned_at=spawned_at, tasks=0)
+        self.process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if (message := self._recv()) is None:
+            self._update(state="dead", pid=None)
+            raise RuntimeError(
+                f"Worker {self.index} died while starting (exit code {self.process.exitcode})"
+            )
+        _, pid, rss = message
+        self._update(
+            state="idle", pid=pid, startup_time=time.time() - spawned_at, rss=rss
+        )
+        logger.info(
+            f"Worker {self.index} (pid {pid}) ready in {self.stats['startup_time']:.2f}s"
+        )
+
+    def _stop(self) -> None:
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=10)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self._conn.close()
+        self.process = None
+        self._update(state="stopped", pid=None)
+
+    def _should_recycle(self) -> bool:
+        max_tasks, max_rss = self._pool._max_tasks_per_worker, self._pool._max_rss
+        if max_tasks and self.stats["tasks"] >= max_tasks:
+            return True
+        return bool(max_rss and self.stats["rss"] and self.stats["rss"] >= max_rss)
+
+    def _run(self) -> None:
+        while True:
+            if self.process is None:
+                try:
+                    self._spawn()
+                except Exception as e:
+                    logger.error(str(e))
+                    self._update(crashes=self.stats["crashes"] + 1)
+                    # Don't spin if the worker can't even start
+                    time.sleep(1)
+                    continue
+
+            if (item := self._pool._queue.get()) is None:
+                break
+            future, fn, args, kwargs, submitted_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._conn.send((fn, args, kwargs))
+            except Exception as e:
+                # e.g. arguments can't be pickled, the worker is fine
+                future.set_exception(e)
+                continue
+            self._update(state="busy")
+
+            if (message := self._recv()) is None:
+                self.process.join(timeout=5)
+                exitcode = self.process.exitcode
+                logger.error(f"Worker {self.index} died (exit code {exitcode})")
+                future.set_exception(
+                    RuntimeError(
+                        f"Worker process died while running the task (exit code {exitcode})"
+                    )
+                )
+                self._update(state="dead", crashes=self.stats["crashes"] + 1)
+                self._stop()
+                continue
+
+            _, ok, value, task_stats = message
+            METRICS_REGISTRY.merge(task_stats.get("metrics", {}))
+            latency = time.time() - submitted_at
+            with self._pool._lock:
+                total = self.stats["total_tasks"]
+                self.stats.update(
+                    state="idle",
+                    tasks=self.stats["tasks"] + 1,
+                    total_tasks=total + 1,
+                    last_task_time=task_stats["task_time"],
+                    avg_task_time=(
+                        (self.stats["avg_task_time"] or 0) * total
+                        + task_stats["task_time"]
+                    )
+                    / (total + 1),
+                    avg_latency=((self.stats["avg_latency"] or 0) * total + latency)
+                    / (total + 1),
+                    rss=task_stats["rss"],
+                )
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+            if self._should_recycle():
+                logger.info(
+                    f"Recycling worker {self.index} after {self.stats['tasks']} tasks (rss {self.stats['rss']})"
+                )
+                self._stop()
+                self._update(recycles=self.stats["recycles"] + 1)
+        self._stop()
+
+
+class WarmProcessPool(Executor):
+    """
+    Process pool whose workers are spawned and warmed up (`initializer`, e.g. import torch/MLFlow, init CUDA) ahead of
+    the first task, and replaced after `max_tasks_per_worker` tasks or once their RSS exceeds `max_rss` bytes
+    (0 disables either), so leaked memory doesn't pile up. A crashed worker fails its task and is replaced.
+
+    NOTE: call `start()` from the server process (not at import time), otherwise spawned children importing the main
+    module would start pools of their own.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        initializer: Optional[Callable] = None,
+        max_tasks_per_worker: int = config.WORKER_MAX_TASKS,
+        max_rss: int = config.WORKER_MAX_RSS,
+        mp_context: Optional[str] = config.WORKER_START_METHOD,
+    ):
+        self._max_workers = max_workers
+        self._initializer = initializer
+        self._max_tasks_per_worker = max_tasks_per_worker
+        self._max_rss = max_rss
+        self._context = multiprocessing.get_context(mp_context)
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._slots: List[_WorkerSlot] = []
+        self._started = False
+        self._shutdown = False
+
+    def start(self) -> "WarmProcessPool":
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            self._slots = [
+                _WorkerSlot(self, index) for index in range(self._max_workers)
+            ]
+        for slot in self._slots:
+            slot.thread.start()
+        # NOTE: runs at exit before multiprocessing joins the (non-daemonic) workers
+        multiprocessing.util.Finalize(self, self._terminate, exitpriority=10)
+        return self
+
+    def _terminate(self) -> None:
+        """
+        Kill the workers still alive, otherwise interpreter exit would wait for them
+        """
+        for slot in self._slots:
+            if (process := slot.process) is not None and process.is_alive():
+                process.terminate()
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        if self._shutdown:
+            raise RuntimeError("Cannot schedule new futures after shutdown")
+        self.start()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs, time.time()))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = [dict(slot.stats) for slot in self._slots]
+        return {
+            "max_workers": self._max_workers,
+            "queued": self._queue.qsize(),
+            "max_tasks_per_worker": self._max_tasks_per_worker,
+            "max_rss": self._max_rss,
+            "workers": workers,
+        }
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._shutdown = True
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+        for _ in self._slots:
+            self._queue.put(None)
+        if wait:
+            for slot in self._slots:
+                slot.thread.join()
+
+
+if __name__ == "__main__":
+    pool = WarmProcessPool(max_workers=2, max_tasks_per_worker=2).start()
+    futures = [pool.submit(os.getpid) for _ in range(6)]
+    print([future.result() for future in futures])
+    print(pool.stats())
+    pool.shutdown()